@@ -0,0 +1,5 @@
+# benchmarks/__init__.py
+"""
+Benchmarks del sistema. Cada módulo se ejecuta con `python -m benchmarks.<nombre>`
+desde la raíz del repo e imprime sus resultados en JSON.
+"""
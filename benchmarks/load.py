@@ -0,0 +1,174 @@
+# benchmarks/load.py
+"""
+Prueba de carga de los endpoints más usados contra la app en el mismo proceso.
+
+Levanta main.app sobre una base propia (por defecto sqlite:///./bench.db, que
+se puede llenar antes con benchmarks.synth), le pega con N clientes
+concurrentes a través de httpx + ASGITransport y mide latencias p50/p95/p99 y
+throughput por escenario. El resultado es JSON e incluye el commit actual,
+para poder comparar corridas entre commits con --baseline.
+
+Uso:
+    python -m benchmarks.synth --items 1000000 --db sqlite:///./bench.db
+    python -m benchmarks.load --concurrency 16 --requests 2000 --output bench.json
+    python -m benchmarks.load --baseline bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import time
+from datetime import date, timedelta
+
+SCENARIOS = ["products", "sales", "summary", "forecast"]
+
+
+def percentile(sorted_samples, pct):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not sorted_samples:
+        return None
+    index = max(0, min(len(sorted_samples) - 1, round(pct / 100 * len(sorted_samples) + 0.5) - 1))
+    return sorted_samples[index]
+
+
+def summarize(samples_ms, errors, elapsed):
+    samples = sorted(samples_ms)
+    return {
+        "requests": len(samples) + errors,
+        "errors": errors,
+        "p50_ms": _round(percentile(samples, 50)),
+        "p95_ms": _round(percentile(samples, 95)),
+        "p99_ms": _round(percentile(samples, 99)),
+        "mean_ms": _round(sum(samples) / len(samples)) if samples else None,
+        "throughput_rps": round((len(samples) + errors) / elapsed, 1) if elapsed else None,
+    }
+
+
+def _round(value):
+    return None if value is None else round(value, 3)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_requests(menu):
+    """Devuelve, por escenario, una función que arma (método, url, json) para cada petición."""
+    today = date.today()
+    month_ago = (today - timedelta(days=30)).isoformat()
+
+    def sale_request():
+        items = [
+            {"product_name": p["name"], "quantity": random.randint(1, 3), "unit_price": p["price"]}
+            for p in random.sample(menu, k=min(len(menu), random.randint(1, 4)))
+        ]
+        total = sum(item["quantity"] * item["unit_price"] for item in items)
+        return "POST", "/sales/", {"total_amount": total, "payment_method": "Efectivo", "items": items}
+
+    return {
+        "products": lambda: ("GET", "/products/", None),
+        "sales": sale_request,
+        "summary": lambda: ("GET", f"/reports/summary?start_date={month_ago}&end_date={today.isoformat()}", None),
+        "forecast": lambda: ("GET", "/reports/forecast?horizon=7", None),
+    }
+
+
+async def run_scenario(client, make_request, total_requests, concurrency):
+    samples, errors = [], 0
+    remaining = total_requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            method, url, body = make_request()
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, json=body)
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            if ok:
+                samples.append((time.perf_counter() - started) * 1000)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(samples, errors, time.perf_counter() - started)
+
+
+async def run(args):
+    # DATABASE_URL tiene que estar definida antes de importar la app
+    os.environ["DATABASE_URL"] = args.db
+    import httpx
+    import main
+
+    results = {}
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            menu = (await client.get("/products/")).json()
+            requests_by_scenario = build_requests(menu)
+            for name in args.scenarios:
+                # Una pasada corta de calentamiento (cachés, pool de conexiones)
+                await run_scenario(client, requests_by_scenario[name], min(20, args.requests), args.concurrency)
+                results[name] = await run_scenario(
+                    client, requests_by_scenario[name], args.requests, args.concurrency
+                )
+    return results
+
+
+def compare(current, baseline):
+    """Cambio relativo de p50/p95/throughput respecto de una corrida anterior."""
+    diff = {}
+    for name, stats in current["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old:
+            continue
+        diff[name] = {
+            key: round(stats[key] / old[key] - 1, 3) if stats.get(key) and old.get(key) else None
+            for key in ("p50_ms", "p95_ms", "throughput_rps")
+        }
+    return diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="sqlite:///./bench.db")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500, help="Peticiones por escenario")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--output", help="Archivo donde guardar el JSON además de imprimirlo")
+    parser.add_argument("--baseline", help="JSON de una corrida anterior para comparar")
+    args = parser.parse_args()
+
+    report = {
+        "commit": git_commit(),
+        "db": args.db,
+        "concurrency": args.concurrency,
+        "requests_per_scenario": args.requests,
+        "scenarios": asyncio.run(run(args)),
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["baseline_commit"] = baseline.get("commit")
+        report["relative_change"] = compare(report, baseline)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# benchmarks/report_queries.py
+"""
+Compara las consultas de los reportes antes y después de las migraciones
+(índices por fecha/venta/producto, montos en centavos y tablas de resumen).
+
+Crea una base SQLite temporal con el esquema original (sin índices, montos en
+float), la llena con ventas sintéticas, mide, aplica migrations.run() y vuelve
+a medir. No toca cafe_system.db.
+
+Uso:
+    python -m benchmarks.report_queries --sales 100000 --days 365
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+import migrations
+import rollup
+
+ORIGINAL_SCHEMA = [
+    "CREATE TABLE products (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, description VARCHAR,"
+    " price FLOAT NOT NULL, category VARCHAR(19) NOT NULL)",
+    "CREATE TABLE settings (key VARCHAR PRIMARY KEY, value VARCHAR)",
+    "CREATE TABLE sales (id INTEGER PRIMARY KEY, created_at DATETIME, total_amount FLOAT NOT NULL,"
+    " payment_method VARCHAR NOT NULL)",
+    "CREATE TABLE sale_items (id INTEGER PRIMARY KEY, sale_id INTEGER REFERENCES sales(id),"
+    " product_name VARCHAR NOT NULL, quantity INTEGER NOT NULL, unit_price FLOAT NOT NULL)",
+]
+
+MENU = [
+    ("Expresso", 2800), ("Cortado (Pocillo)", 3100), ("Latte/Latte Macchiato (Jarro 6 OZ)", 3300),
+    ("Capuccino (Mediano 8 oz)", 3500), ("Ice Latte", 4000), ("Jugo de Naranja", 2900),
+    ("Medialuna", 900), ("Criollo", 600), ("Brownie con nuez", 3400), ("Croissant clasico", 1900),
+    ("Alfajor de maicena", 650), ("Cerveza Lager", 3000),
+]
+
+
+def _fill(engine, n_sales, days, seed):
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        for stmt in ORIGINAL_SCHEMA:
+            conn.execute(text(stmt))
+        conn.execute(
+            text("INSERT INTO products (name, description, price, category) VALUES (:n, '', :p, 'OTROS')"),
+            [{"n": name, "p": price} for name, price in MENU],
+        )
+        sales, items = [], []
+        for sale_id in range(1, n_sales + 1):
+            created_at = now - timedelta(seconds=rng.randint(0, days * 86400))
+            total = 0
+            for _ in range(rng.randint(1, 4)):
+                name, price = rng.choice(MENU)
+                qty = rng.randint(1, 3)
+                total += qty * price
+                items.append({"s": sale_id, "n": name, "q": qty, "p": price})
+            sales.append({"id": sale_id, "c": created_at, "t": total, "m": rng.choice(["Efectivo", "Mercado Pago"])})
+        conn.execute(text("INSERT INTO sales VALUES (:id, :c, :t, :m)"), sales)
+        conn.execute(
+            text("INSERT INTO sale_items (sale_id, product_name, quantity, unit_price) VALUES (:s, :n, :q, :p)"),
+            items,
+        )
+    return len(items)
+
+
+def _time(engine, sql, params, repeat):
+    samples = []
+    with engine.connect() as conn:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            conn.execute(text(sql), params).fetchall()
+            samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def _raw_queries(amount_col, price_col):
+    return {
+        "summary_revenue": f"SELECT SUM({amount_col}) FROM sales WHERE created_at >= :start AND created_at < :end",
+        "summary_count": "SELECT COUNT(*) FROM sales WHERE created_at >= :start AND created_at < :end",
+        "summary_top5": (
+            "SELECT i.product_name, SUM(i.quantity) FROM sale_items i JOIN sales s ON s.id = i.sale_id"
+            " WHERE s.created_at >= :start AND s.created_at < :end"
+            " GROUP BY i.product_name ORDER BY SUM(i.quantity) DESC LIMIT 5"
+        ),
+        "product_revenue": (
+            f"SELECT SUM(i.quantity * i.{price_col}) FROM sale_items i JOIN sales s ON s.id = i.sale_id"
+            " WHERE i.product_name = :product AND s.created_at >= :start AND s.created_at < :end"
+        ),
+        "sale_items_lookup": "SELECT * FROM sale_items WHERE sale_id = :sale_id",
+    }
+
+
+ROLLUP_QUERIES = {
+    "summary_totals_rollup": (
+        "SELECT SUM(revenue_cents), SUM(ticket_count) FROM daily_sales WHERE day >= :first AND day <= :last"
+    ),
+    "summary_top5_rollup": (
+        "SELECT product_name, SUM(quantity) FROM daily_product_sales WHERE day >= :first AND day <= :last"
+        " GROUP BY product_name ORDER BY SUM(quantity) DESC LIMIT 5"
+    ),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sales", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--range-days", type=int, default=30, help="Días del rango consultado")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        n_items = _fill(engine, args.sales, args.days, args.seed)
+
+        end = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        start = end - timedelta(days=args.range_days)
+        params = {
+            "start": start, "end": end, "product": MENU[0][0], "sale_id": args.sales // 2,
+            "first": start.date(), "last": (end - timedelta(days=1)).date(),
+        }
+
+        before = {
+            name: _time(engine, sql, params, args.repeat)
+            for name, sql in _raw_queries("total_amount", "unit_price").items()
+        }
+
+        started = time.perf_counter()
+        migrations.run(engine, verbose=False)
+        db = sessionmaker(bind=engine)()
+        rollup.rebuild(db)
+        db.close()
+        migrate_ms = round((time.perf_counter() - started) * 1000, 3)
+
+        after = {
+            name: _time(engine, sql, params, args.repeat)
+            for name, sql in _raw_queries("total_cents", "unit_price_cents").items()
+        }
+        after.update({name: _time(engine, sql, params, args.repeat) for name, sql in ROLLUP_QUERIES.items()})
+        engine.dispose()
+
+    print(json.dumps({
+        "sales": args.sales,
+        "sale_items": n_items,
+        "range_days": args.range_days,
+        "migrate_and_rollup_ms": migrate_ms,
+        "before_ms": before,
+        "after_ms": after,
+        "summary_endpoint_ms": {
+            "before": round(before["summary_revenue"] + before["summary_count"] + before["summary_top5"], 3),
+            "after": round(after["summary_totals_rollup"] + after["summary_top5_rollup"], 3),
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
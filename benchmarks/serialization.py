@@ -0,0 +1,148 @@
+# benchmarks/serialization.py
+"""
+Mide cuánto cuesta armar las respuestas más pedidas y cuántos bytes viajan.
+
+1. Serialización en memoria de N productos (sin base): el camino anterior
+   (schemas.Product.model_validate + model_dump + json.dumps) contra el actual
+   (catalog.product_dict + orjson), en ms por respuesta.
+2. Bytes por respuesta sin comprimir, con gzip y con brotli (si está instalado).
+3. Con --db, bytes y latencia reales de GET /products/, /reports/summary y
+   /reports/today a través de la app, según el Accept-Encoding que se mande.
+
+Uso:
+    python -m benchmarks.serialization --products 1000
+    python -m benchmarks.synth --items 200000 --db sqlite:///./bench.db
+    python -m benchmarks.serialization --db sqlite:///./bench.db --output serialization.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import zlib
+from datetime import date, timedelta
+
+from benchmarks.load import git_commit
+
+ENCODINGS = ["identity", "gzip", "br"]
+
+
+def fake_products(count):
+    import models
+
+    categories = list(models.ProductCategory)
+    return [
+        models.Product(
+            id=i,
+            name=f"Producto {i}",
+            description=random.choice([None, "Con leche de almendras y un toque de canela"]),
+            price_cents=random.randint(500, 900000),
+            category=random.choice(categories),
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def time_ms(fn, repeat):
+    fn()  # calentamiento
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return round((time.perf_counter() - started) * 1000 / repeat, 3)
+
+
+def sizes(body: bytes) -> dict:
+    import encoding
+
+    gzip = zlib.compressobj(encoding.GZIP_LEVEL, zlib.DEFLATED, 31)
+    result = {"identity": len(body), "gzip": len(gzip.compress(body) + gzip.flush())}
+    if encoding.brotli is not None:
+        result["br"] = len(encoding.brotli.compress(body, quality=encoding.BROTLI_QUALITY))
+    return result
+
+
+def in_memory(count, repeat):
+    import catalog
+    import encoding
+    import schemas
+
+    products = fake_products(count)
+
+    def before():
+        payload = [schemas.Product.model_validate(p).model_dump(mode="json") for p in products]
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def after():
+        return encoding.dumps([catalog.product_dict(p) for p in products])
+
+    body = after()
+    return {
+        "products": count,
+        "pydantic_json_ms": time_ms(before, repeat),
+        "dict_orjson_ms": time_ms(after, repeat),
+        "orjson_available": encoding.orjson is not None,
+        "bytes": sizes(body),
+    }
+
+
+async def through_app(db_url, repeat):
+    os.environ["DATABASE_URL"] = db_url
+    import httpx
+    import main
+
+    today = date.today()
+    month_ago = (today - timedelta(days=30)).isoformat()
+    paths = {
+        "products": "/products/?limit=1000",
+        "summary": f"/reports/summary?start_date={month_ago}&end_date={today.isoformat()}&top=100",
+        "today": "/reports/today?top=50",
+    }
+    results = {}
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name, path in paths.items():
+                for accept in ENCODINGS:
+                    samples = []
+                    sent = None
+                    for _ in range(repeat + 1):
+                        started = time.perf_counter()
+                        # stream() para contar los bytes tal como salen, sin descomprimir
+                        async with client.stream("GET", path, headers={"Accept-Encoding": accept}) as response:
+                            raw = b"".join([chunk async for chunk in response.aiter_raw()])
+                        samples.append((time.perf_counter() - started) * 1000)
+                        sent = (len(raw), response.headers.get("content-encoding", "identity"))
+                    samples = sorted(samples[1:])
+                    results.setdefault(name, {})[accept] = {
+                        "bytes_sent": sent[0],
+                        "content_encoding": sent[1],
+                        "p50_ms": round(samples[len(samples) // 2], 3),
+                    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--db", help="Base para medir también a través de la app (ej. sqlite:///./bench.db)")
+    parser.add_argument("--output", help="Archivo donde guardar el JSON además de imprimirlo")
+    args = parser.parse_args()
+
+    report = {
+        "commit": git_commit(),
+        "in_memory": [in_memory(count, args.repeat) for count in args.products],
+    }
+    if args.db:
+        report["db"] = args.db
+        report["through_app"] = asyncio.run(through_app(args.db, args.repeat))
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
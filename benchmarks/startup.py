@@ -0,0 +1,128 @@
+# benchmarks/startup.py
+"""
+Mide cuánto tarda la API en arrancar, como en un hosting gratuito que la
+apaga cuando no tiene tráfico y la vuelve a levantar con el primer pedido.
+
+Se mide (mediana, mínimo y máximo de varias corridas):
+- import: cuánto tarda `import main` en un proceso nuevo (para ver el detalle:
+  python -X importtime -c "import main")
+- cold / warm: desde que se lanza un proceso nuevo de uvicorn hasta la primera
+  respuesta 200 de GET /products/ (importar, arrancar, migrar, poblar y atender)
+
+Escenarios:
+- cold: base nueva (se crea el esquema y se carga el menú inicial). Solo con
+  la base temporal por defecto: nunca se borra una base pasada con --db.
+- warm: la misma base ya creada (el caso de cada reinicio)
+
+Uso:
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --db sqlite:///./startup.db --output startup.json
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.load import git_commit
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print((time.perf_counter() - t) * 1000)"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_import(env):
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET], env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def measure_first_request(env, timeout):
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                response = httpx.get(f"http://127.0.0.1:{port}/products/", timeout=1)
+                if response.status_code == 200:
+                    return (time.perf_counter() - started) * 1000
+            except httpx.TransportError:
+                pass
+            time.sleep(0.005)
+        raise RuntimeError("La API no respondió a tiempo")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def _sqlite_path(url):
+    return url[len("sqlite:///"):]
+
+
+def stats(samples):
+    return {
+        "runs": len(samples),
+        "median_ms": round(statistics.median(samples), 1),
+        "min_ms": round(min(samples), 1),
+        "max_ms": round(max(samples), 1),
+    }
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="cafe-startup-")
+    db = args.db or f"sqlite:///{os.path.join(workdir, 'startup.db')}"
+    env = dict(os.environ, DATABASE_URL=db, PYTHONPATH=os.getcwd())
+    # Solo se borra (para medir en frío) la base temporal propia
+    path = None if args.db else _sqlite_path(db)
+
+    results = {"import": stats([measure_import(env) for _ in range(args.runs)])}
+    if path:
+        cold = []
+        for _ in range(args.runs):
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            cold.append(measure_first_request(env, args.timeout))
+        results["cold"] = stats(cold)
+    else:
+        print("Con --db se mide solo el arranque con la base existente.", file=sys.stderr)
+    # La base quedó creada por la última corrida (o ya existía)
+    measure_first_request(env, args.timeout)
+    results["warm"] = stats([measure_first_request(env, args.timeout) for _ in range(args.runs)])
+    return db, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="Base a usar (por defecto una SQLite nueva en un directorio temporal)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60, help="Segundos máximos por arranque")
+    parser.add_argument("--output", help="Archivo donde guardar el JSON además de imprimirlo")
+    args = parser.parse_args()
+
+    db, results = run(args)
+    report = {"commit": git_commit(), "db": db, "python": sys.version.split()[0], **results}
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# benchmarks/synth.py
+"""
+Genera historial de ventas sintético directamente en la base (sin pasar por la API).
+
+Usa el menú de Zibá de populate_production.py, reparte las ventas en los
+últimos N días con más movimiento a la mañana y al mediodía, inserta en
+bloques con INSERTs masivos y al final reconstruye las tablas de resumen.
+
+Uso:
+    python -m benchmarks.synth --items 2000000 --days 365 --db sqlite:///./bench.db
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import sessionmaker
+
+import ledger
+import migrations
+import models
+import rollup
+from database import make_engine
+from populate_production import menu_completo_ziba
+
+BLOCK_SIZE = 50_000
+PAYMENT_METHODS = ["Efectivo", "Mercado Pago", "Tarjeta"]
+# Peso relativo de cada hora del día (6 a 21 hs)
+HOUR_WEIGHTS = {6: 1, 7: 4, 8: 8, 9: 9, 10: 7, 11: 5, 12: 6, 13: 6, 14: 4, 15: 4, 16: 6, 17: 7, 18: 5, 19: 3, 20: 2, 21: 1}
+
+
+def seed_menu(db):
+    """Carga el menú si la tabla de productos está vacía. Devuelve [(id, nombre, precio)]."""
+    if db.query(models.Product.id).first() is None:
+        db.add_all(
+            models.Product(
+                name=item["name"],
+                price=item["price"],
+                category=models.ProductCategory(item["category"]),
+                description=item["description"],
+            )
+            for item in menu_completo_ziba
+        )
+        db.commit()
+    return [(p.id, p.name, p.price_cents) for p in db.query(models.Product).all()]
+
+
+def generate(engine, n_items: int, days: int = 365, seed: int = 42):
+    """Inserta ventas hasta sumar aproximadamente `n_items` ítems. Devuelve un resumen."""
+    rng = random.Random(seed)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    started = time.perf_counter()
+    try:
+        menu = seed_menu(db)
+        # Algunos productos se venden mucho más que otros
+        weights = [rng.paretovariate(1.5) for _ in menu]
+        hours, hour_weights = zip(*HOUR_WEIGHTS.items())
+        next_sale_id = (db.query(func.max(models.Sale.id)).scalar() or 0) + 1
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+        n_sales = 0
+        inserted_items = 0
+        while inserted_items < n_items:
+            sales, items = [], []
+            while len(items) < BLOCK_SIZE and inserted_items + len(items) < n_items:
+                sale_id = next_sale_id
+                next_sale_id += 1
+                created_at = (
+                    today
+                    - timedelta(days=rng.randrange(days))
+                    + timedelta(hours=rng.choices(hours, hour_weights)[0], seconds=rng.randrange(3600))
+                )
+                total = 0
+                for product_id, name, price_cents in rng.choices(menu, weights, k=rng.randint(1, 4)):
+                    quantity = rng.choice((1, 1, 1, 2, 2, 3))
+                    total += quantity * price_cents
+                    items.append({
+                        "sale_id": sale_id,
+                        "product_id": product_id,
+                        "product_name": name,
+                        "quantity": quantity,
+                        "unit_price_cents": price_cents,
+                    })
+                sales.append({
+                    "id": sale_id,
+                    "created_at": created_at,
+                    "total_cents": total,
+                    "payment_method": rng.choice(PAYMENT_METHODS),
+                })
+            db.execute(insert(models.Sale), sales)
+            db.execute(insert(models.SaleItem), items)
+            db.commit()
+            n_sales += len(sales)
+            inserted_items += len(items)
+
+        insert_seconds = time.perf_counter() - started
+        rollup.rebuild(db)
+        ledger.rebuild(db, models.DEFAULT_BRANCH)
+    finally:
+        db.close()
+
+    return {
+        "sales": n_sales,
+        "sale_items": inserted_items,
+        "insert_seconds": round(insert_seconds, 2),
+        "total_seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=1_000_000, help="Cantidad aproximada de ítems a generar")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", default="sqlite:///./bench.db", help="URL de la base a llenar")
+    args = parser.parse_args()
+
+    engine = make_engine(args.db)
+    migrations.run(engine, verbose=False)
+    print(json.dumps(generate(engine, args.items, args.days, args.seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
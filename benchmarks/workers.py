@@ -0,0 +1,153 @@
+# benchmarks/workers.py
+"""
+Throughput de GET /products/ y POST /sales/ con 1, 2, 4 y 8 workers de gunicorn
+(gunicorn.conf.py), sobre HTTP real.
+
+Para cada cantidad de workers se levanta gunicorn en un puerto libre, se
+espera la primera respuesta, se hace una pasada corta de calentamiento y se
+mide cada escenario con N clientes concurrentes. Los clientes corren en
+varios procesos (--clients) para que el generador de carga no sea el cuello
+de botella; aun así, conviene correrlo en una máquina con más núcleos que
+workers a probar.
+
+Las ventas se escriben en la base indicada (por defecto una SQLite nueva en un
+directorio temporal). Con SQLite las escrituras se hacen de a una, así que
+POST /sales/ escala mucho menos que las lecturas del catálogo.
+
+Uso:
+    python -m benchmarks.workers
+    python -m benchmarks.workers --workers 1 4 --concurrency 64 --requests 4000 --output workers.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+
+from benchmarks.load import build_requests, git_commit, summarize
+from benchmarks.startup import free_port
+
+SCENARIOS = ["products", "sales"]
+
+
+def start_gunicorn(workers, env, timeout):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "main:app", "--workers", str(workers), "--bind", f"127.0.0.1:{port}"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError("gunicorn terminó antes de responder")
+        try:
+            if httpx.get(f"{base_url}/products/", timeout=1).status_code == 200:
+                return process, base_url
+        except httpx.TransportError:
+            pass
+        time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError("gunicorn no respondió a tiempo")
+
+
+async def _drive(base_url, scenario, menu, total_requests, concurrency):
+    """Latencias (ms) y errores de un proceso cliente."""
+    make_request = build_requests(menu)[scenario]
+    samples, errors = [], 0
+    remaining = total_requests
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        async def worker():
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                method, url, body = make_request()
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, url, json=body)
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    samples.append((time.perf_counter() - started) * 1000)
+                else:
+                    errors += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, errors
+
+
+def _client(args):
+    return asyncio.run(_drive(*args))
+
+
+def measure(pool, clients, base_url, scenario, menu, total_requests, concurrency):
+    per_client = [(base_url, scenario, menu, total_requests // clients, max(1, concurrency // clients))] * clients
+    started = time.perf_counter()
+    results = list(pool.map(_client, per_client))
+    elapsed = time.perf_counter() - started
+    samples = [sample for client_samples, _ in results for sample in client_samples]
+    return summarize(samples, sum(errors for _, errors in results), elapsed)
+
+
+def run(args):
+    db = args.db or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='cafe-workers-'), 'workers.db')}"
+    # Con más de un worker gunicorn.conf.py exige apagar los eventos en tiempo real
+    env = dict(os.environ, DATABASE_URL=db, PYTHONPATH=os.getcwd(), REALTIME_EVENTS="0")
+    results = {}
+    with ProcessPoolExecutor(args.clients) as pool:
+        for workers in args.workers:
+            process, base_url = start_gunicorn(workers, env, args.timeout)
+            try:
+                menu = httpx.get(f"{base_url}/products/").json()
+                results[str(workers)] = by_scenario = {}
+                for scenario in args.scenarios:
+                    measure(pool, args.clients, base_url, scenario, menu, min(200, args.requests), args.concurrency)
+                    by_scenario[scenario] = measure(
+                        pool, args.clients, base_url, scenario, menu, args.requests, args.concurrency
+                    )
+                    print(f"{workers} workers, {scenario}: {by_scenario[scenario]['throughput_rps']} req/s", file=sys.stderr)
+            finally:
+                process.terminate()
+                process.wait()
+    return db, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="Base a usar (por defecto una SQLite nueva en un directorio temporal)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, default=64, help="Conexiones concurrentes en total")
+    parser.add_argument("--requests", type=int, default=2000, help="Peticiones por escenario")
+    parser.add_argument("--clients", type=int, default=4, help="Procesos que generan la carga")
+    parser.add_argument("--timeout", type=float, default=60, help="Segundos máximos de arranque")
+    parser.add_argument("--output", help="Archivo donde guardar el JSON además de imprimirlo")
+    args = parser.parse_args()
+
+    db, results = run(args)
+    report = {
+        "commit": git_commit(),
+        "db": db,
+        "cpus": os.cpu_count(),
+        "concurrency": args.concurrency,
+        "requests_per_scenario": args.requests,
+        "workers": results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
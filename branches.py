@@ -0,0 +1,149 @@
+# branches.py
+"""
+Sucursales: dónde se guardan las ventas de cada una y cómo se consultan todas juntas.
+
+Las sucursales se declaran en CAFE_BRANCHES (ej. "central,norte,sur"; por
+defecto solo CAFE_DEFAULT_BRANCH). Las cajas indican la suya con el encabezado
+X-Branch-Id (o el parámetro `branch`); si no mandan nada se usa la de defecto.
+
+Dónde van las ventas y sus resúmenes:
+- Con BRANCH_DATABASE_URL (ej. sqlite:///./ventas_{branch}.db) cada sucursal
+  tiene su propia base. En SQLite eso significa un lock de escritura por
+  sucursal: una sucursal con mucho movimiento no frena a las demás.
+- Sin BRANCH_DATABASE_URL todas comparten DATABASE_URL y se separan por la
+  columna branch_id (los índices empiezan por branch_id). Es la opción para PostgreSQL.
+  BRANCH_DATABASE_URL solo acepta SQLite: las bases de sucursal no tienen el
+  catálogo y sale_items.product_id apunta a products, una clave foránea que
+  PostgreSQL sí exige (SQLite no, salvo PRAGMA foreign_keys).
+
+El catálogo, los precios por sucursal y la configuración quedan siempre en DATABASE_URL.
+Los reportes de todas las sucursales consultan cada una en paralelo y suman los resultados.
+"""
+import asyncio
+import contextvars
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+import database
+import migrations
+import models
+
+BRANCHES = [
+    branch.strip()
+    for branch in os.getenv("CAFE_BRANCHES", models.DEFAULT_BRANCH).split(",")
+    if branch.strip()
+]
+if models.DEFAULT_BRANCH not in BRANCHES:
+    BRANCHES.insert(0, models.DEFAULT_BRANCH)
+
+BRANCH_DATABASE_URL = os.getenv("BRANCH_DATABASE_URL")
+if BRANCH_DATABASE_URL and not BRANCH_DATABASE_URL.startswith("sqlite"):
+    raise ValueError(
+        "BRANCH_DATABASE_URL solo admite SQLite; con PostgreSQL dejarla vacía y "
+        "usar DATABASE_URL para todas las sucursales."
+    )
+
+# Los IDs terminan en nombres de archivo: solo letras, números, - y _
+_VALID_ID = re.compile(r"^[A-Za-z0-9_-]{1,40}$")
+for _branch in BRANCHES:
+    if not _VALID_ID.match(_branch):
+        raise ValueError(f"ID de sucursal inválido en CAFE_BRANCHES: {_branch!r}")
+
+
+class BranchStore:
+    """Engines y sesiones de la base de ventas de una sucursal."""
+
+    def __init__(self, branch, engine, async_engine, SessionLocal, AsyncSessionLocal):
+        self.branch = branch
+        self.engine = engine
+        self.async_engine = async_engine
+        self.SessionLocal = SessionLocal
+        self.AsyncSessionLocal = AsyncSessionLocal
+
+
+_lock = threading.Lock()
+_stores = {}
+_executor = ThreadPoolExecutor(max_workers=max(4, len(BRANCHES)), thread_name_prefix="branch")
+
+
+def exists(branch: str) -> bool:
+    return branch in BRANCHES
+
+
+def store(branch: str) -> BranchStore:
+    with _lock:
+        branch_store = _stores.get(branch)
+        if branch_store is None:
+            branch_store = _stores[branch] = _open(branch)
+    return branch_store
+
+
+def _open(branch):
+    if not BRANCH_DATABASE_URL:
+        return BranchStore(
+            branch, database.engine, database.async_engine,
+            database.SessionLocal, database.AsyncSessionLocal,
+        )
+    url = BRANCH_DATABASE_URL.format(branch=branch)
+    engine = database.make_engine(url)
+    migrations.run(engine, verbose=False)
+    async_engine = database.make_async_engine(database.async_url(url))
+    return BranchStore(
+        branch, engine, async_engine,
+        sessionmaker(autocommit=False, autoflush=False, bind=engine),
+        async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False),
+    )
+
+
+def databases():
+    """Una sucursal por cada base distinta (para tareas que recorren todas las ventas de una base)."""
+    seen = set()
+    result = []
+    for branch in BRANCHES:
+        branch_store = store(branch)
+        if branch_store.engine not in seen:
+            seen.add(branch_store.engine)
+            result.append(branch_store)
+    return result
+
+
+async def dispose():
+    for branch_store in list(_stores.values()):
+        if branch_store.async_engine is not database.async_engine:
+            await branch_store.async_engine.dispose()
+            branch_store.engine.dispose()
+
+
+# --- Consultas a varias sucursales ---
+
+def fan_out(fn, branches=None) -> dict:
+    """Ejecuta fn(branch, Session) en cada sucursal, en paralelo. Devuelve {sucursal: resultado}."""
+    def run(branch):
+        db = store(branch).SessionLocal()
+        try:
+            return fn(branch, db)
+        finally:
+            db.close()
+
+    # Cada hilo corre con una copia del contexto, así las consultas siguen contando en metrics.py
+    futures = {
+        branch: _executor.submit(contextvars.copy_context().run, run, branch)
+        for branch in branches or BRANCHES
+    }
+    return {branch: future.result() for branch, future in futures.items()}
+
+
+async def fan_out_async(fn, branches=None) -> dict:
+    """Igual que fan_out, con `await fn(branch, AsyncSession)` concurrentes en el loop."""
+    async def run(branch):
+        async with store(branch).AsyncSessionLocal() as db:
+            return await fn(branch, db)
+
+    branches = list(branches or BRANCHES)
+    results = await asyncio.gather(*(run(branch) for branch in branches))
+    return dict(zip(branches, results))
@@ -0,0 +1,272 @@
+# catalog.py
+"""
+Caché en memoria del catálogo de productos (GET /products/).
+
+Guarda el JSON ya serializado junto con su ETag, así cada terminal que carga el
+menú no vuelve a consultar la base ni a pasar por Pydantic. Cualquier alta,
+modificación o baja de productos llama a `touch()` antes del commit, que
+incrementa el sello "catalog" (el número de versión que las cajas consultan en
+GET /products/version), y a `invalidate()` después. Los demás workers ven el
+sello nuevo y descartan su caché (ver stamps.py).
+
+El listado se pagina por cursor (`after_id`: productos con id mayor, ordenados
+por id), se puede filtrar por categoría y buscar por nombre. La búsqueda usa un
+trie en memoria con las palabras de cada nombre (sin mayúsculas ni tildes) que
+se reconstruye cuando cambia el catálogo: cada término se busca como prefijo y,
+si no encuentra nada, con tolerancia a errores de tipeo.
+
+Los precios por sucursal (product_branch_prices) se cargan junto con el índice
+y se aplican al listado de la sucursal que lo pide.
+
+Las filas de la base se pasan a dict directamente (sin validarlas otra vez con
+Pydantic) y se serializan con orjson (ver encoding.py).
+"""
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import encoding
+import models
+import stamps
+
+MAX_CACHED_PAGES = 256
+
+_lock = threading.Lock()
+_generation = 0  # cambia con cada descarte: lo que se calculó antes no se guarda
+_entries = OrderedDict()  # (skip, limit, category, after_id, q, branch) -> (body, etag, next_cursor)
+_index = None
+
+
+def _drop():
+    global _generation, _index
+    with _lock:
+        _generation += 1
+        _entries.clear()
+        _index = None
+
+
+_watcher = stamps.Watcher(stamps.CATALOG, _drop)
+
+
+def version() -> int:
+    """Sello del catálogo: el mismo número en todos los workers."""
+    return _watcher.version or 0
+
+
+def touch(db: Session) -> int:
+    """Marca el catálogo como modificado, dentro de la transacción del cambio. Devuelve el sello nuevo."""
+    return stamps.bump(db, stamps.CATALOG)
+
+
+def invalidate(version=None):
+    """
+    Descarta lo cacheado en este proceso. `version` es lo que devolvió touch():
+    así este worker no vuelve a descartar la caché cuando lee ese mismo sello.
+    """
+    _drop()
+    if version is not None:
+        _watcher.seen(version)
+
+
+# --- Búsqueda por nombre ---
+
+def normalize(text: str) -> str:
+    """Minúsculas y sin tildes: 'Café' y 'cafe' tienen que encontrar lo mismo."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def words(text: str):
+    return re.findall(r"\w+", normalize(text))
+
+
+class _Node:
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children = {}
+        self.ids = set()  # productos con alguna palabra que empieza con este prefijo
+
+
+class SearchIndex:
+    def __init__(self, products, branch_prices=()):
+        """
+        `products` son filas (id, name, ...) de todo el catálogo y `branch_prices`
+        filas (branch_id, product_id, price_cents).
+        """
+        self.root = _Node()
+        self.ids_by_name = {}
+        self.prices = {}  # sucursal -> {product_id: price_cents}
+        digest = hashlib.sha256()
+        for row in products:
+            digest.update(repr(tuple(row)).encode("utf-8"))
+            product_id, name = row[0], row[1]
+            # Las filas vienen ordenadas por id: ante nombres repetidos queda el menor
+            self.ids_by_name.setdefault(name, product_id)
+            for word in words(name):
+                node = self.root
+                for char in word:
+                    node = node.children.setdefault(char, _Node())
+                    node.ids.add(product_id)
+        for row in branch_prices:
+            digest.update(repr(tuple(row)).encode("utf-8"))
+            branch_id, product_id, price_cents = row
+            self.prices.setdefault(branch_id, {})[product_id] = price_cents
+        # ETag de todo el catálogo (no solo de una página), para GET /products/version
+        self.etag = '"' + digest.hexdigest()[:32] + '"'
+
+    def prefix(self, term: str) -> set:
+        node = self.root
+        for char in term:
+            node = node.children.get(char)
+            if node is None:
+                return set()
+        return node.ids
+
+    def fuzzy(self, term: str, max_distance: int) -> set:
+        """Productos con alguna palabra cuyo prefijo está a `max_distance` ediciones o menos del término."""
+        found = set()
+        first_row = list(range(len(term) + 1))
+        stack = [(child, char, first_row) for char, child in self.root.children.items()]
+        while stack:
+            node, char, previous = stack.pop()
+            # Una fila más de la matriz de Levenshtein por cada letra del camino
+            row = [previous[0] + 1]
+            for i in range(1, len(term) + 1):
+                cost = 0 if term[i - 1] == char else 1
+                row.append(min(row[i - 1] + 1, previous[i] + 1, previous[i - 1] + cost))
+            if row[-1] <= max_distance:
+                found |= node.ids
+            elif min(row) <= max_distance:
+                stack.extend((child, next_char, row) for next_char, child in node.children.items())
+        return found
+
+    def search(self, query: str) -> set:
+        """IDs de los productos que tienen todos los términos de la búsqueda."""
+        result = None
+        for term in words(query):
+            ids = self.prefix(term)
+            if not ids and len(term) >= 3:
+                ids = self.fuzzy(term, 1 if len(term) <= 5 else 2)
+            result = ids if result is None else result & ids
+            if not result:
+                return set()
+        return set(result or ())
+
+
+def _get_index(db: Session) -> SearchIndex:
+    global _index
+    _watcher.check(db)
+    with _lock:
+        index, seen_generation = _index, _generation
+    if index is not None:
+        return index
+
+    rows = db.execute(
+        select(
+            models.Product.id, models.Product.name, models.Product.category,
+            models.Product.price_cents, models.Product.description,
+        ).order_by(models.Product.id)
+    ).all()
+    branch_prices = db.execute(
+        select(
+            models.ProductBranchPrice.branch_id,
+            models.ProductBranchPrice.product_id,
+            models.ProductBranchPrice.price_cents,
+        ).order_by(models.ProductBranchPrice.branch_id, models.ProductBranchPrice.product_id)
+    ).all()
+    index = SearchIndex(rows, branch_prices)
+    with _lock:
+        if _generation == seen_generation:
+            _index = index
+    return index
+
+
+def catalog_etag(db: Session) -> str:
+    return _get_index(db).etag
+
+
+def product_ids(db: Session, names) -> dict:
+    """{nombre: product_id} de los nombres que están en el catálogo, sin ir a la base si ya hay índice."""
+    ids_by_name = _get_index(db).ids_by_name
+    return {name: ids_by_name[name] for name in set(names) if name in ids_by_name}
+
+
+def branch_price_cents(db: Session, branch_id, product_id):
+    """Precio del producto en la sucursal si tiene uno propio, o None."""
+    return _get_index(db).prices.get(branch_id, {}).get(product_id)
+
+
+# --- Listado ---
+
+def product_dict(product: models.Product, price_cents=None) -> dict:
+    """Lo mismo que schemas.Product, armado directo desde el modelo (los datos de la base ya son válidos)."""
+    return {
+        "name": product.name,
+        "description": product.description,
+        "price": (product.price_cents if price_cents is None else price_cents) / 100,
+        "category": product.category.value,
+        "id": product.id,
+    }
+
+
+def get(db: Session, skip: int = 0, limit: int = 100, category=None, after_id=None, q=None, branch=None):
+    """
+    Devuelve (body, etag, next_cursor) de una página del listado, serializándola
+    solo si hace falta. `next_cursor` es el `after_id` de la página siguiente
+    (None si no hay más). Con `branch` los precios son los de esa sucursal.
+    """
+    key = (skip, limit, category, after_id, q or None, branch)
+    _watcher.check(db)
+    with _lock:
+        cached = _entries.get(key)
+        if cached is not None:
+            _entries.move_to_end(key)
+        seen_generation = _generation
+    if cached is not None:
+        return cached
+
+    query = select(models.Product).order_by(models.Product.id)
+    if category is not None:
+        query = query.where(models.Product.category == category)
+    if after_id is not None:
+        query = query.where(models.Product.id > after_id)
+    products = []
+    if q:
+        ids = _get_index(db).search(q)
+        if ids:
+            query = query.where(models.Product.id.in_(ids))
+            products = db.scalars(query.offset(skip).limit(limit + 1)).all()
+    else:
+        products = db.scalars(query.offset(skip).limit(limit + 1)).all()
+
+    # Se pide uno de más para saber si hay otra página
+    next_cursor = products[limit - 1].id if len(products) > limit else None
+    overrides = (_get_index(db).prices.get(branch) if branch is not None else None) or {}
+    body = encoding.dumps([product_dict(p, overrides.get(p.id)) for p in products[:limit]])
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    entry = (body, etag, next_cursor)
+
+    with _lock:
+        # Si alguien modificó el catálogo mientras serializábamos, no guardamos nada viejo
+        if _generation == seen_generation:
+            _entries[key] = entry
+            if len(_entries) > MAX_CACHED_PAGES:
+                _entries.popitem(last=False)
+    return entry
+
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    """
+    Compara el encabezado If-None-Match con el ETag actual. Acepta también la
+    variante comprimida ("abc-gzip", ver encoding.py) y la débil (W/"abc").
+    """
+    if not if_none_match:
+        return False
+    candidates = [encoding.plain_etag(tag.strip()) for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
@@ -0,0 +1,159 @@
+# check_backends.py
+"""
+Recorre los endpoints principales contra cada motor de base de datos soportado.
+
+- SQLite: siempre, en un archivo temporal.
+- PostgreSQL: si se define CHECK_POSTGRES_URL se usa ese servidor (la base debe
+  estar vacía); si no, se levanta un Postgres local temporal cuando `initdb` y
+  `pg_ctl` están instalados y hay un driver (psycopg2 o psycopg) disponible.
+
+Cada motor corre en un proceso aparte, porque database.py lee DATABASE_URL al importarse.
+
+Uso:
+    python check_backends.py
+"""
+import glob
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+
+def exercise_endpoints():
+    """Se ejecuta dentro del proceso hijo, con DATABASE_URL ya configurada."""
+    import main
+    from fastapi.testclient import TestClient
+
+    today = date.today().isoformat()
+    item = {"product_name": "Cortado (Pocillo)", "quantity": 2, "unit_price": 3100.5}
+    sale = {"total_amount": 6201, "payment_method": "Efectivo", "items": [item]}
+
+    with TestClient(main.app) as client:
+        created = client.post("/products/", json={"name": "Cortado (Pocillo)", "price": 3100.5, "category": "Café c/ Leche"})
+        assert created.status_code == 200, created.text
+        product_id = created.json()["id"]
+        assert created.json()["price"] == 3100.5
+
+        listing = client.get("/products/")
+        assert listing.status_code == 200
+        assert any(p["id"] == product_id for p in listing.json())
+        assert client.get("/products/", headers={"If-None-Match": listing.headers["etag"]}).status_code == 304
+
+        updated = client.put(f"/products/{product_id}", json={"name": "Cortado (Pocillo)", "price": 3200, "category": "Café c/ Leche"})
+        assert updated.json()["price"] == 3200
+        assert client.get("/products/version").json()["etag"] != listing.headers["etag"]
+
+        single = client.post("/sales/", json={**sale, "idempotency_key": "check-1"})
+        assert single.status_code == 200, single.text
+        again = client.post("/sales/", json={**sale, "idempotency_key": "check-1"})
+        assert again.json()["id"] == single.json()["id"]
+
+        batch = client.post("/sales/batch", json=[
+            {**sale, "idempotency_key": "check-1"},
+            {**sale, "idempotency_key": "check-2"},
+            {**sale, "idempotency_key": "check-2"},
+            sale,
+        ])
+        assert batch.status_code == 200, batch.text
+        ids = batch.json()["ids"]
+        assert ids[0] == single.json()["id"] and ids[1] == ids[2] and batch.json()["created"] == 2
+
+        summary = client.get(f"/reports/summary?start_date={today}&end_date={today}").json()
+        assert summary["total_sales"] == 3, summary
+        assert summary["total_revenue"] == 3 * 6201, summary
+        assert summary["top_products"][0] == {"name": "Cortado (Pocillo)", "quantity": 6}, summary
+
+        assert client.get("/reports/forecast?horizon=3").status_code == 200
+
+        client.put("/settings/moneda", json={"value": "ARS"})
+        assert client.get("/settings/moneda").json()["value"] == "ARS"
+
+        assert client.delete(f"/products/{product_id}").status_code == 200
+        assert client.get(f"/products/{product_id}").status_code == 404
+
+
+def _run_child(name, url):
+    env = dict(os.environ, DATABASE_URL=url)
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-W", "ignore", __file__, "--child"],
+        env=env, capture_output=True, text=True,
+    )
+    result = {"backend": name, "ok": proc.returncode == 0, "seconds": round(time.perf_counter() - started, 2)}
+    if proc.returncode != 0:
+        result["error"] = (proc.stderr or proc.stdout).strip().splitlines()[-5:]
+    return result
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _find_pg_bin(name):
+    found = shutil.which(name)
+    if found:
+        return found
+    candidates = sorted(glob.glob(f"/usr/lib/postgresql/*/bin/{name}"))
+    return candidates[-1] if candidates else None
+
+
+def _pg_driver():
+    for module, dialect in (("psycopg2", "postgresql+psycopg2"), ("psycopg", "postgresql+psycopg")):
+        try:
+            __import__(module)
+            return dialect
+        except ImportError:
+            continue
+    return None
+
+
+def check_postgres(results):
+    url = os.getenv("CHECK_POSTGRES_URL")
+    if url:
+        results.append(_run_child("postgresql", url))
+        return
+
+    initdb, pg_ctl, dialect = _find_pg_bin("initdb"), _find_pg_bin("pg_ctl"), _pg_driver()
+    if not (initdb and pg_ctl and dialect):
+        results.append({"backend": "postgresql", "skipped": "no hay Postgres local o driver instalado"})
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = os.path.join(tmp, "data")
+        port = _free_port()
+        subprocess.run([initdb, "-D", data_dir, "-U", "postgres", "--auth=trust"], check=True, capture_output=True)
+        subprocess.run(
+            [pg_ctl, "-D", data_dir, "-w", "-l", os.path.join(tmp, "pg.log"),
+             "-o", f"-p {port} -k {tmp} -c listen_addresses=''", "start"],
+            check=True, capture_output=True,
+        )
+        try:
+            results.append(_run_child("postgresql", f"{dialect}://postgres@/postgres?host={tmp}&port={port}"))
+        finally:
+            subprocess.run([pg_ctl, "-D", data_dir, "-m", "fast", "stop"], capture_output=True)
+
+
+def main():
+    if "--child" in sys.argv:
+        exercise_endpoints()
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        results.append(_run_child("sqlite", f"sqlite:///{os.path.join(tmp, 'check.db')}"))
+    check_postgres(results)
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if not all(r.get("ok", True) for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# encoding.py
+"""
+Respuestas más livianas: JSON con orjson y compresión gzip/brotli negociada.
+
+- `JSONResponse` serializa con orjson (si está instalado; si no, con json de la
+  biblioteca estándar). Los endpoints más pedidos la devuelven directamente con
+  datos que ya salen de la base o de la caché, sin volver a pasar por el
+  response_model de Pydantic (que queda declarado solo para la documentación).
+- `CompressionMiddleware` comprime las respuestas de texto/JSON de más de
+  COMPRESS_MIN_BYTES (por defecto 1024) según el Accept-Encoding del cliente:
+  brotli si el paquete `brotli` está instalado y el cliente lo acepta, si no
+  gzip. Las respuestas por bloques (exportaciones) se comprimen bloque a bloque
+  y los eventos en tiempo real (SSE) no se tocan. Un ETag fuerte de una
+  respuesta comprimida lleva la codificación ("abc" -> "abc-gzip"): son otros
+  bytes, así que no puede tener el mismo validador que la versión sin comprimir.
+"""
+import json
+import os
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse as _StarletteJSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # buena relación tamaño/CPU para respuestas dinámicas
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+NEVER_COMPRESS_TYPES = ("text/event-stream",)
+
+
+def dumps(content) -> bytes:
+    """JSON compacto en UTF-8 (fechas en ISO 8601)."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def _default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if hasattr(value, "value"):  # Enum
+        return value.value
+    raise TypeError(f"No se puede serializar {type(value).__name__}")
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """ETag de la representación comprimida de una respuesta con ETag `etag`."""
+    if etag.startswith("W/") or not etag.endswith('"'):
+        return etag  # un ETag débil ya vale para cualquier representación
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def plain_etag(etag: str) -> str:
+    """El ETag del contenido, sin W/ ni la codificación que agregó encoded_etag."""
+    etag = etag.removeprefix("W/")
+    for encoding in ("gzip", "br"):
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+
+class JSONResponse(_StarletteJSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+# --- Compresión ---
+
+def _accepted(accept_encoding: str) -> dict:
+    """{codificación: q} del encabezado Accept-Encoding."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    return accepted
+
+
+def negotiate(accept_encoding: str):
+    """Devuelve "br", "gzip" o None."""
+    accepted = _accepted(accept_encoding or "")
+    wildcard = accepted.get("*", 0)
+    options = [("br", accepted.get("br", wildcard))] if brotli is not None else []
+    options.append(("gzip", accepted.get("gzip", wildcard)))
+    best = max(options, key=lambda option: option[1])  # ante empate, el primero (br)
+    return best[0] if best[1] > 0 else None
+
+
+class _Compressor:
+    def __init__(self, encoding):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._zlib = None
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: formato gzip
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        """Comprime un bloque y vacía el buffer, para que el cliente lo reciba sin esperar al siguiente."""
+        if self._brotli is not None:
+            out = self._brotli.process(data)
+            return out + (self._brotli.finish() if final else self._brotli.flush())
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _Responder(send, encoding, self.minimum_size).send)
+
+
+class _Responder:
+    def __init__(self, send, encoding, minimum_size):
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start = None
+        self.compressor = None
+        self.passthrough = False
+
+    def _compressible(self, headers):
+        if "content-encoding" in headers or self.start["status"] in (204, 304):
+            return False
+        content_type = headers.get("content-type", "")
+        if content_type.startswith(NEVER_COMPRESS_TYPES):
+            return False
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    async def send(self, message):
+        kind = message["type"]
+        if kind == "http.response.start":
+            # Se retiene hasta ver el primer bloque del cuerpo
+            self.start = message
+            return
+        if kind != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None:
+            headers = MutableHeaders(raw=self.start["headers"])
+            # Con una sola parte se sabe el tamaño; si es chica no vale la pena comprimirla
+            if not self._compressible(headers) or (not more_body and len(body) < self.minimum_size):
+                self.passthrough = True
+                await self._send(self.start)
+                await self._send(message)
+                return
+            self.compressor = _Compressor(self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if "etag" in headers:
+                headers["ETag"] = encoded_etag(headers["etag"], self.encoding)
+            if more_body:
+                del headers["Content-Length"]
+                await self._send(self.start)
+            else:
+                body = self.compressor.compress(body, final=True)
+                headers["Content-Length"] = str(len(body))
+                await self._send(self.start)
+                await self._send({"type": "http.response.body", "body": body})
+                return
+
+        await self._send({
+            "type": "http.response.body",
+            "body": self.compressor.compress(body, final=not more_body),
+            "more_body": more_body,
+        })
@@ -0,0 +1,136 @@
+# events.py
+"""
+Canal de novedades en tiempo real (ventas y cambios del catálogo).
+
+Un hub en memoria recibe cada venta confirmada y cada cambio de producto y lo
+reparte a los clientes conectados por WebSocket (/ws/events) o por
+Server-Sent Events (/events/stream). Cada cliente tiene una cola acotada: si
+no llega a leer, se descartan los eventos más viejos y el siguiente evento que
+recibe avisa cuántos se perdió (`dropped`), para que pueda volver a pedir el
+resumen completo. Así un cliente lento nunca frena a las cajas.
+
+Los eventos llevan un número `seq` creciente.
+
+El hub es por proceso: un cliente conectado a un worker no ve lo que pasa en
+los demás. Por eso, con varios workers (gunicorn.conf.py) hay que apagarlo con
+REALTIME_EVENTS=0; si no, gunicorn no arranca.
+"""
+import asyncio
+import itertools
+import json
+import os
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+
+ENABLED = os.getenv("REALTIME_EVENTS", "1") != "0"
+QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "256"))
+SSE_HEARTBEAT_SECONDS = 15
+
+
+class Subscriber:
+    def __init__(self, loop, maxlen):
+        self.loop = loop
+        self.queue = deque(maxlen=maxlen)
+        self.dropped = 0
+        self._ready = asyncio.Event()
+
+    def push(self, event):
+        # Se ejecuta siempre en el loop del suscriptor
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(event)
+        self._ready.set()
+
+    async def get(self, timeout=None):
+        """Espera el próximo evento. Devuelve None si pasó `timeout` sin novedades."""
+        if not self.queue:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        event = self.queue.popleft()
+        if self.dropped:
+            event = {**event, "dropped": self.dropped}
+            self.dropped = 0
+        return event
+
+
+class Hub:
+    def __init__(self, queue_size=QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+
+    def publish(self, event: dict):
+        """Reparte un evento. Se puede llamar desde cualquier hilo (los endpoints sync corren en un threadpool)."""
+        with self._lock:
+            event = {**event, "seq": next(self._seq)}
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.push, event)
+            except RuntimeError:
+                # El loop de ese suscriptor ya se cerró
+                self._discard(subscriber)
+
+    def _discard(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    @asynccontextmanager
+    async def subscribe(self):
+        subscriber = Subscriber(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        try:
+            yield subscriber
+        finally:
+            self._discard(subscriber)
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+
+hub = Hub()
+
+
+# --- Formato de los eventos ---
+
+def publish_sales(sales):
+    """Listener de sales.py: se llama con las ventas recién confirmadas."""
+    for sale in sales:
+        hub.publish({"type": "sale", "sale": sale})
+
+
+def publish_product(action: str, product: dict):
+    hub.publish({"type": "product", "action": action, "product": product})
+
+
+def publish_catalog(action: str, diff: dict):
+    """Un solo aviso para un cambio masivo del menú (las cajas vuelven a pedir /products/)."""
+    hub.publish({
+        "type": "catalog",
+        "action": action,
+        "created": len(diff["created"]),
+        "updated": len(diff["updated"]),
+        "deleted": len(diff["deleted"]),
+    })
+
+
+def sse_format(event) -> str:
+    return f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+
+async def sse_stream(request):
+    """Generador para StreamingResponse. Manda un comentario cada tanto para mantener viva la conexión."""
+    async with hub.subscribe() as subscriber:
+        yield ": conectado\n\n"
+        while not await request.is_disconnected():
+            event = await subscriber.get(timeout=SSE_HEARTBEAT_SECONDS)
+            if event is None:
+                yield ": ping\n\n"
+                continue
+            yield sse_format(event)
@@ -0,0 +1,146 @@
+# export.py
+"""
+Exportación de ventas crudas (GET /reports/export).
+
+Las filas (una por ítem vendido, con los datos de su venta) se leen con un
+cursor del lado del servidor en bloques de CHUNK_SIZE y se van escribiendo a
+la respuesta a medida que llegan, así la memoria usada no depende de cuánto
+historial se exporte. CSV siempre está disponible; Parquet requiere pyarrow.
+Con varias sucursales se exportan una detrás de otra, cada una desde su base.
+"""
+import csv
+import io
+
+from sqlalchemy import select
+
+import branches
+import models
+
+CHUNK_SIZE = 5000
+
+COLUMNS = [
+    "branch_id", "sale_id", "created_at", "payment_method", "sale_total",
+    "product_id", "product_name", "quantity", "unit_price",
+]
+
+
+def _rows_query(start, end, branch_id):
+    return (
+        select(
+            models.Sale.branch_id,
+            models.Sale.id,
+            models.Sale.created_at,
+            models.Sale.payment_method,
+            models.Sale.total_cents,
+            models.SaleItem.product_id,
+            models.SaleItem.product_name,
+            models.SaleItem.quantity,
+            models.SaleItem.unit_price_cents,
+        )
+        .join(models.SaleItem, models.SaleItem.sale_id == models.Sale.id)
+        .where(
+            models.Sale.branch_id == branch_id,
+            models.Sale.created_at >= start,
+            models.Sale.created_at < end,
+        )
+        .order_by(models.Sale.id, models.SaleItem.id)
+    )
+
+
+def _chunks(start, end, branch_ids):
+    """Genera listas de filas de a CHUNK_SIZE usando un cursor del servidor."""
+    for branch_id in branch_ids:
+        db = branches.store(branch_id).SessionLocal()
+        try:
+            result = db.execute(
+                _rows_query(start, end, branch_id),
+                execution_options={"stream_results": True, "yield_per": CHUNK_SIZE},
+            )
+            for partition in result.partitions():
+                yield partition
+        finally:
+            db.close()
+
+
+def _money(cents):
+    return f"{cents / 100:.2f}"
+
+
+def stream_csv(start, end, branch_ids):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for partition in _chunks(start, end, branch_ids):
+        for branch_id, sale_id, created_at, method, total_cents, product_id, name, qty, unit_cents in partition:
+            writer.writerow([
+                branch_id, sale_id, created_at.isoformat(), method, _money(total_cents),
+                product_id if product_id is not None else "", name, qty, _money(unit_cents),
+            ])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _DrainableSink(io.RawIOBase):
+    """Archivo en memoria del que se puede ir sacando lo ya escrito."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer.extend(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def stream_parquet(start, end, branch_ids):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("branch_id", pa.string()),
+        ("sale_id", pa.int64()),
+        ("created_at", pa.timestamp("us")),
+        ("payment_method", pa.string()),
+        ("sale_total_cents", pa.int64()),
+        ("product_id", pa.int64()),
+        ("product_name", pa.string()),
+        ("quantity", pa.int64()),
+        ("unit_price_cents", pa.int64()),
+    ])
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        # Cada bloque del cursor se escribe como un row group independiente
+        for partition in _chunks(start, end, branch_ids):
+            columns = list(zip(*partition))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
@@ -0,0 +1,90 @@
+# fake_mercadopago.py
+"""
+Servidor local que imita el endpoint de preferencias de Mercado Pago, para
+probar latencia y fallas sin salir a internet.
+
+Uso:
+    uvicorn fake_mercadopago:app --port 8081
+    MP_API_URL=http://127.0.0.1:8081 uvicorn main:app
+
+Variables de entorno (se pueden cambiar en caliente con PUT /_config):
+    FAKE_MP_LATENCY_MS      Demora fija de cada respuesta (por defecto 150)
+    FAKE_MP_JITTER_MS       Demora aleatoria extra, entre 0 y este valor (por defecto 100)
+    FAKE_MP_ERROR_RATE      Fracción de respuestas 500 (por defecto 0)
+    FAKE_MP_RATE_LIMIT_RATE Fracción de respuestas 429 (por defecto 0)
+    FAKE_MP_TIMEOUT_RATE    Fracción de peticiones que nunca responden a tiempo (por defecto 0)
+"""
+import asyncio
+import os
+import random
+import uuid
+
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="Fake Mercado Pago")
+
+config = {
+    "latency_ms": float(os.getenv("FAKE_MP_LATENCY_MS", "150")),
+    "jitter_ms": float(os.getenv("FAKE_MP_JITTER_MS", "100")),
+    "error_rate": float(os.getenv("FAKE_MP_ERROR_RATE", "0")),
+    "rate_limit_rate": float(os.getenv("FAKE_MP_RATE_LIMIT_RATE", "0")),
+    "timeout_rate": float(os.getenv("FAKE_MP_TIMEOUT_RATE", "0")),
+}
+stats = {"requests": 0, "errors": 0, "rate_limited": 0, "timeouts": 0, "replayed": 0}
+# X-Idempotency-Key -> preferencia ya creada (como la API real, un reintento no crea otra)
+created = {}
+
+
+@app.post("/checkout/preferences")
+async def create_preference(
+    preference: dict,
+    authorization: str = Header(None),
+    x_idempotency_key: str = Header(None),
+):
+    stats["requests"] += 1
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail={"message": "invalid access token"})
+    if x_idempotency_key in created:
+        stats["replayed"] += 1
+        return created[x_idempotency_key]
+
+    if random.random() < config["timeout_rate"]:
+        stats["timeouts"] += 1
+        await asyncio.sleep(3600)
+
+    delay = config["latency_ms"] + random.uniform(0, config["jitter_ms"])
+    await asyncio.sleep(delay / 1000)
+
+    roll = random.random()
+    if roll < config["error_rate"]:
+        stats["errors"] += 1
+        return JSONResponse(status_code=500, content={"message": "internal_error"})
+    if roll < config["error_rate"] + config["rate_limit_rate"]:
+        stats["rate_limited"] += 1
+        return JSONResponse(status_code=429, content={"message": "too_many_requests"}, headers={"Retry-After": "1"})
+
+    pref_id = f"fake-{uuid.uuid4().hex[:12]}"
+    result = {
+        "id": pref_id,
+        "items": preference.get("items", []),
+        "external_reference": preference.get("external_reference"),
+        "init_point": f"https://www.mercadopago.com.ar/checkout/v1/redirect?pref_id={pref_id}",
+        "sandbox_init_point": f"https://sandbox.mercadopago.com.ar/checkout/v1/redirect?pref_id={pref_id}",
+    }
+    if x_idempotency_key:
+        created[x_idempotency_key] = result
+    return result
+
+
+@app.get("/_config")
+def read_config():
+    return {"config": config, "stats": stats}
+
+
+@app.put("/_config")
+def update_config(changes: dict):
+    for key, value in changes.items():
+        if key in config:
+            config[key] = float(value)
+    return config
@@ -0,0 +1,227 @@
+# forecast.py
+"""
+Pronóstico de demanda por producto (GET /reports/forecast).
+
+Se usa el mismo modelo de siempre (regresión lineal de la cantidad vendida por
+día contra el día de la semana), pero resuelto en forma cerrada a partir de
+sumas acumuladas (n, Σx, Σy, Σxy, Σx²). Eso permite:
+
+- leer las cantidades diarias de `daily_product_sales` en vez de las ventas crudas;
+- guardar el modelo de cada producto en memoria, junto con el último ID de venta visto;
+- cuando entran ventas nuevas, reajustar solo los productos que se vendieron.
+
+Hay un caché de modelos por sucursal; el pronóstico de varias sucursales es la
+suma de los de cada una.
+
+En PostgreSQL los IDs se asignan antes del commit: una venta con ID menor al
+último visto puede confirmarse después. Por eso cada refresco vuelve a mirar
+las últimas FORECAST_RESCAN_IDS ventas por debajo de ese ID, y también refresca
+cuando cambió el sello de ventas de la sucursal (stamps.sales) aunque no haya
+IDs nuevos. Releer un (día, producto) no duplica nada: se toma la cantidad del
+día tal como está en el rollup.
+"""
+import os
+import threading
+import time
+from datetime import timedelta
+
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session
+
+import models
+import rollup
+import stamps
+import today
+
+# Mínimo de días con ventas para que el pronóstico de un producto sea útil
+MIN_DAYS = 10
+
+# Ventas por debajo del último ID visto que se vuelven a revisar en cada refresco
+RESCAN_IDS = int(os.getenv("FORECAST_RESCAN_IDS", "1000"))
+
+
+class ProductModel:
+    """Regresión lineal cantidad ~ día de la semana, actualizable día por día."""
+
+    def __init__(self):
+        self.days = {}  # fecha -> cantidad vendida ese día
+        self.n = 0
+        self.sx = 0.0
+        self.sy = 0.0
+        self.sxy = 0.0
+        self.sxx = 0.0
+        self.intercept = 0.0
+        self.slope = 0.0
+
+    def set_day(self, day, quantity):
+        old = self.days.get(day)
+        x = day.weekday()
+        if old is not None:
+            self._add(x, old, -1)
+        self.days[day] = quantity
+        self._add(x, quantity, 1)
+
+    def _add(self, x, y, sign):
+        self.n += sign
+        self.sx += sign * x
+        self.sy += sign * y
+        self.sxy += sign * x * y
+        self.sxx += sign * x * x
+
+    def fit(self):
+        if self.n == 0:
+            self.intercept = self.slope = 0.0
+            return
+        denominator = self.n * self.sxx - self.sx * self.sx
+        # Si todos los días son el mismo día de la semana la pendiente no está definida
+        self.slope = (self.n * self.sxy - self.sx * self.sy) / denominator if denominator else 0.0
+        self.intercept = (self.sy - self.slope * self.sx) / self.n
+
+    def predict(self, weekday):
+        return max(0, round(self.intercept + self.slope * weekday))
+
+
+class ForecastCache:
+    def __init__(self, branch_id: str = models.DEFAULT_BRANCH):
+        self.branch_id = branch_id
+        self._lock = threading.Lock()
+        self.models = {}
+        self.last_sale_id = None
+        self.sales_version = None
+
+    def refresh(self, db: Session, timings: dict):
+        """Pone los modelos al día con las ventas nuevas. Devuelve cuántos productos se reajustaron."""
+        started = time.perf_counter()
+        # El sello se lee antes que las ventas: lo que se confirme después lo vuelve a mover
+        version = stamps.read(db, stamps.sales(self.branch_id))
+        max_id = (
+            db.query(func.max(models.Sale.id)).filter(models.Sale.branch_id == self.branch_id).scalar() or 0
+        )
+
+        if self.last_sale_id is None or max_id < self.last_sale_id:
+            # Primera vez (o la base se reinició): se carga todo el historial diario
+            self.models = {}
+            rows = (
+                db.query(
+                    models.DailyProductSale.day,
+                    models.DailyProductSale.product_name,
+                    models.DailyProductSale.quantity,
+                )
+                .filter(models.DailyProductSale.branch_id == self.branch_id)
+                .all()
+            )
+        elif max_id > self.last_sale_id or version != self.sales_version:
+            # Solo los pares (día, producto) que tuvieron ventas desde la última vez
+            # (más las últimas RESCAN_IDS, por si alguna se confirmó tarde).
+            # El día local de cada venta (como las claves de rollup.py) se calcula acá
+            changed = (
+                db.query(models.Sale.created_at, models.SaleItem.product_name)
+                .join(models.Sale)
+                .filter(
+                    models.Sale.branch_id == self.branch_id,
+                    models.Sale.id > self.last_sale_id - RESCAN_IDS,
+                    models.Sale.id <= max_id,
+                )
+                .distinct()
+                .all()
+            )
+            keys = list({(today.local_date(created_at), name) for created_at, name in changed})
+            rows = []
+            if keys:
+                rows = (
+                    db.query(
+                        models.DailyProductSale.day,
+                        models.DailyProductSale.product_name,
+                        models.DailyProductSale.quantity,
+                    )
+                    .filter(
+                        models.DailyProductSale.branch_id == self.branch_id,
+                        tuple_(models.DailyProductSale.day, models.DailyProductSale.product_name).in_(keys),
+                    )
+                    .all()
+                )
+        else:
+            rows = []
+        timings["load_ms"] = _elapsed_ms(started)
+
+        started = time.perf_counter()
+        touched = set()
+        for day, product_name, quantity in rows:
+            model = self.models.get(product_name)
+            if model is None:
+                model = self.models[product_name] = ProductModel()
+            model.set_day(rollup.as_date(day), quantity)
+            touched.add(product_name)
+        for product_name in touched:
+            self.models[product_name].fit()
+        self.last_sale_id = max_id
+        self.sales_version = version
+        timings["fit_ms"] = _elapsed_ms(started)
+        return len(touched)
+
+    def forecast(self, db: Session, horizon: int = 1, products=None):
+        timings = {}
+        started = time.perf_counter()
+        with self._lock:
+            refit = self.refresh(db, timings)
+
+            predict_started = time.perf_counter()
+            first_day = today.local_now().date()
+            wanted = set(products) if products else None
+            days = []
+            for offset in range(horizon):
+                day = first_day + timedelta(days=offset)
+                predictions = {
+                    name: model.predict(day.weekday())
+                    for name, model in self.models.items()
+                    if model.n >= MIN_DAYS and (wanted is None or name in wanted)
+                }
+                days.append({"date": day.isoformat(), "predicted_demand": predictions})
+            has_history = bool(self.models)
+        timings["predict_ms"] = _elapsed_ms(predict_started)
+        timings["total_ms"] = _elapsed_ms(started)
+
+        return {
+            "has_history": has_history,
+            "days": days,
+            "refit_products": refit,
+            "timings": timings,
+        }
+
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 3)
+
+
+_caches_lock = threading.Lock()
+_caches = {}  # sucursal -> ForecastCache
+
+
+def cache_for(branch_id: str) -> ForecastCache:
+    with _caches_lock:
+        cache = _caches.get(branch_id)
+        if cache is None:
+            cache = _caches[branch_id] = ForecastCache(branch_id)
+    return cache
+
+
+def merge(results):
+    """Suma los pronósticos de varias sucursales (todos con el mismo horizonte)."""
+    results = list(results)
+    days = []
+    for per_branch in zip(*(result["days"] for result in results)):
+        demand = {}
+        for day in per_branch:
+            for name, quantity in day["predicted_demand"].items():
+                demand[name] = demand.get(name, 0) + quantity
+        days.append({"date": per_branch[0]["date"], "predicted_demand": demand})
+    return {
+        "has_history": any(result["has_history"] for result in results),
+        "days": days,
+        "refit_products": sum(result["refit_products"] for result in results),
+        # Las sucursales se calculan en paralelo: cuenta la más lenta
+        "timings": {
+            key: max(result["timings"][key] for result in results)
+            for key in results[0]["timings"]
+        },
+    }
@@ -19,7 +19,8 @@ const API_URL = 'https://cafe-system-7nhg.onrender.com';
     // Cargar y mostrar productos en la tabla
     const loadProducts = async () => {
         try {
-            const response = await fetch(`${API_URL}/products/`);
+            // Revalida con el ETag: si el catálogo no cambió el servidor responde 304
+            const response = await fetch(`${API_URL}/products/`, { cache: 'no-cache' });
             const products = await response.json();
             
             tableBody.innerHTML = ''; // Limpiar tabla
@@ -125,15 +126,17 @@ document.addEventListener('DOMContentLoaded', () => {
     const mpTokenInput = document.getElementById('mp-token');
     const saveTokenBtn = document.getElementById('save-token-btn');
 
-    // Cargar el token actual (si existe)
-    const loadToken = async () => {
+    // Toda la configuración que usa el panel, en un solo pedido
+    const ADMIN_SETTINGS = ['mp_access_token'];
+
+    const loadSettings = async () => {
         try {
-            const response = await fetch(`${API_URL}/settings/mp_access_token`);
-            const data = await response.json();
-            if (data.value) {
-                mpTokenInput.value = data.value;
+            const response = await fetch(`${API_URL}/settings?keys=${ADMIN_SETTINGS.join(',')}`);
+            const values = await response.json();
+            if (values.mp_access_token) {
+                mpTokenInput.value = values.mp_access_token;
             }
-        } catch (error) { console.error('No se pudo cargar el token.'); }
+        } catch (error) { console.error('No se pudo cargar la configuración.'); }
     };
 
     // Guardar el token
@@ -160,7 +163,7 @@ document.addEventListener('DOMContentLoaded', () => {
     
     // Carga inicial
     loadProducts();
-    loadToken(); // Cargar token al iniciar
+    loadSettings(); // Cargar la configuración al iniciar
 });
     
     // Event Listeners
@@ -3,11 +3,20 @@ document.addEventListener('DOMContentLoaded', () => {
     // --- URL de nuestra API Backend ---
     // Ejemplo
 const API_URL = 'https://cafe-system-7nhg.onrender.com';
+    // Sucursal de esta caja (se configura una vez con localStorage.setItem('branch_id', '...')).
+    // Sin configurar, el servidor usa su sucursal por defecto.
+    const BRANCH_ID = localStorage.getItem('branch_id');
+
+    function branchQuery(params = new URLSearchParams()) {
+        if (BRANCH_ID) params.set('branch', BRANCH_ID);
+        return params;
+    }
 
     // --- ESTADO DE LA APLICACIÓN ---
     let menuData = []; // Ahora empieza vacío y se llenará desde la API
     let currentOrder = [];
     let activeCategory = 'Todos';
+    let searchResults = null; // productos que devolvió la búsqueda en el servidor (null = sin búsqueda)
     let orderCounter = 125;
     let currentTotal = 0;
     let selectedPaymentMethod = null;
@@ -16,6 +25,7 @@ const API_URL = 'https://cafe-system-7nhg.onrender.com';
     // (Esta sección no cambia)
     const categoryNav = document.getElementById('category-nav');
     const productGrid = document.getElementById('product-grid');
+    const productSearchInput = document.getElementById('product-search');
     const orderList = document.getElementById('order-list');
     const subtotalPriceEl = document.getElementById('subtotal-price');
     const totalPriceEl = document.getElementById('total-price');
@@ -34,15 +44,27 @@ const API_URL = 'https://cafe-system-7nhg.onrender.com';
     const confirmPaymentBtn = document.getElementById('confirm-payment-btn');
 
     // --- FUNCIÓN PARA CARGAR DATOS DESDE LA API ---
+    // `cache: 'no-cache'` hace que el navegador revalide con el ETag: si el menú
+    // no cambió, el servidor responde 304 y se reutiliza la copia local.
+    // El listado viene paginado: se siguen las páginas con X-Next-Cursor hasta el final.
+    const MENU_PAGE_SIZE = 500;
+
     async function fetchMenuData() {
         try {
-            const response = await fetch(`${API_URL}/products/`);
-            if (!response.ok) {
-                throw new Error('No se pudo conectar a la API.');
-            }
-            const data = await response.json();
+            const products = [];
+            let cursor = null;
+            do {
+                const params = branchQuery(new URLSearchParams({ limit: MENU_PAGE_SIZE }));
+                if (cursor !== null) params.set('after_id', cursor);
+                const response = await fetch(`${API_URL}/products/?${params}`, { cache: 'no-cache' });
+                if (!response.ok) {
+                    throw new Error('No se pudo conectar a la API.');
+                }
+                products.push(...await response.json());
+                cursor = response.headers.get('X-Next-Cursor');
+            } while (cursor !== null);
             // ¡Guardamos los productos de la API en nuestro estado!
-            menuData = data;
+            menuData = products;
         } catch (error) {
             console.error("Error al cargar el menú:", error);
             // Mostrar un mensaje de error en la interfaz
@@ -51,6 +73,29 @@ const API_URL = 'https://cafe-system-7nhg.onrender.com';
     }
 
 
+    // --- AVISO DE CAMBIOS EN EL MENÚ ---
+    // Cada tanto preguntamos la versión del catálogo (una respuesta mínima) y solo
+    // volvemos a pedir el menú completo si cambió.
+    const MENU_POLL_MS = 30000;
+    let menuEtag = null;
+
+    async function checkMenuVersion() {
+        try {
+            const response = await fetch(`${API_URL}/products/version`, { cache: 'no-store' });
+            if (!response.ok) return;
+            const { etag } = await response.json();
+            if (menuEtag !== null && etag !== menuEtag) {
+                await fetchMenuData();
+                renderCategories();
+                renderProducts();
+            }
+            menuEtag = etag;
+        } catch (error) {
+            console.warn('No se pudo consultar la versión del menú:', error);
+        }
+    }
+
+
     // --- FUNCIONES DE RENDERIZADO ---
     // (Estas funciones no cambian, pero ahora usarán `menuData` cargado de la API)
     function renderCategories() {
@@ -63,7 +108,8 @@ const API_URL = 'https://cafe-system-7nhg.onrender.com';
 
     function renderProducts() {
         if (menuData.length === 0) return;
-        const filteredProducts = activeCategory === 'Todos' ? menuData : menuData.filter(p => p.category === activeCategory);
+        const source = searchResults ?? menuData;
+        const filteredProducts = activeCategory === 'Todos' ? source : source.filter(p => p.category === activeCategory);
         
         // ¡ACTUALIZADO! Para manejar productos con y sin opciones.
         productGrid.innerHTML = filteredProducts.map(product => `
@@ -124,10 +170,174 @@ const API_URL = 'https://cafe-system-7nhg.onrender.com';
 
     // ... (código anterior) ...
 
+    // --- COLA DE VENTAS SIN CONEXIÓN (OUTBOX) ---
+    // Cada venta se guarda primero en IndexedDB y se envía al servidor en segundo plano,
+    // así la caja no espera al backend y no se pierden ventas si se corta la red.
+    // El servidor descarta duplicados usando el `idempotency_key` (UUID) de cada venta.
+    // Solo se reintentan los errores de red, los 5xx y los 429: una venta que el servidor
+    // rechaza (4xx) pasa a la cuarentena para que no trabe a las que vienen detrás.
+    const OUTBOX_DB = 'cafe-system';
+    const OUTBOX_STORE = 'sales-outbox';
+    const QUARANTINE_STORE = 'sales-quarantine';
+    const OUTBOX_BATCH_SIZE = 50;
+    const RETRY_BASE_MS = 1000;
+    const RETRY_MAX_MS = 60000;
+    const pendingSyncEl = document.getElementById('pending-sync');
+
+    let outboxDbPromise = null;
+    let isFlushing = false;
+    let retryDelay = RETRY_BASE_MS;
+    let retryTimer = null;
+
+    function openOutbox() {
+        if (!outboxDbPromise) {
+            outboxDbPromise = new Promise((resolve, reject) => {
+                const request = indexedDB.open(OUTBOX_DB, 2);
+                request.onupgradeneeded = () => {
+                    const db = request.result;
+                    for (const name of [OUTBOX_STORE, QUARANTINE_STORE]) {
+                        if (!db.objectStoreNames.contains(name)) {
+                            db.createObjectStore(name, { keyPath: 'idempotency_key' });
+                        }
+                    }
+                };
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => reject(request.error);
+            });
+        }
+        return outboxDbPromise;
+    }
+
+    async function outboxRequest(mode, action, storeNames = OUTBOX_STORE) {
+        const db = await openOutbox();
+        return new Promise((resolve, reject) => {
+            const tx = db.transaction(storeNames, mode);
+            const request = action(Array.isArray(storeNames) ? tx : tx.objectStore(storeNames));
+            tx.oncomplete = () => resolve(request ? request.result : undefined);
+            tx.onerror = () => reject(tx.error);
+        });
+    }
+
+    const addToOutbox = (sale) => outboxRequest('readwrite', store => store.put(sale));
+    const readOutbox = () => outboxRequest('readonly', store => store.getAll(null, OUTBOX_BATCH_SIZE));
+    const countOutbox = () => outboxRequest('readonly', store => store.count());
+    const countQuarantine = () => outboxRequest('readonly', store => store.count(), QUARANTINE_STORE);
+    const removeFromOutbox = (keys) => outboxRequest('readwrite', store => {
+        keys.forEach(key => store.delete(key));
+        return null;
+    });
+    // Saca la venta de la cola y la guarda aparte con la respuesta del servidor, en una sola transacción
+    const quarantineSale = (sale, status, detail) => outboxRequest('readwrite', tx => {
+        tx.objectStore(OUTBOX_STORE).delete(sale.idempotency_key);
+        tx.objectStore(QUARANTINE_STORE).put({
+            ...sale,
+            error_status: status,
+            error_detail: detail,
+            quarantined_at: new Date().toISOString()
+        });
+        return null;
+    }, [OUTBOX_STORE, QUARANTINE_STORE]);
+
+    function newSaleId() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        return `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+    }
+
+    async function updatePendingBadge() {
+        try {
+            const pending = await countOutbox();
+            const rejected = await countQuarantine();
+            const parts = [];
+            if (pending > 0) parts.push(`${pending} venta${pending === 1 ? '' : 's'} sin sincronizar`);
+            if (rejected > 0) parts.push(`${rejected} rechazada${rejected === 1 ? '' : 's'} por el servidor`);
+            pendingSyncEl.textContent = parts.join(' · ');
+            pendingSyncEl.classList.toggle('has-rejected', rejected > 0);
+            pendingSyncEl.style.display = parts.length > 0 ? 'inline-block' : 'none';
+        } catch (error) {
+            console.error('No se pudo leer la cola de ventas:', error);
+        }
+    }
+
+    function scheduleRetry() {
+        clearTimeout(retryTimer);
+        // Backoff exponencial con algo de azar para que todas las cajas no reintenten juntas
+        const delay = retryDelay + Math.random() * retryDelay * 0.2;
+        retryTimer = setTimeout(flushOutbox, delay);
+        retryDelay = Math.min(retryDelay * 2, RETRY_MAX_MS);
+    }
+
+    // Un 4xx (salvo 408 y 429) no se arregla reintentando la misma venta
+    const isRejection = (status) => status >= 400 && status < 500 && status !== 408 && status !== 429;
+
+    function postSales(sales) {
+        return fetch(`${API_URL}/sales/batch?${branchQuery()}`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(sales)
+        });
+    }
+
+    async function responseDetail(response) {
+        try {
+            return (await response.json()).detail;
+        } catch (error) {
+            return null;
+        }
+    }
+
+    async function flushOutbox() {
+        if (isFlushing) return;
+        isFlushing = true;
+        clearTimeout(retryTimer);
+        try {
+            let pending = await readOutbox();
+            while (pending.length > 0) {
+                const response = await postSales(pending);
+                if (response.ok) {
+                    await removeFromOutbox(pending.map(sale => sale.idempotency_key));
+                } else if (isRejection(response.status)) {
+                    // El lote se rechaza entero: se manda de a una venta para encontrar las que fallan
+                    for (const sale of pending) {
+                        const single = pending.length === 1 ? response : await postSales([sale]);
+                        if (single.ok) {
+                            await removeFromOutbox([sale.idempotency_key]);
+                        } else if (isRejection(single.status)) {
+                            console.error(`Venta ${sale.idempotency_key} rechazada (${single.status})`);
+                            await quarantineSale(sale, single.status, await responseDetail(single));
+                        } else {
+                            throw new Error(`El servidor respondió ${single.status}`);
+                        }
+                    }
+                } else {
+                    throw new Error(`El servidor respondió ${response.status}`);
+                }
+                await updatePendingBadge();
+                pending = await readOutbox();
+            }
+            retryDelay = RETRY_BASE_MS;
+        } catch (error) {
+            console.warn('No se pudieron sincronizar las ventas, se reintentará:', error);
+            scheduleRetry();
+        } finally {
+            isFlushing = false;
+            updatePendingBadge();
+        }
+    }
+
+    window.addEventListener('online', () => {
+        retryDelay = RETRY_BASE_MS;
+        flushOutbox();
+    });
+
     // --- LÓGICA DE NEGOCIO ---
     async function finalizeSale() {
         // 1. Preparar los datos de la venta para enviar a la API
         const saleData = {
+            idempotency_key: newSaleId(),
+            // Hora de la caja: si la venta se sincroniza más tarde, cuenta en el día en que se hizo
+            created_at: new Date().toISOString(),
             total_amount: currentTotal,
             payment_method: selectedPaymentMethod,
             items: currentOrder.map(item => ({
@@ -137,25 +347,14 @@ const API_URL = 'https://cafe-system-7nhg.onrender.com';
             }))
         };
 
-        // 2. Enviar la venta al backend para que la guarde
+        // 2. Guardar la venta localmente y enviarla al backend en segundo plano
         try {
-            const response = await fetch(`${API_URL}/sales/`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(saleData)
-            });
-
-            if (!response.ok) {
-                // Si falla el guardado, informamos al usuario pero no detenemos el flujo
-                alert('Hubo un error al registrar la venta, pero el cobro fue exitoso.');
-            }
-
-            const savedSale = await response.json();
-            console.log('Venta guardada con éxito:', savedSale);
-
+            await addToOutbox(saleData);
+            updatePendingBadge();
+            flushOutbox();
         } catch (error) {
-            console.error('Error de red al guardar la venta:', error);
-            alert('Hubo un error de red al registrar la venta, pero el cobro fue exitoso.');
+            console.error('Error al guardar la venta en la cola local:', error);
+            alert('Hubo un error al registrar la venta, pero el cobro fue exitoso.');
         }
 
         // 3. Mostrar confirmación al usuario y reiniciar la interfaz
@@ -252,15 +451,56 @@ closeQrModalBtn.addEventListener('click', () => {
         if (e.target.tagName === 'BUTTON') {
             activeCategory = e.target.dataset.category;
             renderCategories();
+            if (searchResults !== null) {
+                searchProducts();
+            } else {
+                renderProducts();
+            }
+        }
+    });
+
+    // --- BÚSQUEDA DE PRODUCTOS ---
+    // La búsqueda (por prefijo y tolerante a errores de tipeo) la hace el servidor.
+    // Sin conexión se cae a un filtro local simple sobre el menú cargado.
+    const SEARCH_DEBOUNCE_MS = 200;
+    let searchTimer = null;
+    let searchSeq = 0;
+
+    async function searchProducts() {
+        const query = productSearchInput.value.trim();
+        const seq = ++searchSeq;
+        if (!query) {
+            searchResults = null;
             renderProducts();
+            return;
+        }
+        let results;
+        try {
+            const params = branchQuery(new URLSearchParams({ q: query, limit: 1000 }));
+            if (activeCategory !== 'Todos') params.set('category', activeCategory);
+            const response = await fetch(`${API_URL}/products/?${params}`);
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            results = await response.json();
+        } catch (error) {
+            const needle = query.toLowerCase();
+            results = menuData.filter(p => p.name.toLowerCase().includes(needle));
         }
+        // Si mientras tanto se escribió otra cosa, esta respuesta ya no sirve
+        if (seq !== searchSeq) return;
+        searchResults = results;
+        renderProducts();
+    }
+
+    productSearchInput.addEventListener('input', () => {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(searchProducts, SEARCH_DEBOUNCE_MS);
     });
 
     productGrid.addEventListener('click', e => {
         const card = e.target.closest('.product-card');
         if (!card) return;
         const productId = parseInt(card.dataset.id, 10);
-        const product = menuData.find(p => p.id === productId);
+        const product = menuData.find(p => p.id === productId) ?? searchResults?.find(p => p.id === productId);
 
         // Lógica simplificada: agregar directamente el producto a la orden
         // En el futuro, aquí se podría abrir un modal si el producto tiene opciones
@@ -320,6 +560,9 @@ closeQrModalBtn.addEventListener('click', () => {
         renderCategories();    // Luego renderiza todo
         renderProducts();
         renderOrder();
+        flushOutbox();         // Envía las ventas que hayan quedado pendientes
+        checkMenuVersion();
+        setInterval(checkMenuVersion, MENU_POLL_MS);
     }
 
     init();
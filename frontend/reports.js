@@ -10,34 +10,105 @@ document.addEventListener('DOMContentLoaded', () => {
     const startDateInput = document.getElementById('start-date');
     const endDateInput = document.getElementById('end-date');
     const customRangeBtn = document.getElementById('custom-range-btn');
+    const liveBtn = document.getElementById('live-btn');
 
     let topProductsChart;
 
+    // Estado del reporte actual. Se guarda la cantidad de *todos* los productos
+    // (no solo el top 5) para poder sumarle las ventas que llegan en vivo.
+    const TOP_N = 5;
+    let currentRange = null;
+    let report = { revenue: 0, sales: 0, products: new Map() };
+    let eventSource = null;
+
     // Función para formatear fechas a YYYY-MM-DD
     const formatDate = (date) => date.toISOString().split('T')[0];
 
     // Función principal para cargar datos y actualizar la UI
     const fetchReportData = async (startDate, endDate) => {
+        currentRange = { start: startDate, end: endDate };
         try {
-            const response = await fetch(`${API_URL}/reports/summary?start_date=${startDate}&end_date=${endDate}`);
+            const response = await fetch(`${API_URL}/reports/summary?start_date=${startDate}&end_date=${endDate}&top=1000`);
             const data = await response.json();
 
-            totalRevenueEl.textContent = `$ ${data.total_revenue.toLocaleString('es-AR', { minimumFractionDigits: 2 })}`;
-            totalSalesEl.textContent = data.total_sales;
-            averageTicketEl.textContent = `$ ${data.average_ticket.toLocaleString('es-AR', { minimumFractionDigits: 2 })}`;
-
-            updateChart(data.top_products);
+            report = {
+                revenue: data.total_revenue,
+                sales: data.total_sales,
+                products: new Map(data.top_products.map(p => [p.name, p.quantity])),
+            };
+            renderReport();
         } catch (error) {
             console.error("Error al cargar reportes:", error);
         }
     };
 
+    const renderReport = () => {
+        const average = report.sales > 0 ? report.revenue / report.sales : 0;
+        totalRevenueEl.textContent = `$ ${report.revenue.toLocaleString('es-AR', { minimumFractionDigits: 2 })}`;
+        totalSalesEl.textContent = report.sales;
+        averageTicketEl.textContent = `$ ${average.toLocaleString('es-AR', { minimumFractionDigits: 2 })}`;
+
+        const topProducts = [...report.products.entries()]
+            .map(([name, quantity]) => ({ name, quantity }))
+            .sort((a, b) => b.quantity - a.quantity)
+            .slice(0, TOP_N);
+        updateChart(topProducts);
+    };
+
+    // --- MODO EN VIVO ---
+    // Recibe cada venta por Server-Sent Events y la suma al reporte en pantalla,
+    // sin volver a pedir el resumen al servidor.
+    const applySale = (sale) => {
+        // Día local de la venta según el servidor, el mismo con el que agrupa el resumen
+        const day = sale.day;
+        if (!currentRange || day < currentRange.start || day > currentRange.end) return;
+
+        report.revenue += sale.total_amount;
+        report.sales += 1;
+        sale.items.forEach(item => {
+            report.products.set(item.product_name, (report.products.get(item.product_name) || 0) + item.quantity);
+        });
+        renderReport();
+    };
+
+    const resync = () => {
+        if (currentRange) fetchReportData(currentRange.start, currentRange.end);
+    };
+
+    const startLive = () => {
+        eventSource = new EventSource(`${API_URL}/events/stream`);
+        // Al (re)conectar pudimos perdernos ventas: partimos de un resumen fresco
+        eventSource.onopen = resync;
+        eventSource.addEventListener('sale', (e) => {
+            const event = JSON.parse(e.data);
+            if (event.dropped) {
+                // El servidor descartó eventos porque no los leímos a tiempo
+                resync();
+                return;
+            }
+            applySale(event.sale);
+        });
+        liveBtn.classList.add('live');
+    };
+
+    const stopLive = () => {
+        if (eventSource) eventSource.close();
+        eventSource = null;
+        liveBtn.classList.remove('live');
+    };
+
+    liveBtn.addEventListener('click', () => (eventSource ? stopLive() : startLive()));
+
     // Función para actualizar el gráfico
     const updateChart = (topProducts) => {
         const ctx = document.getElementById('top-products-chart').getContext('2d');
         
         if (topProductsChart) {
-            topProductsChart.destroy();
+            // Actualizamos el gráfico existente en lugar de recrearlo en cada venta
+            topProductsChart.data.labels = topProducts.map(p => p.name);
+            topProductsChart.data.datasets[0].data = topProducts.map(p => p.quantity);
+            topProductsChart.update('none');
+            return;
         }
 
         topProductsChart = new Chart(ctx, {
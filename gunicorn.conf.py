@@ -0,0 +1,69 @@
+# gunicorn.conf.py
+"""
+Modo con varios workers: gunicorn como gestor de procesos y uvicorn en cada worker.
+
+    gunicorn main:app                      (desde la carpeta del proyecto toma esta configuración)
+    REALTIME_EVENTS=0 WEB_CONCURRENCY=4 gunicorn main:app
+
+Variables de entorno:
+    PORT / BIND           Dónde escuchar (por defecto 0.0.0.0:$PORT, o 0.0.0.0:8000)
+    WEB_CONCURRENCY       Cantidad de workers (por defecto 2 por CPU, como máximo 8,
+                          o 1 si los eventos en tiempo real están activos)
+    REALTIME_EVENTS       0 para apagar /ws/events y /events/stream, que son por
+                          proceso (ver events.py). Con más de un worker es obligatorio:
+                          si no, gunicorn no arranca
+    GUNICORN_TIMEOUT      Segundos sin responder antes de reiniciar un worker (por defecto 60)
+    CACHE_SYNC_INTERVAL   Cada cuántos segundos cada worker revisa si otro modificó el
+                          catálogo o la configuración (por defecto 1, ver stamps.py)
+    SQLITE_BUSY_TIMEOUT_MS  Acá por defecto 30000 (ver database.py): con SQLite las
+                          ventas de todos los workers se escriben de a una y, con
+                          carga, la espera por el lock supera los 5 s de un solo proceso
+
+Con preload la app se importa una sola vez en el proceso principal y los
+workers la heredan ya cargada (importar main no abre conexiones, ver main.py).
+Antes de crear los workers, el proceso principal corre una vez las migraciones,
+la carga inicial del menú, el resumen diario y el libro de ventas, así los
+workers no compiten por hacerlo: en cada uno esos hooks de startup terminan
+con una consulta.
+
+Entre workers se mantienen coherentes el catálogo y la configuración (stamps.py),
+los contadores de GET /reports/today (sello de ventas, ver today.py) y los
+reportes de /reports/jobs (tabla report_jobs, ver jobs.py). Lo único que queda
+por proceso son las métricas de /metrics.
+"""
+import multiprocessing
+import os
+
+# Antes de importar la app (database.py la lee al crear las conexiones)
+os.environ.setdefault("SQLITE_BUSY_TIMEOUT_MS", "30000")
+
+bind = os.getenv("BIND") or f"0.0.0.0:{os.getenv('PORT', '8000')}"
+REALTIME_EVENTS = os.getenv("REALTIME_EVENTS", "1") != "0"  # igual que events.ENABLED
+workers = int(os.getenv("WEB_CONCURRENCY") or (1 if REALTIME_EVENTS else min(8, 2 * multiprocessing.cpu_count())))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+
+
+def on_starting(server):
+    # La cantidad de workers puede venir también de la línea de comandos (--workers)
+    if server.cfg.workers > 1 and REALTIME_EVENTS:
+        raise RuntimeError(
+            "Los eventos en tiempo real (/ws/events, /events/stream) son por proceso: "
+            "con más de un worker hay que apagarlos con REALTIME_EVENTS=0"
+        )
+    # Con preload_app esto corre después de importar main y antes de crear los workers
+    import branches
+    import database
+    import main
+
+    main.run_migrations_on_startup()
+    main.populate_db_on_startup()
+    main.backfill_rollup_on_startup()
+    main.backfill_ledger_on_startup()
+    # Las conexiones abiertas acá no se pueden compartir con los procesos hijos
+    for branch_store in branches.databases():
+        branch_store.engine.dispose()
+    database.engine.dispose()
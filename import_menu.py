@@ -0,0 +1,105 @@
+# import_menu.py
+"""
+Carga un menú completo en la API con un solo PUT /products/bulk.
+
+El archivo puede ser JSON (una lista de productos, o {"products": [...]}) o CSV
+con columnas name, price, category y description. Los productos se comparan
+por nombre: los nuevos se crean, los que cambiaron se actualizan y el resto
+queda igual, así que se puede volver a correr con el mismo archivo.
+
+Uso:
+    python import_menu.py menu.json
+    python import_menu.py menu.csv --url https://cafe-system-7nhg.onrender.com --prune
+    python import_menu.py menu.csv --dry-run
+"""
+import argparse
+import csv
+import json
+import sys
+
+import requests
+
+DEFAULT_URL = "http://127.0.0.1:8000"
+
+
+def _price(value):
+    value = str(value).strip()
+    # "3300,50" -> 3300.50 (si no hay punto, la coma es el separador decimal)
+    if "," in value and "." not in value:
+        value = value.replace(",", ".")
+    return float(value)
+
+
+def read_menu(path: str):
+    """Lee los productos de un archivo JSON o CSV."""
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, encoding="utf-8") as f:
+            rows = json.load(f)
+        if isinstance(rows, dict):
+            rows = rows["products"]
+    return [_product(row) for row in rows if (row.get("name") or "").strip()]
+
+
+def _product(row: dict) -> dict:
+    product = {
+        "name": row["name"].strip(),
+        "price": _price(row["price"]),
+        "category": row["category"].strip(),
+    }
+    # Sin columna description la API conserva la descripción que ya tenga el producto
+    if "description" in row:
+        product["description"] = (row["description"] or "").strip()
+    return product
+
+
+def push(base_url: str, products, prune: bool = False, dry_run: bool = False) -> dict:
+    """Manda el menú completo en un solo pedido y devuelve la diferencia que calculó la API."""
+    response = requests.put(
+        base_url.rstrip("/") + "/products/bulk",
+        params={"prune": str(prune).lower(), "dry_run": str(dry_run).lower()},
+        json=products,
+        timeout=60,
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def print_diff(diff: dict):
+    for name in diff["created"]:
+        print(f"  + {name}")
+    for change in diff["updated"]:
+        details = ", ".join(f"{field}: {old!r} -> {new!r}" for field, (old, new) in change["changes"].items())
+        print(f"  ~ {change['name']} ({details})")
+    for name in diff["deleted"]:
+        print(f"  - {name}")
+    print(
+        f"Creados: {len(diff['created'])}, modificados: {len(diff['updated'])}, "
+        f"sin cambios: {len(diff['unchanged'])}, borrados: {len(diff['deleted'])}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="Archivo .json o .csv con el menú")
+    parser.add_argument("--url", default=DEFAULT_URL, help=f"URL base de la API (por defecto {DEFAULT_URL})")
+    parser.add_argument("--prune", action="store_true", help="Borrar los productos que no están en el archivo")
+    parser.add_argument("--dry-run", action="store_true", help="Mostrar qué cambiaría, sin guardar")
+    args = parser.parse_args()
+
+    products = read_menu(args.path)
+    try:
+        diff = push(args.url, products, prune=args.prune, dry_run=args.dry_run)
+    except requests.exceptions.ConnectionError:
+        sys.exit(f"Error de conexión: no se pudo conectar a la API en {args.url}")
+    except requests.exceptions.HTTPError as exc:
+        sys.exit(f"La API rechazó el menú: {exc.response.status_code} {exc.response.text}")
+    if args.dry_run:
+        print("(simulación: no se guardó nada)")
+    print_diff(diff)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+# jobs.py
+"""
+Trabajos de reportes en segundo plano (POST /reports/jobs, GET /reports/jobs/{id}).
+
+Los reportes pesados (pronósticos de muchas sucursales, resúmenes de rangos
+largos, exportaciones completas) no se calculan en el hilo del pedido: se
+encolan y los corren unos pocos hilos despachadores, cada uno mandando el
+cálculo a un pool de procesos (REPORT_JOB_WORKERS, por defecto 2). Así el CPU
+que usan nunca compite con el GIL del proceso que atiende a las cajas.
+
+El estado de cada trabajo se guarda en la tabla report_jobs de la base
+principal: lo corre el worker que recibió el POST, pero cualquier worker
+responde GET /reports/jobs/{id}. Si el proceso que lo corría terminó antes de
+completarlo, el trabajo pasa a error.
+
+Los resultados se reutilizan por tipo y parámetros: pedir el mismo reporte
+devuelve el trabajo ya hecho (o el que está en curso) si las ventas que lee no
+cambiaron. Para saberlo cada trabajo guarda al encolarse una huella por
+sucursal (`inputs`): el sello de ventas (stamps.sales) para los pronósticos, y
+la recaudación y los tickets del rango en el rollup para los resúmenes y
+exportaciones. Se compara al volver a pedirlo, así las ventas no tocan la tabla
+de trabajos; los reportes de días cerrados se siguen reutilizando.
+
+Las exportaciones se escriben a un archivo en REPORT_JOBS_DIR (compartido por
+los workers de una misma máquina) y se descargan con GET /reports/jobs/{id}/download.
+"""
+import json
+import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime
+
+from sqlalchemy import delete, func, select, update
+
+import models
+
+WORKERS = int(os.getenv("REPORT_JOB_WORKERS", "2"))
+JOBS_DIR = os.getenv("REPORT_JOBS_DIR", "./report_jobs")
+MAX_JOBS = 200  # trabajos terminados que se recuerdan (y archivos que se conservan)
+
+KINDS = ("forecast", "summary", "export")
+
+
+def to_dict(job: models.ReportJob) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "params": job.params,
+        "status": job.status,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "result": job.result,
+        "error": job.error,
+    }
+
+
+# --- Validación de parámetros (en el proceso web) ---
+
+def _parse_day(value, field):
+    try:
+        return datetime.strptime(str(value), "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError(f"{field}: formato de fecha inválido. Usar YYYY-MM-DD.")
+
+
+def _int_param(params, field, default, low, high):
+    try:
+        value = int(params.get(field, default))
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} tiene que ser un número entero.")
+    if not low <= value <= high:
+        raise ValueError(f"{field} tiene que estar entre {low} y {high}.")
+    return value
+
+
+def _date_range(params):
+    if "start_date" not in params or "end_date" not in params:
+        raise ValueError("Faltan start_date y end_date.")
+    start = _parse_day(params["start_date"], "start_date")
+    end = _parse_day(params["end_date"], "end_date")
+    if end < start:
+        raise ValueError("end_date es anterior a start_date.")
+    return start.isoformat(), end.isoformat()
+
+
+def normalize(kind: str, params: dict, branch_ids) -> dict:
+    """Valida los parámetros de un trabajo y los deja en su forma canónica (la que se usa como clave de caché)."""
+    if kind not in KINDS:
+        raise ValueError(f"Tipo de trabajo desconocido: {kind!r}. Opciones: {', '.join(KINDS)}.")
+    branch_ids = sorted(branch_ids)
+    if kind == "forecast":
+        products = params.get("product") or None
+        if products is not None:
+            products = sorted({str(name) for name in ([products] if isinstance(products, str) else products)})
+        return {
+            "horizon": _int_param(params, "horizon", 1, 1, 14),
+            "products": products,
+            "branch_ids": branch_ids,
+        }
+    start_date, end_date = _date_range(params)
+    if kind == "summary":
+        return {
+            "start_date": start_date,
+            "end_date": end_date,
+            "top": _int_param(params, "top", 5, 1, 1000),
+            "branch_ids": branch_ids,
+        }
+    format = params.get("format", "csv")
+    if format not in ("csv", "parquet"):
+        raise ValueError("format tiene que ser csv o parquet.")
+    return {"start_date": start_date, "end_date": end_date, "format": format, "branch_ids": branch_ids}
+
+
+def _cache_key(kind, params):
+    return json.dumps([kind, params], sort_keys=True)
+
+
+def inputs(kind: str, params: dict) -> dict:
+    """
+    Huella de las ventas que lee un trabajo, {sucursal: valor}. Se toma antes de
+    calcularlo: una venta que entra mientras tanto hace que el próximo pedido
+    no lo reutilice, nunca al revés.
+    """
+    import branches
+    import rollup
+    import stamps
+
+    if kind == "forecast":
+        def branch_inputs(branch, db):
+            return stamps.read(db, stamps.sales(branch))
+    else:
+        first_day = _parse_day(params["start_date"], "start_date")
+        last_day = _parse_day(params["end_date"], "end_date")
+
+        def branch_inputs(branch, db):
+            totals_query, _ = rollup.summary_queries(first_day, last_day, branch_id=branch)
+            return [int(value) for value in db.execute(totals_query).one()]
+
+    return branches.fan_out(branch_inputs, params["branch_ids"])
+
+
+# --- Lo que corre en los procesos del pool ---
+# Funciones de módulo (el pool las recibe por nombre); cada proceso abre sus propias conexiones.
+
+def _run_forecast(horizon, products, branch_ids):
+    import branches
+    import forecast
+
+    # Los modelos de forecast.py quedan en memoria del proceso del pool entre un trabajo y otro
+    return forecast.merge(branches.fan_out(
+        lambda branch, db: forecast.cache_for(branch).forecast(db, horizon=horizon, products=products),
+        branch_ids,
+    ).values())
+
+
+def _run_summary(start_date, end_date, top, branch_ids):
+    import branches
+    import rollup
+
+    first_day, last_day = _parse_day(start_date, "start_date"), _parse_day(end_date, "end_date")
+    branch_top = top if len(branch_ids) == 1 else None
+
+    def branch_summary(branch, db):
+        totals_query, ranking_query = rollup.summary_queries(first_day, last_day, branch_top, branch)
+        return tuple(db.execute(totals_query).one()), [tuple(row) for row in db.execute(ranking_query)]
+
+    per_branch = branches.fan_out(branch_summary, branch_ids)
+    return {"start_date": start_date, "end_date": end_date, **rollup.merge_summaries(per_branch, top)}
+
+
+def _run_export(start_date, end_date, format, branch_ids, path):
+    import export
+    import today
+
+    start, end = today.utc_range(_parse_day(start_date, "start_date"), _parse_day(end_date, "end_date"))
+    stream = export.stream_parquet if format == "parquet" else export.stream_csv
+    size = 0
+    partial = path + ".part"
+    try:
+        with open(partial, "wb") as f:
+            for chunk in stream(start, end, branch_ids):
+                f.write(chunk)
+                size += len(chunk)
+        os.replace(partial, path)
+    except BaseException:
+        # Una exportación fallida no deja archivos a medias en JOBS_DIR
+        if os.path.exists(partial):
+            os.unlink(partial)
+        raise
+    return {"format": format, "bytes": size}
+
+
+_HANDLERS = {"forecast": _run_forecast, "summary": _run_summary, "export": _run_export}
+
+
+def _execute(kind, params):
+    started = time.perf_counter()
+    result = _HANDLERS[kind](**params)
+    return result, round((time.perf_counter() - started) * 1000, 3)
+
+
+# --- Cola y despachadores (en el proceso web) ---
+
+def _session():
+    from database import SessionLocal
+
+    return SessionLocal()
+
+
+def _alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _check_orphan(db, job):
+    """Un trabajo pendiente cuyo proceso ya no existe no va a terminar: pasa a error."""
+    if job.status in ("queued", "running") and not _alive(job.pid):
+        job.status, job.stale = "error", True
+        job.error = "El proceso que corría el trabajo terminó antes de completarlo"
+        job.finished_at = datetime.utcnow()
+        db.commit()
+
+
+def _detached(db, job):
+    # Para leerlo después de cerrar la sesión
+    db.refresh(job)
+    db.expunge(job)
+    return job
+
+
+class JobRunner:
+    def __init__(self, workers: int = WORKERS):
+        self.workers = max(1, workers)
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._pool = None
+        self._threads = []
+
+    def _start(self):
+        # Llamar con el lock tomado. Se arranca con el primer trabajo, no al importar.
+        if self._pool is not None:
+            return
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # "spawn": los procesos no heredan hilos, locks ni conexiones abiertas del proceso web
+        self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._dispatch, name=f"report-job-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, kind: str, params: dict):
+        """Encola un trabajo, o devuelve el vigente con los mismos parámetros. Devuelve (job, reutilizado)."""
+        key = _cache_key(kind, params)
+        current = inputs(kind, params)
+        with _session() as db:
+            for job in db.scalars(
+                select(models.ReportJob)
+                .where(models.ReportJob.key == key, models.ReportJob.stale.is_(False), models.ReportJob.status != "error")
+                .order_by(models.ReportJob.created_at.desc())
+            ).all():
+                if job.inputs != current:
+                    # Entraron ventas que cambian el resultado: el trabajo en curso
+                    # termina igual (quien lo pidió ve su resultado), pero ya no se reutiliza
+                    job.stale = True
+                    db.commit()
+                    continue
+                _check_orphan(db, job)
+                if job.status != "error":
+                    return _detached(db, job), True
+            job = models.ReportJob(
+                id=uuid.uuid4().hex, kind=kind, key=key, params=params, inputs=current,
+                status="queued", stale=False, pid=os.getpid(), created_at=datetime.utcnow(),
+            )
+            if kind == "export":
+                os.makedirs(JOBS_DIR, exist_ok=True)
+                job.path = os.path.join(JOBS_DIR, f"{job.id}.{params['format']}")
+            db.add(job)
+            db.commit()
+            self._evict(db)
+            job = _detached(db, job)
+        with self._lock:
+            self._start()
+        self._queue.put((job.id, kind, dict(params, path=job.path) if kind == "export" else params))
+        return job, False
+
+    def get(self, job_id: str):
+        with _session() as db:
+            job = db.get(models.ReportJob, job_id)
+            if job is None:
+                return None
+            _check_orphan(db, job)
+            return _detached(db, job)
+
+    def _evict(self, db):
+        # Se recuerdan MAX_JOBS trabajos; solo se olvidan (y se borran sus archivos) los terminados
+        excess = db.scalar(select(func.count()).select_from(models.ReportJob)) - MAX_JOBS
+        if excess <= 0:
+            return
+        finished = db.scalars(
+            select(models.ReportJob)
+            .where(models.ReportJob.status.in_(("done", "error")))
+            .order_by(models.ReportJob.created_at)
+            .limit(excess)
+        ).all()
+        for job in finished:
+            if job.path and os.path.exists(job.path):
+                os.remove(job.path)
+        db.execute(delete(models.ReportJob).where(models.ReportJob.id.in_([job.id for job in finished])))
+        db.commit()
+
+    def _update(self, job_id, **values):
+        with _session() as db:
+            db.execute(update(models.ReportJob).where(models.ReportJob.id == job_id).values(**values))
+            db.commit()
+
+    def _dispatch(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            job_id, kind, params = item
+            with self._lock:
+                pool = self._pool
+            self._update(job_id, status="running", started_at=datetime.utcnow())
+            try:
+                if pool is None:
+                    raise RuntimeError("el servidor se está cerrando")
+                result, elapsed_ms = pool.submit(_execute, kind, params).result()
+            except Exception as exc:
+                traceback.print_exc()
+                # Un error no se reutiliza: el próximo pedido lo vuelve a intentar
+                self._update(
+                    job_id, status="error", stale=True, error=f"{type(exc).__name__}: {exc}",
+                    finished_at=datetime.utcnow(),
+                )
+                continue
+            if kind == "export":
+                result["download"] = f"/reports/jobs/{job_id}/download"
+            result["elapsed_ms"] = elapsed_ms
+            self._update(job_id, status="done", result=result, finished_at=datetime.utcnow())
+
+    def shutdown(self):
+        with self._lock:
+            pool, threads = self._pool, self._threads
+            self._pool, self._threads = None, []
+        if pool is None:
+            return
+        for _ in threads:
+            self._queue.put(None)
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+runner = JobRunner()
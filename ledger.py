@@ -0,0 +1,289 @@
+# ledger.py
+"""
+Libro de ventas encadenado (tablas ledger_entries, ledger_heads y ledger_checkpoints).
+
+Cada venta agrega, en la misma transacción que la guarda, una entrada al libro
+de su sucursal con el hash de su contenido (`sale_digest`: fecha, total, medio
+de pago e ítems). Cada cierre de caja agrega otra con el hash de sus totales
+(ver shifts.py). Cada entrada lleva además el hash de la anterior, así que
+modificar, borrar o intercalar una venta o un cierre ya registrado rompe la
+cadena desde ahí.
+
+Para agregar, la fila de ledger_heads de la sucursal (número y hash de la
+última entrada) se toma con un UPDATE: en SQLite eso toma el lock de
+escritura y en PostgreSQL bloquea la fila, así dos ventas simultáneas nunca
+encadenan sobre la misma entrada.
+
+`verify()` recorre solo las entradas nuevas desde la última verificación
+correcta (ledger_checkpoints), recalcula cada hash con la venta o el cierre tal
+como está hoy en la base y avanza el checkpoint: el costo depende de lo que se
+vendió desde la última vez, no del tamaño de la tabla. Con `full=True` se
+revisa todo desde el principio (por ejemplo, para detectar cambios en ventas
+ya verificadas).
+
+Uso por línea de comandos:
+    python ledger.py verify [--full]
+    python ledger.py rebuild        # vuelve a armar la cadena de cero (solo sin cierres de caja)
+"""
+import hashlib
+import json
+import sys
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+import database
+import models
+
+GENESIS = "0" * 64
+CHUNK_SIZE = 5000
+MAX_PROBLEMS = 100
+
+
+# --- Hashes ---
+
+def content_hash(value) -> str:
+    """SHA-256 de un valor JSON (listas, números y textos) en forma canónica."""
+    return hashlib.sha256(
+        json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+
+
+def sale_digest(sale_id, branch_id, created_at, total_cents, payment_method, items) -> str:
+    """Hash del contenido de una venta. `items` son (product_name, quantity, unit_price_cents) en orden."""
+    return content_hash(["sale", sale_id, branch_id, created_at.isoformat(), total_cents, payment_method, [list(item) for item in items]])
+
+
+def chain_hash(previous: str, seq: int, kind: str, ref_id: int, digest: str) -> str:
+    return hashlib.sha256(f"{previous}|{seq}|{kind}|{ref_id}|{digest}".encode("utf-8")).hexdigest()
+
+
+# --- Escritura ---
+
+def lock_head(db: Session, branch_id: str) -> models.LedgerHead:
+    """
+    La última entrada de la sucursal, bloqueada hasta el commit. Con SQLite el
+    UPDATE (que no cambia nada) toma el lock de escritura antes de leer: así se
+    lee la cabeza vigente y nadie más la mueve hasta el commit. La primera vez
+    la fila se crea con ON CONFLICT DO NOTHING: si dos ventas la crean a la
+    vez, una espera a la otra y las dos terminan bloqueando la misma fila.
+    """
+    lock = (
+        update(models.LedgerHead)
+        .where(models.LedgerHead.branch_id == branch_id)
+        .values(seq=models.LedgerHead.seq)
+        .execution_options(synchronize_session=False)
+    )
+    if db.execute(lock).rowcount == 0:
+        database.insert_or_ignore(db, models.LedgerHead.__table__, {"branch_id": branch_id, "seq": 0, "hash": GENESIS})
+        db.execute(lock)
+    return db.get(models.LedgerHead, branch_id, populate_existing=True)
+
+
+def append(db: Session, branch_id: str, entries, head: models.LedgerHead = None):
+    """
+    Agrega entradas (kind, ref_id, digest) al final de la cadena de la sucursal.
+    No hace commit: va en la transacción de la venta o del cierre. Devuelve la cabeza.
+    """
+    if head is None:
+        head = lock_head(db, branch_id)
+    now = datetime.utcnow()
+    seq, previous = head.seq, head.hash
+    rows = []
+    for kind, ref_id, digest in entries:
+        seq += 1
+        previous = chain_hash(previous, seq, kind, ref_id, digest)
+        rows.append({
+            "branch_id": branch_id, "seq": seq, "kind": kind, "ref_id": ref_id,
+            "digest": digest, "hash": previous, "created_at": now,
+        })
+    if rows:
+        db.execute(insert(models.LedgerEntry), rows)
+        head.seq, head.hash = seq, previous
+    return head
+
+
+# --- Verificación ---
+
+def _sale_digests(db: Session, branch_id, sale_ids) -> dict:
+    """{sale_id: digest} de las ventas como están hoy en la base."""
+    if not sale_ids:
+        return {}
+    sales = db.execute(
+        select(
+            models.Sale.id, models.Sale.created_at, models.Sale.total_cents, models.Sale.payment_method,
+        ).where(models.Sale.id.in_(sale_ids), models.Sale.branch_id == branch_id)
+    ).all()
+    items = {}
+    for sale_id, name, quantity, unit_cents in db.execute(
+        select(
+            models.SaleItem.sale_id, models.SaleItem.product_name,
+            models.SaleItem.quantity, models.SaleItem.unit_price_cents,
+        )
+        .where(models.SaleItem.sale_id.in_(sale_ids))
+        .order_by(models.SaleItem.id)
+    ):
+        items.setdefault(sale_id, []).append((name, quantity, unit_cents))
+    return {
+        sale_id: sale_digest(sale_id, branch_id, created_at, total_cents, method, items.get(sale_id, []))
+        for sale_id, created_at, total_cents, method in sales
+    }
+
+
+def _close_digests(db: Session, branch_id, shift_ids) -> dict:
+    import shifts
+
+    if not shift_ids:
+        return {}
+    return {
+        shift.id: shifts.snapshot_digest(shift, payments, products)
+        for shift, payments, products in shifts.load(db, branch_id, shift_ids)
+    }
+
+
+def verify(db: Session, branch_id: str, full: bool = False) -> dict:
+    """
+    Revisa las entradas nuevas de la sucursal (todas con `full`). Si no hay
+    problemas, guarda el checkpoint y hace commit.
+    """
+    checkpoint = None if full else db.get(models.LedgerCheckpoint, branch_id)
+    start_seq, previous = (checkpoint.seq, checkpoint.hash) if checkpoint else (0, GENESIS)
+    # Primero la última venta y después la cabeza: toda venta hasta last_sale_id
+    # ya tiene su entrada hasta head.seq (se guardan en la misma transacción).
+    # Lo que se venda mientras tanto queda para la próxima verificación.
+    last_sale_id = db.scalar(select(func.max(models.Sale.id)).where(models.Sale.branch_id == branch_id)) or 0
+    head = db.get(models.LedgerHead, branch_id)
+    head_seq, head_hash = (head.seq, head.hash) if head is not None else (0, GENESIS)
+    seq = start_seq
+    problems = []
+
+    def problem(entry_seq, description):
+        if len(problems) < MAX_PROBLEMS:
+            problems.append({"seq": entry_seq, "problem": description})
+
+    while True:
+        entries = db.execute(
+            select(models.LedgerEntry)
+            .where(
+                models.LedgerEntry.branch_id == branch_id,
+                models.LedgerEntry.seq > seq,
+                models.LedgerEntry.seq <= head_seq,
+            )
+            .order_by(models.LedgerEntry.seq)
+            .limit(CHUNK_SIZE)
+        ).scalars().all()
+        if not entries:
+            break
+        current = {
+            "sale": _sale_digests(db, branch_id, [e.ref_id for e in entries if e.kind == "sale"]),
+            "close": _close_digests(db, branch_id, [e.ref_id for e in entries if e.kind == "close"]),
+        }
+        for entry in entries:
+            if entry.seq != seq + 1:
+                problem(seq + 1, f"faltan las entradas {seq + 1} a {entry.seq - 1}")
+            if chain_hash(previous, entry.seq, entry.kind, entry.ref_id, entry.digest) != entry.hash:
+                problem(entry.seq, "el hash no coincide con el de la entrada anterior")
+            digest = current.get(entry.kind, {}).get(entry.ref_id)
+            what = "la venta" if entry.kind == "sale" else "el cierre"
+            if digest is None:
+                problem(entry.seq, f"{what} {entry.ref_id} ya no está en la base")
+            elif digest != entry.digest:
+                problem(entry.seq, f"{what} {entry.ref_id} cambió después de registrarse")
+            # Se sigue con el hash guardado: un problema no arrastra a todas las entradas siguientes
+            seq, previous = entry.seq, entry.hash
+        db.expunge_all()
+
+    if (seq, previous) != (head_seq, head_hash):
+        problem(head_seq, "la cabeza de la cadena no coincide con la última entrada")
+
+    # Ventas que no pasaron por el libro (solo las posteriores a la última registrada)
+    last_recorded = db.scalar(
+        select(func.max(models.LedgerEntry.ref_id)).where(
+            models.LedgerEntry.branch_id == branch_id,
+            models.LedgerEntry.kind == "sale",
+            models.LedgerEntry.seq <= head_seq,
+        )
+    ) or 0
+    unrecorded = db.scalar(
+        select(func.count()).select_from(models.Sale).where(
+            models.Sale.branch_id == branch_id,
+            models.Sale.id > last_recorded,
+            models.Sale.id <= last_sale_id,
+        )
+    )
+    if unrecorded:
+        problem(None, f"{unrecorded} ventas sin entrada en el libro")
+
+    ok = not problems
+    if ok and seq > start_seq:
+        row = db.get(models.LedgerCheckpoint, branch_id)
+        if row is None:
+            row = models.LedgerCheckpoint(branch_id=branch_id)
+            db.add(row)
+        row.seq, row.hash, row.verified_at = seq, previous, datetime.utcnow()
+        db.commit()
+    return {
+        "branch_id": branch_id,
+        "ok": ok,
+        "from_seq": start_seq,
+        "to_seq": seq,
+        "checked": seq - start_seq,
+        "problems": problems,
+    }
+
+
+# --- Reconstrucción ---
+
+def rebuild(db: Session, branch_id: str) -> int:
+    """
+    Arma la cadena de cero con las ventas actuales de la sucursal (por ejemplo,
+    para una base que ya tenía ventas antes del libro). Devuelve cuántas entradas creó.
+    """
+    if db.scalar(select(models.Shift.id).where(models.Shift.branch_id == branch_id).limit(1)) is not None:
+        raise ValueError(f"La sucursal {branch_id} ya tiene cierres de caja: no se puede rehacer su libro")
+    for table in (models.LedgerEntry, models.LedgerHead, models.LedgerCheckpoint):
+        db.execute(delete(table).where(table.branch_id == branch_id))
+    head = lock_head(db, branch_id)
+    last_id, count = 0, 0
+    while True:
+        sale_ids = db.scalars(
+            select(models.Sale.id)
+            .where(models.Sale.branch_id == branch_id, models.Sale.id > last_id)
+            .order_by(models.Sale.id)
+            .limit(CHUNK_SIZE)
+        ).all()
+        if not sale_ids:
+            break
+        digests = _sale_digests(db, branch_id, sale_ids)
+        append(db, branch_id, [("sale", sale_id, digests[sale_id]) for sale_id in sale_ids], head)
+        last_id, count = sale_ids[-1], count + len(sale_ids)
+    db.commit()
+    return count
+
+
+def needs_backfill(db: Session, branch_id: str) -> bool:
+    """True si la sucursal tiene ventas pero todavía no tiene libro."""
+    if db.get(models.LedgerHead, branch_id) is not None:
+        return False
+    return db.scalar(select(models.Sale.id).where(models.Sale.branch_id == branch_id).limit(1)) is not None
+
+
+if __name__ == "__main__":
+    import branches
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ("verify", "rebuild"):
+        print("Uso: python ledger.py verify [--full] | python ledger.py rebuild")
+        sys.exit(1)
+    for branch in branches.BRANCHES:
+        db = branches.store(branch).SessionLocal()
+        try:
+            if sys.argv[1] == "rebuild":
+                print(f"{branch}: {rebuild(db, branch)} entradas")
+            else:
+                result = verify(db, branch, full="--full" in sys.argv)
+                print(f"{branch}: {'OK' if result['ok'] else 'CON PROBLEMAS'} ({result['checked']} entradas revisadas)")
+                for item in result["problems"]:
+                    print(f"  [{item['seq']}] {item['problem']}")
+        finally:
+            db.close()
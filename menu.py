@@ -0,0 +1,118 @@
+# menu.py
+"""
+Carga masiva del menú (PUT /products/bulk, import_menu.py y la carga inicial).
+
+El menú completo se compara por nombre contra lo que hay en la base y se
+aplica en una sola transacción: un INSERT por lotes para los nuevos, un UPDATE
+por lotes (por id) para los que cambiaron y, si se pide `prune`, se borran los
+que ya no están. Volver a cargar el mismo menú no modifica nada, así que se
+puede repetir sin miedo. Devuelve la diferencia: creados, modificados (con
+valor anterior y nuevo), sin cambios y borrados.
+
+Si en la base hay productos repetidos con el mismo nombre se toma el de menor
+id (igual que catalog.py); con `prune` se borran los repetidos.
+"""
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+import catalog
+import models
+import sales
+import schemas
+
+FIELDS = ("description", "price_cents", "category")
+
+
+def _row(item: schemas.ProductCreate) -> dict:
+    row = {
+        "name": item.name,
+        "price_cents": models.to_cents(item.price),
+        "category": models.ProductCategory(item.category),
+    }
+    # Si el ítem no trae description, un producto existente conserva la suya
+    if "description" in item.model_fields_set:
+        row["description"] = item.description
+    return row
+
+
+def _shown(field, value):
+    """Valor tal como lo ve la API (precio en pesos, categoría por su nombre)."""
+    if field == "price_cents":
+        return value / 100
+    if field == "category":
+        return value.value
+    return value
+
+
+def upsert(db: Session, items, prune: bool = False, dry_run: bool = False) -> dict:
+    """
+    Aplica el menú `items` (lista de schemas.ProductCreate). Si un nombre viene
+    repetido, vale el último. Los campos opcionales que un ítem no trae no se
+    modifican. Con `dry_run` calcula la diferencia sin guardar nada.
+    Devuelve (diferencia, sello del catálogo); el sello es None si no cambió nada.
+    """
+    wanted = {}
+    for item in items:
+        wanted[item.name] = _row(item)
+
+    existing = {}
+    repeated = []
+    rows = db.execute(
+        select(models.Product.id, models.Product.name, *(getattr(models.Product, f) for f in FIELDS))
+        .order_by(models.Product.id)
+    ).all()
+    for row in rows:
+        if row.name in existing:
+            repeated.append(row)
+        else:
+            existing[row.name] = row
+
+    to_insert, to_update = [], []
+    diff = {"created": [], "updated": [], "unchanged": [], "deleted": []}
+    for name, fields in wanted.items():
+        current = existing.get(name)
+        if current is None:
+            to_insert.append({"description": None, **fields})
+            diff["created"].append(name)
+            continue
+        changes = {
+            ("price" if field == "price_cents" else field): [_shown(field, getattr(current, field)), _shown(field, fields[field])]
+            for field in FIELDS
+            if field in fields and getattr(current, field) != fields[field]
+        }
+        if changes:
+            to_update.append({"id": current.id, **fields})
+            diff["updated"].append({"name": name, "changes": changes})
+        else:
+            diff["unchanged"].append(name)
+
+    to_delete = []
+    if prune:
+        to_delete = [row for name, row in existing.items() if name not in wanted] + repeated
+        diff["deleted"] = [row.name for row in to_delete]
+
+    if dry_run:
+        return diff, None
+
+    if to_insert:
+        db.execute(insert(models.Product), to_insert)
+    if to_update:
+        # UPDATE por clave primaria para todo el lote (executemany)
+        db.execute(update(models.Product), to_update)
+    if to_delete:
+        ids = [row.id for row in to_delete]
+        # SQLite no aplica el ON DELETE CASCADE si no se activan las foreign keys
+        db.execute(delete(models.ProductBranchPrice).where(models.ProductBranchPrice.product_id.in_(ids)))
+        sales.detach_products(db, ids)
+        db.execute(delete(models.Product).where(models.Product.id.in_(ids)))
+    version = None
+    if changed(diff):
+        version = catalog.touch(db)  # en la misma transacción: los demás workers descartan su caché
+    db.commit()
+    if to_delete:
+        sales.detach_products_in_branches(ids)
+    return diff, version
+
+
+def changed(diff: dict) -> bool:
+    return bool(diff["created"] or diff["updated"] or diff["deleted"])
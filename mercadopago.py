@@ -0,0 +1,143 @@
+# mercadopago.py
+"""
+Cliente asíncrono de Mercado Pago.
+
+Usa un único httpx.AsyncClient con pool de conexiones (se reutiliza la conexión
+TLS entre órdenes), timeouts configurables y reintentos con backoff ante
+respuestas 5xx/429 o errores de red. Todos los intentos de una misma orden
+llevan el mismo X-Idempotency-Key: si el primero llegó a crear la preferencia
+aunque no vimos la respuesta, Mercado Pago devuelve esa en vez de crear otra.
+
+El Access Token sale de la caché de configuración (ver settings.py) o, si no
+está guardado, de MP_ACCESS_TOKEN. httpx se importa recién con el primer pago,
+para no sumarlo al arranque.
+
+Variables de entorno:
+    MP_API_URL            URL base de la API (por defecto la real; ver fake_mercadopago.py)
+    MP_ACCESS_TOKEN       Token a usar si no hay uno guardado en `settings`
+    MP_CONNECT_TIMEOUT    Segundos para conectar (por defecto 3)
+    MP_READ_TIMEOUT       Segundos para esperar la respuesta (por defecto 10)
+    MP_MAX_RETRIES        Reintentos ante 5xx/429/errores de red (por defecto 2)
+    MP_MAX_CONNECTIONS    Tamaño del pool de conexiones (por defecto 20)
+"""
+import asyncio
+import os
+import time
+import uuid
+
+from sqlalchemy.orm import Session
+
+import metrics
+import settings
+
+API_URL = os.getenv("MP_API_URL", "https://api.mercadopago.com").rstrip("/")
+CONNECT_TIMEOUT = float(os.getenv("MP_CONNECT_TIMEOUT", "3"))
+READ_TIMEOUT = float(os.getenv("MP_READ_TIMEOUT", "10"))
+MAX_RETRIES = int(os.getenv("MP_MAX_RETRIES", "2"))
+MAX_CONNECTIONS = int(os.getenv("MP_MAX_CONNECTIONS", "20"))
+RETRY_BACKOFF = 0.25  # segundos; se duplica en cada intento
+
+TOKEN_SETTING_KEY = "mp_access_token"
+
+
+class MercadoPagoError(Exception):
+    def __init__(self, status_code: int, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+# --- Access Token ---
+
+def get_access_token(db: Session) -> str:
+    """Devuelve el token desde la caché de configuración (leyendo `settings` si hace falta)."""
+    token = settings.value(db, TOKEN_SETTING_KEY)
+    if not token:
+        raise MercadoPagoError(500, "El Access Token de Mercado Pago no está configurado.")
+    return token
+
+
+def cached_access_token():
+    """El token si está vigente en la caché, sin tocar la base."""
+    return settings.cached_value(TOKEN_SETTING_KEY)
+
+
+# --- Cliente HTTP compartido ---
+_client = None
+
+
+def get_client():
+    """El httpx.AsyncClient compartido (se crea con el primer uso)."""
+    global _client
+    import httpx
+
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=API_URL,
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_CONNECTIONS,
+            ),
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _retry_delay(attempt: int, response=None) -> float:
+    if response is not None and response.status_code == 429:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), READ_TIMEOUT)
+    return RETRY_BACKOFF * (2 ** attempt)
+
+
+async def create_preference(token: str, preference_data: dict, idempotency_key: str = None) -> dict:
+    """Crea una preferencia de pago (Checkout Pro) y devuelve la respuesta de Mercado Pago."""
+    import httpx
+
+    headers = {
+        "Authorization": f"Bearer {token}",
+        # La misma clave en cada reintento: el POST no es idempotente por sí solo
+        "X-Idempotency-Key": idempotency_key or str(uuid.uuid4()),
+    }
+    client = get_client()
+
+    for attempt in range(MAX_RETRIES + 1):
+        last_attempt = attempt == MAX_RETRIES
+        started = time.perf_counter()
+        try:
+            response = await client.post("/checkout/preferences", json=preference_data, headers=headers)
+        except httpx.TimeoutException:
+            metrics.observe_mercadopago(time.perf_counter() - started, "timeout")
+            if last_attempt:
+                raise MercadoPagoError(504, "Mercado Pago no respondió a tiempo.")
+            await asyncio.sleep(_retry_delay(attempt))
+            continue
+        except httpx.TransportError as e:
+            metrics.observe_mercadopago(time.perf_counter() - started, "network_error")
+            if last_attempt:
+                raise MercadoPagoError(502, f"No se pudo conectar con Mercado Pago: {e}")
+            await asyncio.sleep(_retry_delay(attempt))
+            continue
+        metrics.observe_mercadopago(time.perf_counter() - started, str(response.status_code))
+
+        if (response.status_code >= 500 or response.status_code == 429) and not last_attempt:
+            await asyncio.sleep(_retry_delay(attempt, response))
+            continue
+
+        if response.is_error:
+            try:
+                detail = response.json()
+            except ValueError:
+                detail = response.text
+            print(f"--- ERROR HTTP DE MERCADO PAGO ---\nStatus Code: {response.status_code}\nResponse: {response.text}\n------------------------------------")
+            raise MercadoPagoError(response.status_code, detail)
+
+        return response.json()
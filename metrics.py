@@ -0,0 +1,220 @@
+# metrics.py
+"""
+Métricas de la API en formato de texto de Prometheus (GET /metrics).
+
+- Latencia por ruta (histograma) y peticiones en curso, medidas por MetricsMiddleware.
+- Cantidad y tiempo de consultas SQL por ruta, con los eventos
+  before/after_cursor_execute de SQLAlchemy (valen para todos los engines).
+- Latencia de las llamadas a Mercado Pago (ver mercadopago.py).
+
+Las peticiones que tardan más de SLOW_REQUEST_MS (por defecto 500) dejan una
+línea de log en JSON con el SQL que ejecutaron.
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+MAX_LOGGED_STATEMENTS = 50
+
+logger = logging.getLogger("cafe.slow_requests")
+
+_lock = threading.Lock()
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # labels -> [conteo por bucket..., suma, total]
+
+    def observe(self, labels, value):
+        with _lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        for labels, series in sorted(items):
+            base = _labels(self.label_names, labels)
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{base}{"," if base else ""}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{base}{"," if base else ""}le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{base}}} {series[-2]}")
+            lines.append(f"{self.name}_count{{{base}}} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self._values = {}
+
+    def inc(self, labels, amount=1):
+        with _lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with _lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{{{_labels(self.label_names, labels)}}} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+
+    def add(self, amount):
+        with _lock:
+            self.value += amount
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.value}"]
+
+
+def _labels(names, values):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_LATENCY = Histogram(
+    "cafe_http_request_duration_seconds", "Duración de las peticiones HTTP.", ("method", "route", "status")
+)
+REQUESTS_IN_FLIGHT = Gauge("cafe_http_requests_in_flight", "Peticiones HTTP en curso.")
+DB_QUERIES = Counter("cafe_db_queries_total", "Consultas SQL ejecutadas.", ("route",))
+DB_QUERY_SECONDS = Counter("cafe_db_query_seconds_total", "Tiempo total en consultas SQL.", ("route",))
+DB_QUERIES_PER_REQUEST = Histogram(
+    "cafe_db_queries_per_request", "Consultas SQL por petición HTTP.", ("route",),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+MERCADOPAGO_LATENCY = Histogram(
+    "cafe_mercadopago_request_duration_seconds", "Duración de las llamadas a Mercado Pago.", ("outcome",)
+)
+
+ALL_METRICS = [
+    REQUEST_LATENCY, REQUESTS_IN_FLIGHT, DB_QUERIES, DB_QUERY_SECONDS,
+    DB_QUERIES_PER_REQUEST, MERCADOPAGO_LATENCY,
+]
+
+
+def render() -> str:
+    lines = []
+    for metric in ALL_METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Consultas SQL por petición ---
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements = []
+
+
+_current = contextvars.ContextVar("cafe_request_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("cafe_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("cafe_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        if len(stats.statements) < MAX_LOGGED_STATEMENTS:
+            stats.statements.append({"sql": statement, "ms": round(elapsed * 1000, 3)})
+
+
+def observe_mercadopago(seconds: float, outcome: str):
+    MERCADOPAGO_LATENCY.observe((outcome,), seconds)
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: mide cada petición HTTP sin tocar el cuerpo de la respuesta."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.add(1)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUESTS_IN_FLIGHT.add(-1)
+            _current.reset(token)
+
+            # Se usa la plantilla de la ruta (/products/{product_id}) para no crear una serie por ID
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "sin_ruta"
+            REQUEST_LATENCY.observe((scope["method"], route_path, status["code"]), elapsed)
+            DB_QUERIES.inc((route_path,), stats.queries)
+            DB_QUERY_SECONDS.inc((route_path,), stats.db_seconds)
+            DB_QUERIES_PER_REQUEST.observe((route_path,), stats.queries)
+
+            if elapsed * 1000 >= SLOW_REQUEST_MS:
+                logger.warning(json.dumps({
+                    "event": "slow_request",
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": route_path,
+                    "status": status["code"],
+                    "duration_ms": round(elapsed * 1000, 3),
+                    "db_queries": stats.queries,
+                    "db_ms": round(stats.db_seconds * 1000, 3),
+                    "sql": stats.statements,
+                }, ensure_ascii=False))
@@ -0,0 +1,268 @@
+# migrations.py
+"""
+Migraciones del esquema de la base de datos.
+
+Reemplaza al `create_all` suelto: una base nueva se crea directamente con el
+esquema actual de models.py y queda marcada con la última versión; una base
+existente aplica, en orden y una sola vez, las migraciones que le falten. Las
+versiones aplicadas se registran en la tabla `schema_migrations`.
+
+Como esto corre en cada arranque, la versión 0 de `schema_migrations` guarda
+una huella del esquema de models.py: si no falta ninguna migración y la huella
+coincide, `run` termina con una sola consulta, sin inspeccionar las tablas.
+
+Para agregar un cambio de esquema: escribir una función `_NNNN_descripcion(conn)`
+y sumarla al final de MIGRATIONS. Las tablas nuevas no necesitan migración:
+`run` crea las que falten antes de migrar, por eso cada migración debe
+tolerar que su cambio ya esté hecho.
+
+Uso por línea de comandos:
+    python migrations.py            # aplica las pendientes
+    python migrations.py status     # muestra qué versiones están aplicadas
+"""
+import hashlib
+import sys
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+import models
+
+
+def _columns(conn, table):
+    return {col["name"] for col in inspect(conn).get_columns(table)}
+
+
+def _tables(conn):
+    return set(inspect(conn).get_table_names())
+
+
+def _add_column(conn, table, column, ddl):
+    if column not in _columns(conn, table):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _float_to_cents(conn, table, float_column, cents_column):
+    """Reemplaza una columna de monto decimal por su equivalente entero en centavos."""
+    if table not in _tables(conn):
+        return
+    columns = _columns(conn, table)
+    if float_column not in columns:
+        return
+    _add_column(conn, table, cents_column, "INTEGER NOT NULL DEFAULT 0")
+    conn.execute(text(
+        f"UPDATE {table} SET {cents_column} = CAST(ROUND({float_column} * 100) AS INTEGER)"
+    ))
+    conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {float_column}"))
+
+
+# --- Migraciones ---
+
+def _0001_sales_idempotency_key(conn):
+    _add_column(conn, "sales", "idempotency_key", "VARCHAR")
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_sales_idempotency_key ON sales (idempotency_key)"
+    ))
+
+
+def _0002_sale_items_product_id(conn):
+    _add_column(conn, "sale_items", "product_id", "INTEGER REFERENCES products(id) ON DELETE SET NULL")
+    # Completa el producto de las ventas viejas buscándolo por nombre
+    conn.execute(text(
+        "UPDATE sale_items SET product_id = ("
+        " SELECT MIN(products.id) FROM products WHERE products.name = sale_items.product_name"
+        ") WHERE product_id IS NULL"
+    ))
+
+
+def _0003_report_indexes(conn):
+    for name, table, columns in [
+        ("ix_sales_created_at", "sales", "created_at"),
+        ("ix_sale_items_sale_id", "sale_items", "sale_id"),
+        ("ix_sale_items_product_name", "sale_items", "product_name"),
+        ("ix_sale_items_product_id_sale_id", "sale_items", "product_id, sale_id"),
+    ]:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def _0004_money_as_cents(conn):
+    _float_to_cents(conn, "products", "price", "price_cents")
+    _float_to_cents(conn, "sales", "total_amount", "total_cents")
+    _float_to_cents(conn, "sale_items", "unit_price", "unit_price_cents")
+    _float_to_cents(conn, "daily_sales", "revenue", "revenue_cents")
+    _float_to_cents(conn, "daily_product_sales", "revenue", "revenue_cents")
+
+
+def _0005_products_category_index(conn):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_products_category_id ON products (category, id)"))
+
+
+def _0006_branches(conn):
+    _add_column(conn, "sales", "branch_id", f"VARCHAR NOT NULL DEFAULT '{models.DEFAULT_BRANCH}'")
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_sales_branch_id_created_at ON sales (branch_id, created_at)"))
+
+    # settings: la clave primaria pasa de (key) a (key, branch_id). Cambiar una
+    # clave primaria requiere rehacer la tabla (en SQLite no hay otra forma).
+    if "branch_id" not in _columns(conn, "settings"):
+        conn.execute(text(
+            "CREATE TABLE settings_new ("
+            " key VARCHAR NOT NULL,"
+            " branch_id VARCHAR NOT NULL DEFAULT '',"
+            " value VARCHAR,"
+            " PRIMARY KEY (key, branch_id))"
+        ))
+        conn.execute(text(
+            "INSERT INTO settings_new (key, branch_id, value) SELECT key, :branch, value FROM settings"
+        ), {"branch": models.GLOBAL_SETTING})
+        conn.execute(text("DROP TABLE settings"))
+        conn.execute(text("ALTER TABLE settings_new RENAME TO settings"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_settings_key ON settings (key)"))
+
+    # Las tablas de resumen suman branch_id a la clave. Son datos derivados: se
+    # recrean vacías y se recalculan al arrancar la app (o con python rollup.py rebuild).
+    for model in (models.DailyProductSale, models.DailySalesTotal):
+        table = model.__table__
+        if "branch_id" not in _columns(conn, table.name):
+            table.drop(conn)
+            table.create(conn)
+
+
+def _0007_settings_version(conn):
+    _add_column(conn, "settings", "version", "INTEGER NOT NULL DEFAULT 0")
+
+
+def _0008_cache_stamps(conn):
+    # create_all ya creó la tabla con sus filas; el sello de la configuración
+    # arranca en el mayor `version` guardado, para que siga creciendo
+    conn.execute(text(
+        "UPDATE cache_stamps SET version = (SELECT COALESCE(MAX(version), 0) FROM settings)"
+        " WHERE name = 'settings'"
+    ))
+
+
+def _0009_idempotency_key_per_branch(conn):
+    # La clave de idempotencia pasa a ser única por sucursal, no global
+    conn.execute(text("DROP INDEX IF EXISTS ix_sales_idempotency_key"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_sales_idempotency_key ON sales (idempotency_key)"))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_sales_branch_id_idempotency_key"
+        " ON sales (branch_id, idempotency_key)"
+    ))
+
+
+def _0010_rollup_local_days(conn):
+    # El resumen diario pasa de días UTC a días locales (CAFE_TZ). Son datos
+    # derivados: se vacían y se recalculan al arrancar la app (o con python rollup.py rebuild).
+    for model in (models.DailyProductSale, models.DailySalesTotal):
+        conn.execute(model.__table__.delete())
+
+
+def _0011_report_jobs_inputs(conn):
+    # Los trabajos viejos no tienen huella: no se reutilizan
+    _add_column(conn, "report_jobs", "inputs", "JSON")
+
+
+MIGRATIONS = [
+    (1, "idempotency_key en ventas", _0001_sales_idempotency_key),
+    (2, "product_id en ítems de venta", _0002_sale_items_product_id),
+    (3, "índices para reportes por fecha", _0003_report_indexes),
+    (4, "montos en centavos", _0004_money_as_cents),
+    (5, "índice de productos por categoría", _0005_products_category_index),
+    (6, "sucursales", _0006_branches),
+    (7, "versión de las configuraciones", _0007_settings_version),
+    (8, "sellos de versión de las cachés", _0008_cache_stamps),
+    (9, "idempotency_key única por sucursal", _0009_idempotency_key_per_branch),
+    (10, "resumen diario por día local", _0010_rollup_local_days),
+    (11, "huella de las ventas de cada trabajo", _0011_report_jobs_inputs),
+]
+
+
+def _ensure_version_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " version INTEGER PRIMARY KEY,"
+        " name VARCHAR NOT NULL,"
+        " applied_at TIMESTAMP NOT NULL)"
+    ))
+
+
+def _record(conn, version, name):
+    conn.execute(
+        text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+        {"v": version, "n": name, "t": datetime.utcnow()},
+    )
+
+
+def applied_versions(engine):
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+SCHEMA_VERSION = 0  # fila de schema_migrations con la huella del esquema
+
+
+def schema_fingerprint() -> str:
+    """Huella de las tablas, columnas e índices de models.py."""
+    shape = [
+        (table.name, sorted(column.name for column in table.columns), sorted(index.name for index in table.indexes))
+        for table in models.Base.metadata.sorted_tables
+    ]
+    return "esquema " + hashlib.sha256(repr(shape).encode("utf-8")).hexdigest()[:16]
+
+
+def _record_fingerprint(conn, fingerprint):
+    conn.execute(text("DELETE FROM schema_migrations WHERE version = :v"), {"v": SCHEMA_VERSION})
+    _record(conn, SCHEMA_VERSION, fingerprint)
+
+
+def run(engine, verbose=True):
+    """Deja la base con el esquema actual. Devuelve las versiones que se aplicaron."""
+    fingerprint = schema_fingerprint()
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        recorded = dict(conn.execute(text("SELECT version, name FROM schema_migrations")).all())
+        if recorded.get(SCHEMA_VERSION) == fingerprint and all(version in recorded for version, _, _ in MIGRATIONS):
+            # Nada cambió desde el último arranque
+            return []
+        fresh = "sales" not in _tables(conn)
+        if fresh:
+            # Base nueva: se crea el esquema completo y se marcan todas las migraciones
+            models.Base.metadata.create_all(bind=conn)
+            for version, name, _ in MIGRATIONS:
+                _record(conn, version, name)
+            _record_fingerprint(conn, fingerprint)
+            return []
+
+    # Tablas nuevas que todavía no existan (las existentes no se tocan)
+    models.Base.metadata.create_all(bind=engine)
+
+    done = applied_versions(engine)
+    applied = []
+    for version, name, migrate in MIGRATIONS:
+        if version in done:
+            continue
+        # Cada migración va en su propia transacción junto con su registro
+        with engine.begin() as conn:
+            if verbose:
+                print(f"Aplicando migración {version:04d}: {name}")
+            migrate(conn)
+            _record(conn, version, name)
+        applied.append(version)
+
+    with engine.begin() as conn:
+        _record_fingerprint(conn, fingerprint)
+    return applied
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    if len(sys.argv) > 1 and sys.argv[1] == "status":
+        done = applied_versions(engine)
+        for version, name, _ in MIGRATIONS:
+            mark = "x" if version in done else " "
+            print(f"[{mark}] {version:04d} {name}")
+    else:
+        applied = run(engine)
+        print(f"Migraciones aplicadas: {len(applied)}")
@@ -1,8 +1,39 @@
 # models.py
 
-from sqlalchemy import Column, Integer, String, Float, Enum as SQLAlchemyEnum
+from sqlalchemy import Column, Integer, String, Float, Enum as SQLAlchemyEnum, ForeignKey, Index, event
+from sqlalchemy.ext.hybrid import hybrid_property
 from database import Base
 import enum
+import os
+
+# --- Sucursales ---
+# Sucursal que se usa cuando la petición no indica ninguna (ver branches.py)
+DEFAULT_BRANCH = os.getenv("CAFE_DEFAULT_BRANCH", "central")
+# branch_id de las configuraciones que valen para todas las sucursales
+GLOBAL_SETTING = ""
+
+
+# --- Montos de dinero ---
+# Se guardan como enteros en centavos para que las sumas sean exactas. Hacia
+# afuera (API, esquemas) se siguen usando montos con decimales, ej. 2800.5
+
+def to_cents(amount):
+    return None if amount is None else int(round(amount * 100))
+
+def cents_property(cents_attr):
+    """Expone una columna en centavos como monto decimal, también dentro de consultas."""
+    def getter(self):
+        value = getattr(self, cents_attr)
+        return None if value is None else value / 100
+
+    def setter(self, amount):
+        setattr(self, cents_attr, to_cents(amount))
+
+    def expression(cls):
+        return getattr(cls, cents_attr) / 100.0
+
+    return hybrid_property(getter, setter, expr=expression)
+
 
 # CORRECCIÓN: Añadimos todas las categorías que vamos a usar
 class ProductCategory(str, enum.Enum):
@@ -23,9 +54,15 @@ class Product(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True, nullable=False)
     description = Column(String, nullable=True)
-    price = Column(Float, nullable=False)
+    price_cents = Column(Integer, nullable=False)
+    price = cents_property("price_cents")
     # Aquí usamos nuestra nueva lista de categorías
     category = Column(SQLAlchemyEnum(ProductCategory), nullable=False)
+
+    __table_args__ = (
+        # Filtro por categoría con paginación por cursor (WHERE category = ? AND id > ? ORDER BY id)
+        Index("ix_products_category_id", "category", "id"),
+    )
     # models.py
 # ... (código anterior de Product) ...
 
@@ -33,9 +70,22 @@ class Setting(Base):
     __tablename__ = "settings"
     
     key = Column(String, primary_key=True, index=True)
+    # GLOBAL_SETTING para las que valen en todas las sucursales
+    branch_id = Column(String, primary_key=True, default=GLOBAL_SETTING)
     value = Column(String, nullable=True)
+    # Valor del sello "settings" cuando se guardó (ver settings.py y stamps.py)
+    version = Column(Integer, nullable=False, default=0)
+
+# Precio de un producto en una sucursal, si difiere del precio general
+class ProductBranchPrice(Base):
+    __tablename__ = "product_branch_prices"
+
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    branch_id = Column(String, primary_key=True)
+    price_cents = Column(Integer, nullable=False)
+    price = cents_property("price_cents")
     # models.py
-from sqlalchemy import Column, Integer, String, Float, Enum as SQLAlchemyEnum, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Enum as SQLAlchemyEnum, DateTime, Date, ForeignKey, Index, Boolean, JSON
 from sqlalchemy.orm import relationship
 from database import Base
 import enum
@@ -47,19 +97,172 @@ class Sale(Base):
     __tablename__ = "sales"
 
     id = Column(Integer, primary_key=True, index=True)
-    created_at = Column(DateTime, default=datetime.datetime.utcnow)
-    total_amount = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    total_cents = Column(Integer, nullable=False)
+    total_amount = cents_property("total_cents")
     payment_method = Column(String, nullable=False)
+    # Clave generada por la caja para que reenviar la misma venta no la duplique
+    # (única por sucursal, ver el índice de abajo)
+    idempotency_key = Column(String, index=True, nullable=True)
+    branch_id = Column(String, nullable=False, default=DEFAULT_BRANCH)
     
     items = relationship("SaleItem", back_populates="sale")
 
+    __table_args__ = (
+        Index("ix_sales_branch_id_created_at", "branch_id", "created_at"),
+        Index("ix_sales_branch_id_idempotency_key", "branch_id", "idempotency_key", unique=True),
+    )
+
 class SaleItem(Base):
     __tablename__ = "sale_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    sale_id = Column(Integer, ForeignKey("sales.id"))
-    product_name = Column(String, nullable=False)
+    sale_id = Column(Integer, ForeignKey("sales.id"), index=True)
+    # Se completa buscando el producto por nombre; queda en NULL si el producto se borró
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="SET NULL"), nullable=True)
+    product_name = Column(String, nullable=False, index=True)
     quantity = Column(Integer, nullable=False)
-    unit_price = Column(Float, nullable=False)
+    unit_price_cents = Column(Integer, nullable=False)
+    unit_price = cents_property("unit_price_cents")
     
-    sale = relationship("Sale", back_populates="items")
\ No newline at end of file
+    sale = relationship("Sale", back_populates="items")
+
+    __table_args__ = (
+        Index("ix_sale_items_product_id_sale_id", "product_id", "sale_id"),
+    )
+
+# --- Tablas de resumen (rollup) para reportes ---
+# Se mantienen de forma incremental en cada venta (ver rollup.py) y se pueden
+# reconstruir desde cero con: python rollup.py rebuild
+
+class DailySalesTotal(Base):
+    __tablename__ = "daily_sales"
+
+    branch_id = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    revenue_cents = Column(Integer, nullable=False, default=0)
+    revenue = cents_property("revenue_cents")
+    ticket_count = Column(Integer, nullable=False, default=0)
+
+class DailyProductSale(Base):
+    __tablename__ = "daily_product_sales"
+
+    branch_id = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    product_name = Column(String, primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue_cents = Column(Integer, nullable=False, default=0)
+    revenue = cents_property("revenue_cents")
+    ticket_count = Column(Integer, nullable=False, default=0)
+
+# --- Sellos de versión de las cachés en memoria ---
+# Cada escritura del catálogo o de la configuración incrementa su fila; cada
+# worker compara el valor con el último que vio para saber si su caché quedó
+# vieja (ver stamps.py)
+
+CACHE_STAMPS = ("catalog", "settings")
+
+class CacheStamp(Base):
+    __tablename__ = "cache_stamps"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+@event.listens_for(CacheStamp.__table__, "after_create")
+def _seed_cache_stamps(table, connection, **kw):
+    connection.execute(table.insert(), [{"name": name, "version": 0} for name in CACHE_STAMPS])
+
+# --- Libro de ventas encadenado y cierres de caja ---
+# Van en la base de ventas de cada sucursal (ver ledger.py y shifts.py)
+
+# Una entrada por venta y por cierre de caja, en orden, cada una con el hash
+# de la anterior. Solo se agregan filas: nunca se modifican ni se borran.
+class LedgerEntry(Base):
+    __tablename__ = "ledger_entries"
+
+    branch_id = Column(String, primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)  # "sale" o "close"
+    ref_id = Column(Integer, nullable=False)  # sales.id o shifts.id
+    digest = Column(String, nullable=False)  # hash del contenido de la venta o del cierre
+    hash = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+# Última entrada de cada sucursal: se actualiza con lock al agregar
+class LedgerHead(Base):
+    __tablename__ = "ledger_heads"
+
+    branch_id = Column(String, primary_key=True)
+    seq = Column(Integer, nullable=False, default=0)
+    hash = Column(String, nullable=False)
+
+# Hasta dónde se verificó la cadena: la próxima verificación sigue desde acá
+class LedgerCheckpoint(Base):
+    __tablename__ = "ledger_checkpoints"
+
+    branch_id = Column(String, primary_key=True)
+    seq = Column(Integer, nullable=False)
+    hash = Column(String, nullable=False)
+    verified_at = Column(DateTime, nullable=False)
+
+# Cierre de caja: totales congelados de las ventas entre el cierre anterior y este
+class Shift(Base):
+    __tablename__ = "shifts"
+
+    id = Column(Integer, primary_key=True)
+    branch_id = Column(String, nullable=False)
+    opened_at = Column(DateTime, nullable=False)
+    closed_at = Column(DateTime, nullable=False)
+    # Entrada del libro que registra el cierre; las ventas del turno son las
+    # entradas entre la del cierre anterior y esta
+    ledger_seq = Column(Integer, nullable=False)
+    ledger_hash = Column(String, nullable=False)  # hash de la cadena antes del cierre
+    first_sale_id = Column(Integer, nullable=True)
+    last_sale_id = Column(Integer, nullable=True)
+    sale_count = Column(Integer, nullable=False)
+    total_cents = Column(Integer, nullable=False)
+    total = cents_property("total_cents")
+    snapshot_hash = Column(String, nullable=False)
+
+    __table_args__ = (
+        Index("ix_shifts_branch_id_ledger_seq", "branch_id", "ledger_seq"),
+        Index("ix_shifts_branch_id_closed_at", "branch_id", "closed_at"),
+    )
+
+class ShiftPaymentTotal(Base):
+    __tablename__ = "shift_payment_totals"
+
+    shift_id = Column(Integer, ForeignKey("shifts.id"), primary_key=True)
+    payment_method = Column(String, primary_key=True)
+    revenue_cents = Column(Integer, nullable=False)
+    ticket_count = Column(Integer, nullable=False)
+
+class ShiftProductTotal(Base):
+    __tablename__ = "shift_product_totals"
+
+    shift_id = Column(Integer, ForeignKey("shifts.id"), primary_key=True)
+    product_name = Column(String, primary_key=True)
+    quantity = Column(Integer, nullable=False)
+    revenue_cents = Column(Integer, nullable=False)
+
+# --- Trabajos de reportes (ver jobs.py) ---
+# En la base principal, así cualquier worker responde por un trabajo que encoló otro
+class ReportJob(Base):
+    __tablename__ = "report_jobs"
+
+    id = Column(String, primary_key=True)
+    kind = Column(String, nullable=False)
+    key = Column(String, nullable=False, index=True)  # tipo y parámetros en JSON canónico
+    params = Column(JSON, nullable=False)
+    status = Column(String, nullable=False)  # queued, running, done o error
+    # No se reutiliza para pedidos nuevos (falló, o cambiaron las ventas que lee)
+    stale = Column(Boolean, nullable=False, default=False)
+    # Huella por sucursal de las ventas que lee, al encolarlo (ver jobs.inputs)
+    inputs = Column(JSON, nullable=True)
+    pid = Column(Integer, nullable=False)  # proceso que lo corre
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    result = Column(JSON, nullable=True)
+    error = Column(String, nullable=True)
+    path = Column(String, nullable=True)  # archivo generado (exportaciones)
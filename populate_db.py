@@ -1,8 +1,9 @@
 # populate_db.py
 import requests
-import json
 
-API_URL = "http://127.0.0.1:8000/products/"
+import import_menu
+
+API_URL = "http://127.0.0.1:8000"
 
 # Lista completa del menú de Zibá (puedes añadir todos los que faltan aquí)
 menu_completo_ziba = [
@@ -41,23 +42,16 @@ menu_completo_ziba = [
 ]
 
 def populate():
-    headers = {"Content-Type": "application/json"}
-    
     print("Iniciando carga de productos en la base de datos...")
-    
-    for item in menu_ziba:
-        try:
-            response = requests.post(API_URL, data=json.dumps(item), headers=headers)
-            if response.status_code == 200:
-                print(f"  -> Creado: {item['name']}")
-            else:
-                print(f"  -> Error al crear {item['name']}: {response.text}")
-        except requests.exceptions.ConnectionError as e:
-            print(f"\nError de conexión: No se pudo conectar a la API en {API_URL}")
-            print("Por favor, asegúrate de que el servidor backend (uvicorn) esté funcionando antes de ejecutar este script.")
-            return
-
+    try:
+        # Un solo PUT /products/bulk en vez de un POST por producto
+        diff = import_menu.push(API_URL, menu_completo_ziba)
+    except requests.exceptions.ConnectionError:
+        print(f"\nError de conexión: No se pudo conectar a la API en {API_URL}")
+        print("Por favor, asegúrate de que el servidor backend (uvicorn) esté funcionando antes de ejecutar este script.")
+        return
+    import_menu.print_diff(diff)
     print("\n¡Carga de menú completada!")
 
 if __name__ == "__main__":
-    populate()
\ No newline at end of file
+    populate()
@@ -1,9 +1,10 @@
 # populate_production.py
 import requests
-import json
+
+import import_menu
 
 # ¡IMPORTANTE! Cambia la URL para que apunte a tu servidor en producción
-API_URL = "https://cafe-system-7nhg.onrender.com/products/"
+API_URL = "https://cafe-system-7nhg.onrender.com"
 
 # Lista completa del menú de Zibá (puedes añadir todos los que faltan aquí)
 menu_completo_ziba = [
@@ -42,21 +43,15 @@ menu_completo_ziba = [
 ]
 
 def populate():
-    headers = {"Content-Type": "application/json"}
-    print(f"Iniciando carga de productos en el servidor de PRODUCCIÓN: {API_URL}")
-
-    for item in menu_completo_ziba:
-        try:
-            response = requests.post(API_URL, data=json.dumps(item), headers=headers)
-            if response.status_code == 200:
-                print(f"  -> Creado: {item['name']}")
-            else:
-                # Imprime un error si el producto ya existe o hay otro problema
-                print(f"  -> Aviso para {item['name']}: {response.text}")
-        except requests.exceptions.ConnectionError as e:
-            print(f"\nError de conexión. No se pudo conectar a la API.")
-            return
+    print(f"Cargando el menú en el servidor de PRODUCCIÓN: {API_URL}")
+    try:
+        # Un solo PUT /products/bulk: se puede repetir sin duplicar productos
+        diff = import_menu.push(API_URL, menu_completo_ziba)
+    except requests.exceptions.ConnectionError:
+        print("\nError de conexión. No se pudo conectar a la API.")
+        return
+    import_menu.print_diff(diff)
     print("\n¡Carga de menú completada!")
 
 if __name__ == "__main__":
-    populate()
\ No newline at end of file
+    populate()
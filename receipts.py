@@ -0,0 +1,300 @@
+# receipts.py
+"""
+Comprobantes de venta (GET /sales/{id}/receipt y GET /sales/receipts).
+
+Las plantillas están en templates/ (receipt.txt, 42 columnas para una
+impresora térmica de 80 mm, y receipt.html) y se pueden editar sin tocar el
+código: los campos van como `{campo:formato}` (el mismo formato de Python, ej.
+`{name:<24.24}`) y las líneas entre `{% items %}` y `{% end %}` se repiten por
+cada ítem. Se compilan una sola vez al arrancar (`load()`): cada plantilla
+queda partida en texto fijo y campos ya validados, así un campo mal escrito
+falla al arrancar y no en la caja.
+
+Las ventas no se modifican, así que cada comprobante se arma una sola vez: los
+ya generados quedan en una caché LRU por (sucursal, venta, formato) de como
+máximo RECEIPT_CACHE_SIZE entradas (por defecto 2048) y reimprimir no toca la base.
+
+Formatos: `text` (texto plano), `html` y `escpos` (el texto con los comandos
+ESC/POS para inicializar la impresora, elegir la página de códigos y cortar el
+papel, listo para mandar crudo a la impresora).
+
+`stream()` genera los comprobantes de un rango de tiempo o de un cierre de
+caja uno detrás de otro, leyendo las ventas por bloques como export.py.
+"""
+import html
+import os
+import string
+import threading
+from collections import OrderedDict
+from datetime import timezone
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import branches
+import models
+import today
+
+TEMPLATES_DIR = os.getenv("RECEIPT_TEMPLATES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates"))
+MAX_CACHED = int(os.getenv("RECEIPT_CACHE_SIZE", "2048"))
+CHUNK_SIZE = 2000
+
+FORMATS = ("text", "html", "escpos")
+MEDIA_TYPES = {
+    "text": "text/plain; charset=utf-8",
+    "html": "text/html; charset=utf-8",
+    "escpos": "application/octet-stream",
+}
+
+ITEMS_START = "{% items %}"
+ITEMS_END = "{% end %}"
+SALE_FIELDS = {"id", "branch_id", "date", "time", "payment_method", "total", "units"}
+ITEM_FIELDS = {"name", "quantity", "unit_price", "subtotal"}
+
+# ESC @ (inicializar), ESC t 2 (página de códigos PC850, con tildes y ñ);
+# al final, avanzar el papel y GS V 66 0 (cortar)
+ESCPOS_START = b"\x1b@\x1bt\x02"
+ESCPOS_END = b"\n\n\n\x1dVB\x00"
+ESCPOS_ENCODING = "cp850"
+
+HTML_HEAD = (
+    '<!DOCTYPE html>\n<html lang="es">\n<head>\n<meta charset="utf-8">\n<title>Comprobantes</title>\n'
+    "<style>\n"
+    "body { font-family: monospace; }\n"
+    ".receipt { width: 80mm; margin: 0 auto 2em; }\n"
+    ".receipt table { width: 100%; border-collapse: collapse; }\n"
+    ".receipt td:nth-child(n+3) { text-align: right; }\n"
+    "@media print { .receipt { page-break-after: always; margin: 0; } }\n"
+    "</style>\n</head>\n<body>\n"
+)
+HTML_TAIL = "</body>\n</html>\n"
+TEXT_SEPARATOR = "\n\f\n"  # salto de página entre comprobantes
+
+
+# --- Plantillas ---
+
+def _compile(source: str, fields: set, name: str):
+    """[(texto fijo, campo o None, formato)] de un trozo de plantilla."""
+    parts = []
+    for literal, field, spec, conversion in string.Formatter().parse(source):
+        if field is not None:
+            if field not in fields:
+                raise ValueError(f"Campo desconocido {{{field}}} en la plantilla {name}")
+            if conversion:
+                raise ValueError(f"Conversión !{conversion} no soportada en la plantilla {name}")
+            # Un formato inválido (ej. {total:>x}) falla acá y no al imprimir
+            format(0 if field == "quantity" else "", spec)
+        parts.append((literal, field, spec))
+    return parts
+
+
+def _fill(parts, values, escape):
+    out = []
+    for literal, field, spec in parts:
+        out.append(literal)
+        if field is not None:
+            value = format(values[field], spec)
+            out.append(escape(value) if escape else value)
+    return "".join(out)
+
+
+class Template:
+    """Plantilla compilada: encabezado, línea por ítem y pie."""
+
+    def __init__(self, source: str, name: str, escape=None):
+        self.escape = escape
+        before, marker, rest = source.partition(ITEMS_START + "\n")
+        if not marker:
+            raise ValueError(f"Falta la línea {ITEMS_START} en la plantilla {name}")
+        item, marker, after = rest.partition(ITEMS_END + "\n")
+        if not marker:
+            raise ValueError(f"Falta la línea {ITEMS_END} en la plantilla {name}")
+        self.header = _compile(before, SALE_FIELDS, name)
+        self.item = _compile(item, ITEM_FIELDS, name)
+        self.footer = _compile(after, SALE_FIELDS, name)
+
+    def render(self, sale: dict, items) -> str:
+        return (
+            _fill(self.header, sale, self.escape)
+            + "".join(_fill(self.item, item, self.escape) for item in items)
+            + _fill(self.footer, sale, self.escape)
+        )
+
+
+_templates = {}
+
+
+def load():
+    """Lee y compila las plantillas (se llama al arrancar; ValueError si alguna está mal)."""
+    compiled = {}
+    for kind, filename, escape in (("text", "receipt.txt", None), ("html", "receipt.html", html.escape)):
+        with open(os.path.join(TEMPLATES_DIR, filename), encoding="utf-8") as f:
+            compiled[kind] = Template(f.read(), filename, escape)
+    _templates.update(compiled)
+    clear_cache()
+
+
+def template(kind: str) -> Template:
+    if not _templates:
+        load()
+    return _templates[kind]
+
+
+# --- Datos de la venta ---
+
+def _money(cents) -> str:
+    """$ 2.800,00"""
+    return "$ " + f"{cents / 100:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def _sale_values(sale_id, branch_id, created_at, payment_method, total_cents, items) -> dict:
+    local = created_at.replace(tzinfo=timezone.utc).astimezone(today.TIMEZONE)
+    return {
+        "id": str(sale_id),
+        "branch_id": branch_id,
+        "date": local.strftime("%d/%m/%Y"),
+        "time": local.strftime("%H:%M"),
+        "payment_method": payment_method,
+        "total": _money(total_cents),
+        "units": str(sum(item["quantity"] for item in items)),
+    }
+
+
+def _item_values(name, quantity, unit_price_cents) -> dict:
+    return {
+        "name": name,
+        "quantity": quantity,
+        "unit_price": _money(unit_price_cents),
+        "subtotal": _money(quantity * unit_price_cents),
+    }
+
+
+def _sales_query(branch_id):
+    return (
+        select(
+            models.Sale.id, models.Sale.branch_id, models.Sale.created_at,
+            models.Sale.payment_method, models.Sale.total_cents,
+            models.SaleItem.product_name, models.SaleItem.quantity, models.SaleItem.unit_price_cents,
+        )
+        .outerjoin(models.SaleItem, models.SaleItem.sale_id == models.Sale.id)
+        .where(models.Sale.branch_id == branch_id)
+        .order_by(models.Sale.id, models.SaleItem.id)
+    )
+
+
+def _group(rows):
+    """Agrupa filas venta × ítem (ordenadas por venta) en (sale_id, datos de la venta, ítems)."""
+    current, head, items = None, None, []
+    for sale_id, branch_id, created_at, method, total_cents, name, quantity, unit_cents in rows:
+        if sale_id != current:
+            if current is not None:
+                yield current, head, items
+            current, head, items = sale_id, (sale_id, branch_id, created_at, method, total_cents), []
+        if name is not None:
+            items.append(_item_values(name, quantity, unit_cents))
+    if current is not None:
+        yield current, head, items
+
+
+def _render(kind, head, items) -> str:
+    return template("html" if kind == "html" else "text").render(_sale_values(*head, items), items)
+
+
+# --- Caché ---
+
+_lock = threading.Lock()
+_cache = OrderedDict()  # (branch_id, sale_id, "text" | "html") -> comprobante
+
+
+def _cache_kind(kind):
+    # escpos es el mismo texto con los comandos alrededor
+    return "html" if kind == "html" else "text"
+
+
+def cached(branch_id: str, sale_id: int, kind: str):
+    key = (branch_id, sale_id, _cache_kind(kind))
+    with _lock:
+        rendered = _cache.get(key)
+        if rendered is not None:
+            _cache.move_to_end(key)
+    return rendered
+
+
+def _store(branch_id, sale_id, kind, rendered):
+    with _lock:
+        _cache[(branch_id, sale_id, _cache_kind(kind))] = rendered
+        while len(_cache) > MAX_CACHED:
+            _cache.popitem(last=False)
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+
+
+# --- Salida ---
+
+def render_sale(db: Session, sale_id: int, branch_id: str, kind: str = "text"):
+    """Comprobante de una venta (texto o HTML, sin armar la página), o None si no existe."""
+    rendered = cached(branch_id, sale_id, kind)
+    if rendered is not None:
+        return rendered
+    rows = db.execute(_sales_query(branch_id).where(models.Sale.id == sale_id)).all()
+    for _, head, items in _group(rows):
+        rendered = _render(kind, head, items)
+        _store(branch_id, sale_id, kind, rendered)
+    return rendered
+
+
+def document(rendered: str, kind: str) -> bytes:
+    """Un comprobante listo para devolver en el formato pedido."""
+    if kind == "html":
+        return (HTML_HEAD + rendered + HTML_TAIL).encode("utf-8")
+    if kind == "escpos":
+        return ESCPOS_START + rendered.encode(ESCPOS_ENCODING, errors="replace") + ESCPOS_END
+    return rendered.encode("utf-8")
+
+
+def stream(branch_id: str, start, end, kind: str = "text", sale_ids=None):
+    """
+    Genera los comprobantes de las ventas de la sucursal en [start, end)
+    (UTC sin zona, como Sale.created_at), por bloques de CHUNK_SIZE filas.
+    Con `sale_ids` (primera, última) se toma en cambio ese tramo de IDs (un
+    cierre de caja) y start/end pueden ser None. Usa su propia sesión: es para
+    un StreamingResponse.
+    """
+    if kind == "html":
+        yield HTML_HEAD.encode("utf-8")
+    first = True
+    db = branches.store(branch_id).SessionLocal()
+    try:
+        query = _sales_query(branch_id)
+        if start is not None:
+            query = query.where(models.Sale.created_at >= start)
+        if end is not None:
+            query = query.where(models.Sale.created_at < end)
+        if sale_ids is not None:
+            query = query.where(models.Sale.id.between(*sale_ids))
+        result = db.execute(
+            query,
+            execution_options={"stream_results": True, "yield_per": CHUNK_SIZE},
+        )
+        buffer = []
+        # Una venta puede quedar partida entre dos bloques: _group recorre todas las filas seguidas
+        for sale_id, head, items in _group(row for partition in result.partitions() for row in partition):
+            rendered = cached(branch_id, sale_id, kind) or _render(kind, head, items)
+            if kind == "escpos":
+                buffer.append(document(rendered, kind))
+            else:
+                separator = "" if first or kind == "html" else TEXT_SEPARATOR
+                buffer.append((separator + rendered).encode("utf-8"))
+            first = False
+            if len(buffer) >= 100:
+                yield b"".join(buffer)
+                buffer = []
+        if buffer:
+            yield b"".join(buffer)
+    finally:
+        db.close()
+    if kind == "html":
+        yield HTML_TAIL.encode("utf-8")
@@ -0,0 +1,250 @@
+# rollup.py
+"""
+Mantenimiento de las tablas de resumen diario (daily_sales y daily_product_sales).
+
+Las ventas se acumulan por sucursal y día local (CAFE_TZ, ver today.py; el
+mismo día que usan /reports/today y /reports/timeseries) dentro de la misma
+transacción que las registra, así los reportes no necesitan volver a recorrer
+`sales` y `sale_items`.
+
+Uso por línea de comandos:
+    python rollup.py rebuild        # todas las bases de ventas (ver branches.py)
+"""
+import sys
+from collections import defaultdict
+from datetime import date, timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+import models
+import today
+
+
+def record_sales(db: Session, entries, branch_id: str = models.DEFAULT_BRANCH):
+    """
+    Suma un lote de ventas de una sucursal a las tablas de resumen. No hace
+    commit: el llamador lo hace junto con las ventas para que ambas cosas
+    queden en la misma transacción.
+
+    `entries` es una lista de tuplas (created_at, total_amount, items), donde cada
+    ítem tiene `product_name`, `quantity` y `unit_price`.
+    """
+    day_totals = defaultdict(lambda: [0, 0])
+    product_totals = defaultdict(lambda: [0, 0, 0])
+
+    for created_at, total_amount, items in entries:
+        day = today.local_date(created_at)
+        day_totals[day][0] += models.to_cents(total_amount)
+        day_totals[day][1] += 1
+
+        seen_in_ticket = set()
+        for item in items:
+            acc = product_totals[(day, item.product_name)]
+            acc[0] += item.quantity
+            acc[1] += item.quantity * models.to_cents(item.unit_price)
+            if item.product_name not in seen_in_ticket:
+                seen_in_ticket.add(item.product_name)
+                acc[2] += 1
+
+    for day, (revenue, tickets) in day_totals.items():
+        _accumulate(db, models.DailySalesTotal, {"branch_id": branch_id, "day": day}, {
+            "revenue_cents": revenue,
+            "ticket_count": tickets,
+        })
+
+    for (day, product_name), (quantity, revenue, tickets) in product_totals.items():
+        _accumulate(db, models.DailyProductSale, {"branch_id": branch_id, "day": day, "product_name": product_name}, {
+            "quantity": quantity,
+            "revenue_cents": revenue,
+            "ticket_count": tickets,
+        })
+
+
+def _accumulate(db: Session, model, keys: dict, deltas: dict):
+    """
+    Suma `deltas` a la fila identificada por `keys`, creándola si no existe.
+    En SQLite y PostgreSQL se hace con un único INSERT ... ON CONFLICT DO UPDATE,
+    así dos cajas que venden a la vez el mismo día no chocan por la clave primaria.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        table = model.__table__
+        stmt = insert(table).values(**keys, **deltas)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={col: table.c[col] + stmt.excluded[col] for col in deltas},
+        )
+        db.execute(stmt)
+        return
+
+    row = db.get(model, tuple(keys.values()) if len(keys) > 1 else next(iter(keys.values())))
+    if row is None:
+        db.add(model(**keys, **deltas))
+    else:
+        for col, delta in deltas.items():
+            setattr(row, col, getattr(row, col) + delta)
+
+
+def record_sale(db: Session, created_at, total_amount, items, branch_id: str = models.DEFAULT_BRANCH):
+    """Atajo de `record_sales` para una sola venta."""
+    record_sales(db, [(created_at, total_amount, items)], branch_id)
+
+
+def _local_days(db: Session):
+    """(día, inicio, fin) de cada día local entre la primera y la última venta, con los límites en UTC."""
+    first, last = db.query(func.min(models.Sale.created_at), func.max(models.Sale.created_at)).one()
+    if first is None:
+        return
+    day, last_day = today.local_date(first), today.local_date(last)
+    while day <= last_day:
+        yield (day, *today.utc_bounds(day))
+        day += timedelta(days=1)
+
+
+def rebuild(db: Session):
+    """
+    Borra y vuelve a calcular las tablas de resumen a partir de `sales` y
+    `sale_items`. Se agrupa día local por día local (con sus límites en UTC,
+    que cambian con el horario de verano) para usar el índice de created_at.
+    """
+    db.query(models.DailyProductSale).delete()
+    db.query(models.DailySalesTotal).delete()
+
+    days, product_days = 0, 0
+    for day, start, end in list(_local_days(db)):
+        in_day = (models.Sale.created_at >= start, models.Sale.created_at < end)
+        day_rows = (
+            db.query(
+                models.Sale.branch_id,
+                func.sum(models.Sale.total_cents),
+                func.count(models.Sale.id),
+            )
+            .filter(*in_day)
+            .group_by(models.Sale.branch_id)
+            .all()
+        )
+        for branch_id, revenue, tickets in day_rows:
+            db.add(models.DailySalesTotal(
+                branch_id=branch_id, day=day, revenue_cents=revenue or 0, ticket_count=tickets,
+            ))
+
+        product_rows = (
+            db.query(
+                models.Sale.branch_id,
+                models.SaleItem.product_name,
+                func.sum(models.SaleItem.quantity),
+                func.sum(models.SaleItem.quantity * models.SaleItem.unit_price_cents),
+                func.count(func.distinct(models.Sale.id)),
+            )
+            .join(models.Sale)
+            .filter(*in_day)
+            .group_by(models.Sale.branch_id, models.SaleItem.product_name)
+            .all()
+        )
+        for branch_id, product_name, quantity, revenue, tickets in product_rows:
+            db.add(models.DailyProductSale(
+                branch_id=branch_id,
+                day=day,
+                product_name=product_name,
+                quantity=quantity or 0,
+                revenue_cents=revenue or 0,
+                ticket_count=tickets,
+            ))
+        days += len(day_rows)
+        product_days += len(product_rows)
+
+    db.commit()
+    return days, product_days
+
+
+def is_empty(db: Session) -> bool:
+    return db.query(models.DailySalesTotal.day).first() is None
+
+
+def summary_queries(first_day, last_day, top=None, branch_id=None):
+    """
+    Consultas del resumen de un rango de días (ambos inclusive): (totales, ranking).
+    Son sentencias select() para poder ejecutarlas tanto con Session como con AsyncSession.
+    Con `top=None` el ranking trae todos los productos (para sumar varias sucursales).
+    """
+    totals = select(
+        func.coalesce(func.sum(models.DailySalesTotal.revenue_cents), 0),
+        func.coalesce(func.sum(models.DailySalesTotal.ticket_count), 0),
+    ).where(models.DailySalesTotal.day >= first_day, models.DailySalesTotal.day <= last_day)
+
+    ranking = (
+        select(
+            models.DailyProductSale.product_name,
+            func.sum(models.DailyProductSale.quantity).label("total_quantity"),
+        )
+        .where(models.DailyProductSale.day >= first_day, models.DailyProductSale.day <= last_day)
+        .group_by(models.DailyProductSale.product_name)
+        .order_by(func.sum(models.DailyProductSale.quantity).desc())
+    )
+    if branch_id is not None:
+        totals = totals.where(models.DailySalesTotal.branch_id == branch_id)
+        ranking = ranking.where(models.DailyProductSale.branch_id == branch_id)
+    if top is not None:
+        ranking = ranking.limit(top)
+    return totals, ranking
+
+
+def merge_summaries(per_branch: dict, top: int) -> dict:
+    """
+    Suma los resultados de `summary_queries` de varias sucursales.
+    `per_branch` es {sucursal: ((centavos, tickets), [(producto, cantidad), ...])}.
+    """
+    total_revenue_cents = sum(totals[0] for totals, _ in per_branch.values())
+    total_sales = sum(totals[1] for totals, _ in per_branch.values())
+    total_revenue = total_revenue_cents / 100
+
+    quantities = {}
+    for _, ranking in per_branch.values():
+        for name, quantity in ranking:
+            quantities[name] = quantities.get(name, 0) + quantity
+    top_products = sorted(quantities.items(), key=lambda entry: entry[1], reverse=True)[:top]
+
+    return {
+        "total_revenue": total_revenue,
+        "total_sales": total_sales,
+        "average_ticket": total_revenue / total_sales if total_sales > 0 else 0,
+        "top_products": [{"name": name, "quantity": quantity} for name, quantity in top_products],
+        "branches": [
+            {"branch_id": branch, "total_revenue": totals[0] / 100, "total_sales": totals[1]}
+            for branch, (totals, _) in per_branch.items()
+        ],
+    }
+
+
+def as_date(value):
+    # func.date() devuelve un string 'YYYY-MM-DD' en SQLite
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    return value
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] != "rebuild":
+        print("Uso: python rollup.py rebuild")
+        sys.exit(1)
+
+    import branches
+    import migrations
+    from database import engine
+    migrations.run(engine)
+
+    # Una vez por base de ventas, como al arrancar la app (con BRANCH_DATABASE_URL
+    # cada sucursal tiene la suya; abrirla aplica sus migraciones)
+    for branch_store in branches.databases():
+        db = branch_store.SessionLocal()
+        try:
+            days, product_days = rebuild(db)
+            where = f" ({branch_store.branch})" if branch_store.engine is not engine else ""
+            print(f"Resumen reconstruido{where}: {days} días, {product_days} filas producto/día.")
+        finally:
+            db.close()
@@ -0,0 +1,291 @@
+# sales.py
+"""
+Alta de ventas. Tanto POST /sales/ como POST /sales/batch pasan por acá para que
+cada venta (o lote de ventas) cueste un solo commit, junto con su entrada en el
+libro encadenado (ledger.py) y el resumen diario (rollup.py).
+
+`db` es la sesión de la base de ventas de la sucursal (ver branches.py). Cuando
+esa base no tiene el catálogo, el llamador pasa `product_ids` ya resuelto.
+
+Una venta que la caja guardó sin conexión llega más tarde con la hora en que
+se hizo (`created_at`): se guarda con esa hora, así cae en su día en el resumen
+diario, los contadores del día y el libro. Se acepta hasta
+SALE_MAX_BACKDATE_HOURS hacia atrás (por defecto 72); una hora futura (reloj de
+la caja adelantado) se lleva a la del servidor.
+"""
+import os
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import func, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import branches
+import database
+import ledger
+import models
+import rollup
+import schemas
+import stamps
+import today
+
+MAX_BACKDATE = timedelta(hours=int(os.getenv("SALE_MAX_BACKDATE_HOURS", "72")))
+
+
+# Funciones que se llaman con las ventas nuevas, una vez confirmado el commit
+# (ej. el canal de eventos en tiempo real). Reciben una lista de dicts.
+_listeners = []
+
+
+def add_listener(callback):
+    _listeners.append(callback)
+
+
+def _notify(sales):
+    if not sales:
+        return
+    for callback in _listeners:
+        try:
+            callback(sales)
+        except Exception as e:
+            # Un listener con problemas no puede hacer fallar una venta ya guardada
+            print(f"--- ERROR EN LISTENER DE VENTAS ---\n{e}\n------------------------")
+
+
+def sale_event(sale_id, created_at, sale: schemas.SaleCreate, branch_id: str, version: int = None) -> dict:
+    return {
+        "id": sale_id,
+        "branch_id": branch_id,
+        # Sello de ventas de la sucursal después del commit que la guardó (ver stamps.py)
+        "sales_version": version,
+        "created_at": created_at.isoformat(),
+        # Día local (CAFE_TZ), el mismo con el que se agrupan los reportes (ver rollup.py)
+        "day": today.local_date(created_at).isoformat(),
+        "total_amount": sale.total_amount,
+        "payment_method": sale.payment_method,
+        "items": [item.model_dump() for item in sale.items],
+    }
+
+
+def sale_time(sale: schemas.SaleCreate, now: datetime) -> datetime:
+    """Hora de la venta en UTC sin zona: la de la caja, acotada a [now - MAX_BACKDATE, now]."""
+    if sale.created_at is None:
+        return now
+    return min(max(today.to_utc(sale.created_at), now - MAX_BACKDATE), now)
+
+
+def existing_ids(db: Session, keys, branch_id: str) -> dict:
+    """Devuelve {idempotency_key: sale_id} para las claves que la sucursal ya guardó."""
+    keys = [key for key in set(keys) if key]
+    if not keys:
+        return {}
+    rows = (
+        db.query(models.Sale.idempotency_key, models.Sale.id)
+        .filter(models.Sale.branch_id == branch_id, models.Sale.idempotency_key.in_(keys))
+        .all()
+    )
+    return dict(rows)
+
+
+def lookup_product_ids(db: Session, names) -> dict:
+    """Devuelve {nombre: product_id} para los productos del catálogo con esos nombres."""
+    names = set(names)
+    if not names:
+        return {}
+    rows = (
+        db.query(models.Product.name, func.min(models.Product.id))
+        .filter(models.Product.name.in_(names))
+        .group_by(models.Product.name)
+        .all()
+    )
+    return dict(rows)
+
+
+def detach_products(db: Session, product_ids):
+    """
+    Deja en NULL el product_id de los ítems vendidos de productos que se borran
+    (SQLite no aplica el ON DELETE SET NULL si no se activan las foreign keys).
+    No hace commit: va en la misma transacción que el borrado.
+    """
+    if product_ids:
+        db.execute(
+            update(models.SaleItem)
+            .where(models.SaleItem.product_id.in_(list(product_ids)))
+            .values(product_id=None)
+        )
+
+
+def detach_products_in_branches(product_ids):
+    """Lo mismo en las bases de ventas propias de cada sucursal (BRANCH_DATABASE_URL), después del borrado."""
+    for branch_store in branches.databases():
+        if branch_store.engine is database.engine:
+            continue  # la base del catálogo ya se actualizó en la transacción del borrado
+        with branch_store.SessionLocal() as db:
+            detach_products(db, product_ids)
+            db.commit()
+
+
+def create_sale(
+    db: Session,
+    sale: schemas.SaleCreate,
+    branch_id: str = models.DEFAULT_BRANCH,
+    product_ids: dict = None,
+) -> models.Sale:
+    """
+    Guarda una venta con sus ítems en una sola transacción. Si la venta trae una
+    `idempotency_key` que ya existe, devuelve la venta original sin duplicarla.
+    """
+    if sale.idempotency_key:
+        previous = existing_ids(db, [sale.idempotency_key], branch_id)
+        if previous:
+            return db.get(models.Sale, previous[sale.idempotency_key])
+
+    if product_ids is None:
+        product_ids = lookup_product_ids(db, [item.product_name for item in sale.items])
+    db_sale = models.Sale(
+        branch_id=branch_id,
+        created_at=sale_time(sale, datetime.utcnow()),
+        total_amount=sale.total_amount,
+        payment_method=sale.payment_method,
+        idempotency_key=sale.idempotency_key,
+        items=[
+            models.SaleItem(
+                product_id=product_ids.get(item.product_name),
+                product_name=item.product_name,
+                quantity=item.quantity,
+                unit_price=item.unit_price,
+            )
+            for item in sale.items
+        ],
+    )
+    db.add(db_sale)
+    db.flush()  # Asigna el ID sin cerrar la transacción
+
+    # Entrada en el libro encadenado (ver ledger.py), en la misma transacción
+    ledger.append(db, branch_id, [("sale", db_sale.id, ledger.sale_digest(
+        db_sale.id, branch_id, db_sale.created_at, db_sale.total_cents, db_sale.payment_method,
+        [(item.product_name, item.quantity, item.unit_price_cents) for item in db_sale.items],
+    ))])
+
+    # Actualizamos el resumen diario en la misma transacción que la venta
+    rollup.record_sale(db, db_sale.created_at, sale.total_amount, sale.items, branch_id)
+    # Avisa a los demás workers (contadores del día, ver today.py)
+    version = stamps.bump(db, stamps.sales(branch_id))
+
+    try:
+        db.commit()
+    except IntegrityError:
+        # Otra petición guardó la misma clave entre la consulta y el commit
+        db.rollback()
+        previous = existing_ids(db, [sale.idempotency_key], branch_id)
+        if not previous:
+            raise
+        return db.get(models.Sale, previous[sale.idempotency_key])
+
+    db.refresh(db_sale)
+    _notify([sale_event(db_sale.id, db_sale.created_at, sale, branch_id, version)])
+    return db_sale
+
+
+def create_sales(
+    db: Session,
+    sales: List[schemas.SaleCreate],
+    branch_id: str = models.DEFAULT_BRANCH,
+    product_ids: dict = None,
+) -> schemas.SaleBatchResult:
+    """
+    Guarda un lote de ventas con INSERTs masivos y un único commit. Las ventas
+    cuya `idempotency_key` ya existe (o se repite dentro del mismo lote) no se
+    vuelven a insertar; su posición en la respuesta lleva el ID original.
+    """
+    try:
+        return _create_sales(db, sales, branch_id, product_ids)
+    except IntegrityError:
+        # Un reenvío concurrente ganó la carrera: al reintentar, sus claves ya existen
+        db.rollback()
+        return _create_sales(db, sales, branch_id, product_ids)
+
+
+def _create_sales(db: Session, sales: List[schemas.SaleCreate], branch_id: str, product_ids) -> schemas.SaleBatchResult:
+    known = existing_ids(db, [sale.idempotency_key for sale in sales], branch_id)
+
+    now = datetime.utcnow()
+    new_sales = []
+    batch_keys = set()
+    for sale in sales:
+        key = sale.idempotency_key
+        if key and (key in known or key in batch_keys):
+            continue
+        if key:
+            batch_keys.add(key)
+        new_sales.append(sale)
+
+    times = [sale_time(sale, now) for sale in new_sales]
+    new_ids, version = [], None
+    if new_sales:
+        new_ids = db.execute(
+            insert(models.Sale).returning(models.Sale.id, sort_by_parameter_order=True),
+            [
+                {
+                    "branch_id": branch_id,
+                    "created_at": created_at,
+                    "total_cents": models.to_cents(sale.total_amount),
+                    "payment_method": sale.payment_method,
+                    "idempotency_key": sale.idempotency_key,
+                }
+                for sale, created_at in zip(new_sales, times)
+            ],
+        ).scalars().all()
+
+        if product_ids is None:
+            product_ids = lookup_product_ids(db, [item.product_name for sale in new_sales for item in sale.items])
+        item_rows = [
+            {
+                "sale_id": sale_id,
+                "product_id": product_ids.get(item.product_name),
+                "product_name": item.product_name,
+                "quantity": item.quantity,
+                "unit_price_cents": models.to_cents(item.unit_price),
+            }
+            for sale_id, sale in zip(new_ids, new_sales)
+            for item in sale.items
+        ]
+        if item_rows:
+            db.execute(insert(models.SaleItem), item_rows)
+
+        ledger.append(db, branch_id, [
+            ("sale", sale_id, ledger.sale_digest(
+                sale_id, branch_id, created_at, models.to_cents(sale.total_amount), sale.payment_method,
+                [(item.product_name, item.quantity, models.to_cents(item.unit_price)) for item in sale.items],
+            ))
+            for sale_id, sale, created_at in zip(new_ids, new_sales, times)
+        ])
+        rollup.record_sales(db, [(created_at, sale.total_amount, sale.items) for sale, created_at in zip(new_sales, times)], branch_id)
+        version = stamps.bump(db, stamps.sales(branch_id))
+
+    db.commit()
+    _notify([
+        sale_event(sale_id, created_at, sale, branch_id, version)
+        for sale_id, sale, created_at in zip(new_ids, new_sales, times)
+    ])
+
+    # Armamos la respuesta en el orden original
+    fresh = iter(new_ids)
+    ids_by_key = dict(known)
+    ids = []
+    for sale in sales:
+        key = sale.idempotency_key
+        if key and key in ids_by_key:
+            ids.append(ids_by_key[key])
+            continue
+        sale_id = next(fresh)
+        if key:
+            ids_by_key[key] = sale_id
+        ids.append(sale_id)
+
+    return schemas.SaleBatchResult(
+        ids=ids,
+        created=len(new_ids),
+        duplicates=len(sales) - len(new_ids),
+    )
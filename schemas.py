@@ -19,6 +19,27 @@ class Product(ProductBase):
     class Config:
         from_attributes = True
 
+class ProductChange(BaseModel):
+    name: str
+    # campo -> [valor anterior, valor nuevo]
+    changes: dict
+
+class ProductBulkResult(BaseModel):
+    created: List[str]
+    updated: List[ProductChange]
+    unchanged: List[str]
+    deleted: List[str]
+
+# Precio propio de un producto en una sucursal
+class BranchPriceUpdate(BaseModel):
+    price: float
+
+class BranchPrice(BranchPriceUpdate):
+    product_id: int
+    branch_id: str
+    class Config:
+        from_attributes = True
+
 # --- Esquemas de Venta ---
 class SaleItemBase(BaseModel):
     product_name: str
@@ -29,12 +50,31 @@ class SaleCreate(BaseModel):
     total_amount: float
     payment_method: str
     items: List[SaleItemBase]
+    # Opcional: si la caja reenvía una venta con la misma clave, no se duplica
+    idempotency_key: Optional[str] = None
+    # Opcional: hora en que la caja registró la venta (para las que se guardaron
+    # sin conexión y se envían después). Ver sales.sale_time
+    created_at: Optional[datetime] = None
 
 class Sale(SaleCreate):
     id: int
+    branch_id: str
     # --- 2. CORRECCIÓN AQUÍ ---
     # Cambiamos 'str' por 'datetime' para que coincida con el modelo de la base de datos.
     created_at: datetime
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class SaleBatchResult(BaseModel):
+    # IDs de las ventas en el mismo orden en que se enviaron
+    ids: List[int]
+    created: int
+    duplicates: int
+
+# --- Esquemas de Trabajos de Reportes ---
+class ReportJobCreate(BaseModel):
+    # "forecast" (horizon, product), "summary" (start_date, end_date, top)
+    # o "export" (start_date, end_date, format); ver jobs.py
+    kind: str
+    params: dict = {}
@@ -0,0 +1,195 @@
+# settings.py
+"""
+Configuración guardada en la tabla `settings`, con caché en memoria.
+
+Cada configuración es un texto por clave, general (branch_id vacío) o propio
+de una sucursal; al leer con sucursal, si no tiene valor propio vale el
+general. Las claves conocidas se declaran en SPECS con su tipo y, si hace
+falta, una variable de entorno de respaldo: `value()` devuelve el valor ya
+convertido y `put()` rechaza lo que no se pueda convertir. Las demás claves se
+guardan y devuelven como texto.
+
+La caché es de lectura: se llena con lo que se va pidiendo (como máximo
+MAX_CACHED claves, se descartan las menos usadas) y se descarta al guardar.
+Para que varios workers vean los cambios de los otros, cada guardado
+incrementa el sello "settings" (y se lo pone como `version` a su fila); cada
+CACHE_SYNC_INTERVAL segundos la caché lo vuelve a leer y, si cambió, se vacía
+(ver stamps.py).
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import models
+import stamps
+
+MAX_CACHED = 512
+
+
+def _parse_bool(raw: str) -> bool:
+    value = raw.strip().lower()
+    if value in ("1", "true", "si", "sí", "yes", "on"):
+        return True
+    if value in ("0", "false", "no", "off", ""):
+        return False
+    raise ValueError(f"{raw!r} no es un valor booleano")
+
+
+_PARSERS = {str: str, int: int, float: float, bool: _parse_bool, dict: json.loads, list: json.loads}
+
+
+class Spec:
+    """Clave conocida: tipo del valor, valor por defecto y variable de entorno de respaldo."""
+
+    def __init__(self, key: str, type=str, default=None, env=None):
+        self.key = key
+        self.type = type
+        self.default = default
+        self.env = env
+
+    def parse(self, raw: str):
+        value = _PARSERS[self.type](raw)
+        if self.type in (dict, list) and not isinstance(value, self.type):
+            raise ValueError(f"se esperaba un {self.type.__name__} en JSON")
+        return value
+
+
+SPECS = {
+    spec.key: spec
+    for spec in [
+        Spec("mp_access_token", str, env="MP_ACCESS_TOKEN"),
+    ]
+}
+
+
+class SettingsCache:
+    def __init__(self, interval: float = stamps.SYNC_INTERVAL, max_entries: int = MAX_CACHED):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (key, branch_id) -> texto, o None si no hay fila
+        self._watcher = stamps.Watcher(stamps.SETTINGS, self._clear, interval)
+
+    # --- Caché ---
+
+    def _clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _store(self, key, branch_id, raw):
+        # Llamar con el lock tomado
+        self._entries[(key, branch_id)] = raw
+        self._entries.move_to_end((key, branch_id))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _resolve(self, key, branch_id):
+        """(texto, branch_id de donde salió), o None si falta en la caché. Llamar con el lock tomado."""
+        candidates = [branch_id, models.GLOBAL_SETTING] if branch_id != models.GLOBAL_SETTING else [branch_id]
+        for candidate in candidates:
+            if (key, candidate) not in self._entries:
+                return None
+            raw = self._entries[(key, candidate)]
+            self._entries.move_to_end((key, candidate))
+            if raw is not None:
+                return raw, candidate
+        return None, models.GLOBAL_SETTING
+
+    def peek(self, keys, branch_id: str = models.GLOBAL_SETTING):
+        """{clave: (texto, origen)} si todas están en la caché y vigentes; si no, None (sin tocar la base)."""
+        if not self._watcher.fresh():
+            return None
+        with self._lock:
+            found = {}
+            for key in keys:
+                resolved = self._resolve(key, branch_id)
+                if resolved is None:
+                    return None
+                found[key] = resolved
+            return found
+
+    def get_many(self, db: Session, keys, branch_id: str = models.GLOBAL_SETTING) -> dict:
+        """{clave: (texto, origen)} leyendo de la base solo lo que falta en la caché."""
+        keys = list(dict.fromkeys(keys))
+        self._watcher.check(db)
+        found = self.peek(keys, branch_id)
+        if found is not None:
+            return found
+
+        branch_ids = {branch_id, models.GLOBAL_SETTING}
+        rows = db.execute(
+            select(models.Setting.key, models.Setting.branch_id, models.Setting.value)
+            .where(models.Setting.key.in_(keys), models.Setting.branch_id.in_(branch_ids))
+        ).all()
+        loaded = {(row.key, row.branch_id): row.value for row in rows}
+        with self._lock:
+            # También se guardan las ausencias, así una clave sin valor no va a la base cada vez
+            for key in keys:
+                for candidate in branch_ids:
+                    self._store(key, candidate, loaded.get((key, candidate)))
+            return {key: self._resolve(key, branch_id) for key in keys}
+
+    def get_all(self, db: Session, branch_id: str = models.GLOBAL_SETTING) -> dict:
+        """Todas las claves guardadas que valen para la sucursal."""
+        keys = db.scalars(
+            select(models.Setting.key)
+            .where(models.Setting.branch_id.in_({branch_id, models.GLOBAL_SETTING}))
+            .distinct()
+        ).all()
+        return self.get_many(db, keys, branch_id)
+
+    def invalidate(self, version=None):
+        """Vacía la caché de este proceso. `version` es el sello que dejó el guardado, si se conoce."""
+        self._clear()
+        if version is not None:
+            self._watcher.seen(version)
+
+    # --- Escritura ---
+
+    def put(self, db: Session, key: str, raw: str, branch_id: str = models.GLOBAL_SETTING) -> models.Setting:
+        spec = SPECS.get(key)
+        if spec is not None and raw is not None:
+            spec.parse(raw)  # ValueError si no corresponde al tipo
+        version = stamps.bump(db, stamps.SETTINGS)
+        setting = db.get(models.Setting, (key, branch_id))
+        if setting is None:
+            setting = models.Setting(key=key, branch_id=branch_id)
+            db.add(setting)
+        setting.value = raw
+        setting.version = version
+        db.commit()
+        self.invalidate(version)
+        return setting
+
+
+cache = SettingsCache()
+
+
+# --- Acceso tipado ---
+
+def _typed(key, raw):
+    spec = SPECS.get(key)
+    if spec is None:
+        return raw
+    if raw is None:
+        raw = os.getenv(spec.env) if spec.env else None
+        if raw is None:
+            return spec.default
+    return spec.parse(raw)
+
+
+def value(db: Session, key: str, branch_id: str = models.GLOBAL_SETTING):
+    """Valor ya convertido al tipo de su Spec (o el de respaldo si no está guardado)."""
+    raw, _ = cache.get_many(db, [key], branch_id)[key]
+    return _typed(key, raw)
+
+
+def cached_value(key: str, branch_id: str = models.GLOBAL_SETTING):
+    """El valor si está vigente en la caché, sin tocar la base; si no, None."""
+    found = cache.peek([key], branch_id)
+    if found is None:
+        return None
+    return _typed(key, found[key][0])
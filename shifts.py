@@ -0,0 +1,262 @@
+# shifts.py
+"""
+Cierres de caja (tablas shifts, shift_payment_totals y shift_product_totals).
+
+Un turno son las ventas de una sucursal registradas en el libro (ledger.py)
+entre el cierre anterior y el actual. Cerrar (`close`) toma la cabeza del
+libro con lock, suma una sola vez esas ventas y guarda una foto inmutable:
+totales por medio de pago y por producto, primera y última venta, cantidad de
+tickets y el hash de la cadena en ese momento. El propio cierre queda como
+una entrada más del libro con el hash de la foto, así que cambiar un cierre ya
+guardado se detecta igual que cambiar una venta.
+
+Los reportes por turno (`report`) no vuelven a recorrer las ventas de los
+turnos cerrados: suman sus fotos y solo calculan en el momento el turno
+abierto (las ventas posteriores al último cierre).
+"""
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+import ledger
+import models
+
+
+# --- Ventas de un tramo del libro ---
+
+def _entries(branch_id, after_seq, upto_seq=None):
+    """Subconsulta con los IDs de las ventas registradas en el libro en (after_seq, upto_seq]."""
+    query = select(models.LedgerEntry.ref_id).where(
+        models.LedgerEntry.branch_id == branch_id,
+        models.LedgerEntry.kind == "sale",
+        models.LedgerEntry.seq > after_seq,
+    )
+    if upto_seq is not None:
+        query = query.where(models.LedgerEntry.seq <= upto_seq)
+    return query
+
+
+def aggregate(db, branch_id: str, after_seq: int, upto_seq: int = None) -> dict:
+    """Totales de las ventas del libro en (after_seq, upto_seq] (hasta el final si upto_seq es None)."""
+    sale_ids = _entries(branch_id, after_seq, upto_seq)
+    first_id, last_id, count, total, first_at = db.execute(
+        select(
+            func.min(models.Sale.id), func.max(models.Sale.id), func.count(models.Sale.id),
+            func.coalesce(func.sum(models.Sale.total_cents), 0), func.min(models.Sale.created_at),
+        ).where(models.Sale.id.in_(sale_ids))
+    ).one()
+    payments = db.execute(
+        select(models.Sale.payment_method, func.sum(models.Sale.total_cents), func.count(models.Sale.id))
+        .where(models.Sale.id.in_(sale_ids))
+        .group_by(models.Sale.payment_method)
+    ).all()
+    products = db.execute(
+        select(
+            models.SaleItem.product_name,
+            func.sum(models.SaleItem.quantity),
+            func.sum(models.SaleItem.quantity * models.SaleItem.unit_price_cents),
+        )
+        .where(models.SaleItem.sale_id.in_(sale_ids))
+        .group_by(models.SaleItem.product_name)
+    ).all()
+    return {
+        "first_sale_id": first_id,
+        "last_sale_id": last_id,
+        "sale_count": count,
+        "total_cents": total,
+        "first_sale_at": first_at,
+        "payments": {method: (revenue, tickets) for method, revenue, tickets in payments},
+        "products": {name: (quantity, revenue) for name, quantity, revenue in products},
+    }
+
+
+def _last_shift(db, branch_id):
+    return db.scalars(
+        select(models.Shift)
+        .where(models.Shift.branch_id == branch_id)
+        .order_by(models.Shift.ledger_seq.desc())
+        .limit(1)
+    ).first()
+
+
+# --- Foto del cierre ---
+
+def snapshot_digest(shift: models.Shift, payments, products) -> str:
+    """Hash de un cierre con sus totales (filas ShiftPaymentTotal y ShiftProductTotal)."""
+    return ledger.content_hash([
+        "close", shift.id, shift.branch_id, shift.opened_at.isoformat(), shift.closed_at.isoformat(),
+        shift.ledger_seq, shift.ledger_hash, shift.first_sale_id, shift.last_sale_id,
+        shift.sale_count, shift.total_cents,
+        sorted([p.payment_method, p.revenue_cents, p.ticket_count] for p in payments),
+        sorted([p.product_name, p.quantity, p.revenue_cents] for p in products),
+    ])
+
+
+def close(db, branch_id: str) -> models.Shift:
+    """Cierra el turno abierto de la sucursal (aunque no tenga ventas) y hace commit."""
+    head = ledger.lock_head(db, branch_id)
+    previous = _last_shift(db, branch_id)
+    after_seq = previous.ledger_seq if previous else 0
+    totals = aggregate(db, branch_id, after_seq, head.seq)
+    now = datetime.utcnow()
+
+    shift = models.Shift(
+        branch_id=branch_id,
+        opened_at=previous.closed_at if previous else (totals["first_sale_at"] or now),
+        closed_at=now,
+        ledger_seq=head.seq + 1,  # la entrada del cierre va justo después de la última venta
+        ledger_hash=head.hash,
+        first_sale_id=totals["first_sale_id"],
+        last_sale_id=totals["last_sale_id"],
+        sale_count=totals["sale_count"],
+        total_cents=totals["total_cents"],
+        snapshot_hash="",
+    )
+    db.add(shift)
+    db.flush()
+    payments = [
+        models.ShiftPaymentTotal(shift_id=shift.id, payment_method=method, revenue_cents=revenue, ticket_count=tickets)
+        for method, (revenue, tickets) in totals["payments"].items()
+    ]
+    products = [
+        models.ShiftProductTotal(shift_id=shift.id, product_name=name, quantity=quantity, revenue_cents=revenue)
+        for name, (quantity, revenue) in totals["products"].items()
+    ]
+    db.add_all(payments + products)
+    shift.snapshot_hash = snapshot_digest(shift, payments, products)
+    ledger.append(db, branch_id, [("close", shift.id, shift.snapshot_hash)], head)
+    db.commit()
+    return shift
+
+
+# --- Lectura ---
+
+def load(db, branch_id: str, shift_ids):
+    """[(shift, pagos, productos)] de los cierres pedidos que existan, en orden de cierre."""
+    shift_list = db.scalars(
+        select(models.Shift)
+        .where(models.Shift.branch_id == branch_id, models.Shift.id.in_(shift_ids))
+        .order_by(models.Shift.ledger_seq)
+    ).all()
+    ids = [shift.id for shift in shift_list]
+    payments, products = defaultdict(list), defaultdict(list)
+    for row in db.scalars(select(models.ShiftPaymentTotal).where(models.ShiftPaymentTotal.shift_id.in_(ids))):
+        payments[row.shift_id].append(row)
+    for row in db.scalars(select(models.ShiftProductTotal).where(models.ShiftProductTotal.shift_id.in_(ids))):
+        products[row.shift_id].append(row)
+    return [(shift, payments[shift.id], products[shift.id]) for shift in shift_list]
+
+
+def _money(cents):
+    return round(cents / 100, 2)
+
+
+def _breakdown(payments: dict, products: dict) -> dict:
+    """Pagos y productos ({clave: (a, b)}) como listas para la respuesta, de mayor a menor."""
+    return {
+        "payments": [
+            {"payment_method": method, "revenue": _money(revenue), "tickets": tickets}
+            for method, (revenue, tickets) in sorted(payments.items(), key=lambda item: -item[1][0])
+        ],
+        "products": [
+            {"product_name": name, "quantity": quantity, "revenue": _money(revenue)}
+            for name, (quantity, revenue) in sorted(products.items(), key=lambda item: (-item[1][0], item[0]))
+        ],
+    }
+
+
+def shift_dict(shift: models.Shift, payments=None, products=None) -> dict:
+    result = {
+        "id": shift.id,
+        "branch_id": shift.branch_id,
+        "opened_at": shift.opened_at.isoformat(),
+        "closed_at": shift.closed_at.isoformat(),
+        "first_sale_id": shift.first_sale_id,
+        "last_sale_id": shift.last_sale_id,
+        "sale_count": shift.sale_count,
+        "total": _money(shift.total_cents),
+        "ledger_seq": shift.ledger_seq,
+        "snapshot_hash": shift.snapshot_hash,
+    }
+    if payments is not None:
+        result.update(_breakdown(
+            {p.payment_method: (p.revenue_cents, p.ticket_count) for p in payments},
+            {p.product_name: (p.quantity, p.revenue_cents) for p in products},
+        ))
+    return result
+
+
+def get(db, branch_id: str, shift_id: int):
+    found = load(db, branch_id, [shift_id])
+    return shift_dict(*found[0]) if found else None
+
+
+def recent(db, branch_id: str, limit: int = 20, before_id: int = None) -> list:
+    query = select(models.Shift).where(models.Shift.branch_id == branch_id)
+    if before_id is not None:
+        query = query.where(models.Shift.id < before_id)
+    return [shift_dict(shift) for shift in db.scalars(query.order_by(models.Shift.id.desc()).limit(limit))]
+
+
+def current(db, branch_id: str) -> dict:
+    """El turno abierto: lo que se guardaría si se cerrara ahora."""
+    previous = _last_shift(db, branch_id)
+    totals = aggregate(db, branch_id, previous.ledger_seq if previous else 0)
+    opened_at = previous.closed_at if previous else totals["first_sale_at"]
+    return {
+        "branch_id": branch_id,
+        "opened_at": opened_at.isoformat() if opened_at else None,
+        "first_sale_id": totals["first_sale_id"],
+        "last_sale_id": totals["last_sale_id"],
+        "sale_count": totals["sale_count"],
+        "total": _money(totals["total_cents"]),
+        **_breakdown(totals["payments"], totals["products"]),
+    }
+
+
+def report(db, branch_id: str, start, end) -> dict:
+    """
+    Totales de los turnos cerrados en [start, end) (UTC sin zona) sumando sus
+    fotos, más el turno abierto si el rango llega hasta ahora.
+    """
+    closed = db.scalars(
+        select(models.Shift.id)
+        .where(models.Shift.branch_id == branch_id, models.Shift.closed_at >= start, models.Shift.closed_at < end)
+    ).all()
+    payments, products = defaultdict(lambda: [0, 0]), defaultdict(lambda: [0, 0])
+    shift_list = []
+    sale_count = total_cents = 0
+    for shift, shift_payments, shift_products in load(db, branch_id, closed):
+        shift_list.append(shift_dict(shift))
+        sale_count += shift.sale_count
+        total_cents += shift.total_cents
+        for row in shift_payments:
+            payments[row.payment_method][0] += row.revenue_cents
+            payments[row.payment_method][1] += row.ticket_count
+        for row in shift_products:
+            products[row.product_name][0] += row.quantity
+            products[row.product_name][1] += row.revenue_cents
+
+    open_shift = None
+    if end > datetime.utcnow():
+        previous = _last_shift(db, branch_id)
+        totals = aggregate(db, branch_id, previous.ledger_seq if previous else 0)
+        open_shift = {"sale_count": totals["sale_count"], "total": _money(totals["total_cents"])}
+        sale_count += totals["sale_count"]
+        total_cents += totals["total_cents"]
+        for method, (revenue, tickets) in totals["payments"].items():
+            payments[method][0] += revenue
+            payments[method][1] += tickets
+        for name, (quantity, revenue) in totals["products"].items():
+            products[name][0] += quantity
+            products[name][1] += revenue
+
+    return {
+        "branch_id": branch_id,
+        "shifts": shift_list,
+        "open_shift": open_shift,
+        "sale_count": sale_count,
+        "total": _money(total_cents),
+        **_breakdown(payments, products),
+    }
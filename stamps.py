@@ -0,0 +1,98 @@
+# stamps.py
+"""
+Coherencia de las cachés en memoria entre varios workers (tabla cache_stamps).
+
+El catálogo (catalog.py) y la configuración (settings.py) se cachean en cada
+proceso. Con un solo worker alcanza con descartar la caché al guardar, pero
+con varios (ver gunicorn.conf.py) los demás tienen que enterarse. El canal es
+la propia base: cada escritura incrementa el sello de lo que modificó (`bump`)
+en la misma transacción, y cada caché, como mucho una vez cada
+CACHE_SYNC_INTERVAL segundos (por defecto 1), lee su sello (una consulta por
+clave primaria) y se descarta si cambió desde la última vez (`Watcher.check`).
+
+El worker que guarda ve el cambio al instante; los demás, a lo sumo
+CACHE_SYNC_INTERVAL segundos después.
+
+Las ventas usan un sello por sucursal (`sales(branch_id)`, en la base de
+ventas de la sucursal) para los contadores del día de today.py.
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+import database
+import models
+
+CATALOG = "catalog"
+SETTINGS = "settings"
+SYNC_INTERVAL = float(os.getenv("CACHE_SYNC_INTERVAL", "1"))
+
+
+def sales(branch_id: str) -> str:
+    return f"sales:{branch_id}"
+
+
+def read(db: Session, name: str) -> int:
+    return db.scalar(select(models.CacheStamp.version).where(models.CacheStamp.name == name)) or 0
+
+
+def bump(db: Session, name: str) -> int:
+    """Incrementa el sello dentro de la transacción de `db` (sin commit) y devuelve el valor nuevo."""
+    increment = (
+        update(models.CacheStamp)
+        .where(models.CacheStamp.name == name)
+        .values(version=models.CacheStamp.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if db.execute(increment).rowcount == 0:
+        # Las filas de CACHE_STAMPS se crean con la tabla (models.py); los sellos de
+        # ventas nacen con la primera venta de la sucursal, quizás en dos workers a la vez
+        database.insert_or_ignore(db, models.CacheStamp.__table__, {"name": name, "version": 0})
+        db.execute(increment)
+    # El UPDATE ya tomó el lock de escritura: nadie más puede moverlo hasta el commit
+    return read(db, name)
+
+
+class Watcher:
+    """Sigue un sello y llama a `on_change` cuando otro proceso lo movió."""
+
+    def __init__(self, name: str, on_change, interval: float = SYNC_INTERVAL):
+        self.name = name
+        self.on_change = on_change
+        self.interval = interval
+        self._lock = threading.Lock()
+        self.version = None  # último valor visto
+        self._checked_at = 0.0
+
+    def fresh(self) -> bool:
+        """True si el sello se leyó hace menos de `interval` (la caché se puede usar sin ir a la base)."""
+        return self.version is not None and time.monotonic() - self._checked_at < self.interval
+
+    def check(self, db: Session):
+        if self.fresh():
+            return
+        if self.seen(read(db, self.name)):
+            self.on_change()
+
+    def advance(self, version: int) -> bool:
+        """
+        Un cambio hecho por este proceso: si es el siguiente al último visto, lo
+        da por visto y devuelve True. Si no (otro proceso cambió algo en el
+        medio), no lo registra y el próximo `check` lo detecta.
+        """
+        with self._lock:
+            if self.version is not None and version == self.version + 1:
+                self.version = version
+                return True
+        return False
+
+    def seen(self, version: int) -> bool:
+        """Registra el valor del sello. Devuelve True si cambió (la primera lectura no cuenta)."""
+        with self._lock:
+            changed = self.version is not None and version != self.version
+            self.version = version
+            self._checked_at = time.monotonic()
+        return changed
@@ -0,0 +1,53 @@
+# tests/conftest.py
+"""
+Configuración común de las pruebas (python -m pytest desde la raíz del repo).
+
+Los módulos leen su configuración del entorno al importarse, así que se fija
+antes de importar nada: una base principal descartable, dos sucursales y una
+zona horaria que no es UTC (para que los días locales y los UTC no coincidan).
+Cada prueba usa su propia base de ventas (fixture `db`) creada con las migraciones.
+"""
+import os
+import sys
+import tempfile
+
+_TMP = tempfile.mkdtemp(prefix="cafe_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP}/cafe_system.db"
+os.environ["CAFE_BRANCHES"] = "central,norte"
+os.environ["CAFE_TZ"] = "America/Argentina/Buenos_Aires"
+os.environ.pop("BRANCH_DATABASE_URL", None)
+os.environ["REPORT_JOBS_DIR"] = f"{_TMP}/report_jobs"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import database  # noqa: E402
+import migrations  # noqa: E402
+import schemas  # noqa: E402
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = database.make_engine(f"sqlite:///{tmp_path / 'ventas.db'}")
+    migrations.run(engine, verbose=False)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+
+
+def make_sale(key=None, total=2.5, items=(("Café", 1, 2.5),), created_at=None):
+    return schemas.SaleCreate(
+        total_amount=total,
+        payment_method="efectivo",
+        items=[{"product_name": name, "quantity": quantity, "unit_price": price} for name, quantity, price in items],
+        idempotency_key=key,
+        created_at=created_at,
+    )
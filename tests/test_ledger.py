@@ -0,0 +1,57 @@
+# tests/test_ledger.py
+"""Libro de ventas encadenado (ledger.py): verificación incremental y detección de cambios."""
+from sqlalchemy import text
+
+import ledger
+import models
+import sales
+from conftest import make_sale
+
+
+def test_sales_chain_and_verify(db):
+    sales.create_sale(db, make_sale("a"), "central")
+    sales.create_sales(db, [make_sale("b"), make_sale("c")], "central")
+    sales.create_sales(db, [make_sale("a")], "norte")
+
+    central = ledger.verify(db, "central")
+    assert central["ok"] and central["checked"] == 3 and central["to_seq"] == 3
+    norte = ledger.verify(db, "norte")
+    assert norte["ok"] and norte["checked"] == 1
+
+    # Un reenvío no agrega entradas; la próxima verificación solo mira lo nuevo
+    sales.create_sales(db, [make_sale("a"), make_sale("d")], "central")
+    again = ledger.verify(db, "central")
+    assert again["ok"] and again["from_seq"] == 3 and again["checked"] == 1
+
+
+def test_verify_detects_an_edited_sale(db):
+    result = sales.create_sales(db, [make_sale("a"), make_sale("b")], "central")
+    assert ledger.verify(db, "central")["ok"]
+
+    db.execute(text("UPDATE sales SET total_cents = total_cents + 1 WHERE id = :id"), {"id": result.ids[1]})
+    db.commit()
+
+    # Ya estaba verificada: solo la revisión completa vuelve a mirarla
+    assert ledger.verify(db, "central")["ok"]
+    full = ledger.verify(db, "central", full=True)
+    assert not full["ok"]
+    assert [problem["seq"] for problem in full["problems"]] == [2]
+
+
+def test_verify_detects_a_removed_entry(db):
+    sales.create_sales(db, [make_sale("a"), make_sale("b"), make_sale("c")], "central")
+    db.execute(text("DELETE FROM ledger_entries WHERE branch_id = 'central' AND seq = 2"))
+    db.commit()
+
+    result = ledger.verify(db, "central")
+    assert not result["ok"]
+    assert result["problems"]
+
+
+def test_first_head_of_a_branch_is_created_once(db):
+    head = ledger.lock_head(db, "norte")
+    assert (head.seq, head.hash) == (0, ledger.GENESIS)
+    db.commit()
+    assert ledger.lock_head(db, "norte") is head
+    db.commit()
+    assert db.query(models.LedgerHead).filter_by(branch_id="norte").count() == 1
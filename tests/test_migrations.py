@@ -0,0 +1,94 @@
+# tests/test_migrations.py
+"""migrations.run sobre una base con el esquema original (antes de la primera migración)."""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import database
+import migrations
+import models
+import rollup
+
+# Lo que creaba create_all con el models.py original
+BASELINE_SCHEMA = [
+    "CREATE TABLE products (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, description VARCHAR,"
+    " price FLOAT NOT NULL, category VARCHAR(19) NOT NULL)",
+    "CREATE INDEX ix_products_name ON products (name)",
+    "CREATE TABLE settings (key VARCHAR PRIMARY KEY, value VARCHAR)",
+    "CREATE TABLE sales (id INTEGER PRIMARY KEY, created_at DATETIME, total_amount FLOAT NOT NULL,"
+    " payment_method VARCHAR NOT NULL)",
+    "CREATE TABLE sale_items (id INTEGER PRIMARY KEY, sale_id INTEGER REFERENCES sales (id),"
+    " product_name VARCHAR NOT NULL, quantity INTEGER NOT NULL, unit_price FLOAT NOT NULL)",
+]
+
+
+@pytest.fixture
+def baseline_engine(tmp_path):
+    engine = database.make_engine(f"sqlite:///{tmp_path / 'vieja.db'}")
+    with engine.begin() as conn:
+        for statement in BASELINE_SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text(
+            "INSERT INTO products (id, name, description, price, category) VALUES"
+            " (1, 'Latte', '', 3300.5, 'CAFES'), (2, 'Medialuna', '', 900.1, 'PATISSERIE')"
+        ))
+        conn.execute(text("INSERT INTO settings (key, value) VALUES ('mp_access_token', 'TEST-123')"))
+        conn.execute(text(
+            "INSERT INTO sales (id, created_at, total_amount, payment_method)"
+            " VALUES (1, '2026-10-18 01:30:00.000000', 4200.6, 'efectivo')"
+        ))
+        conn.execute(text(
+            "INSERT INTO sale_items (sale_id, product_name, quantity, unit_price) VALUES"
+            " (1, 'Latte', 1, 3300.5), (1, 'Medialuna', 1, 900.1)"
+        ))
+    yield engine
+    engine.dispose()
+
+
+def test_baseline_database_reaches_the_current_schema(baseline_engine):
+    applied = migrations.run(baseline_engine, verbose=False)
+
+    assert applied == [version for version, _, _ in migrations.MIGRATIONS]
+    assert migrations.run(baseline_engine, verbose=False) == []
+
+    inspector = inspect(baseline_engine)
+    for table in models.Base.metadata.sorted_tables:
+        assert {column["name"] for column in inspector.get_columns(table.name)} >= set(table.columns.keys())
+    assert "price" not in {column["name"] for column in inspector.get_columns("products")}
+
+    with baseline_engine.connect() as conn:
+        assert conn.execute(text("SELECT id, price_cents FROM products ORDER BY id")).all() == [(1, 330050), (2, 90010)]
+        assert conn.execute(text("SELECT total_cents, branch_id FROM sales")).one() == (420060, models.DEFAULT_BRANCH)
+        assert conn.execute(text(
+            "SELECT product_name, product_id, unit_price_cents FROM sale_items ORDER BY id"
+        )).all() == [("Latte", 1, 330050), ("Medialuna", 2, 90010)]
+        assert conn.execute(text("SELECT key, branch_id, value FROM settings")).all() == [
+            ("mp_access_token", models.GLOBAL_SETTING, "TEST-123"),
+        ]
+
+
+def test_idempotency_key_is_unique_per_branch_after_migrating(baseline_engine):
+    migrations.run(baseline_engine, verbose=False)
+    insert = text(
+        "INSERT INTO sales (created_at, total_cents, payment_method, idempotency_key, branch_id)"
+        " VALUES (:t, 100, 'efectivo', 'k', :branch)"
+    )
+    with baseline_engine.begin() as conn:
+        conn.execute(insert, {"t": datetime(2026, 10, 18), "branch": "central"})
+        conn.execute(insert, {"t": datetime(2026, 10, 18), "branch": "norte"})
+    with pytest.raises(IntegrityError):
+        with baseline_engine.begin() as conn:
+            conn.execute(insert, {"t": datetime(2026, 10, 18), "branch": "central"})
+
+
+def test_rollup_is_rebuilt_by_local_day_after_migrating(baseline_engine):
+    migrations.run(baseline_engine, verbose=False)
+    with Session(baseline_engine) as db:
+        assert rollup.is_empty(db)
+        rollup.rebuild(db)
+        rows = [(row.day.isoformat(), row.revenue_cents, row.ticket_count) for row in db.query(models.DailySalesTotal)]
+    # 01:30 UTC del 18 es todavía el 17 en Buenos Aires
+    assert rows == [("2026-10-17", 420060, 1)]
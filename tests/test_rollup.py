@@ -0,0 +1,94 @@
+# tests/test_rollup.py
+"""Resumen diario por día local (rollup.py y today.py), incluidos los cambios de horario."""
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+
+import pytest
+
+import models
+import rollup
+import today
+
+
+def _add_sales(db, times, branch_id="central"):
+    """Guarda ventas con esas horas (UTC) y las suma al rollup como lo hace sales.py."""
+    item = SimpleNamespace(product_name="Café", quantity=2, unit_price=1.5)
+    for created_at in times:
+        db.add(models.Sale(
+            branch_id=branch_id, created_at=created_at, total_amount=3.0, payment_method="efectivo",
+            items=[models.SaleItem(product_name="Café", quantity=2, unit_price=1.5)],
+        ))
+    rollup.record_sales(db, [(created_at, 3.0, [item]) for created_at in times], branch_id)
+    db.commit()
+
+
+def _days(db):
+    return {
+        (row.branch_id, row.day): (row.ticket_count, row.revenue_cents)
+        for row in db.query(models.DailySalesTotal)
+    }
+
+
+def _product_days(db):
+    return {
+        (row.branch_id, row.day, row.product_name): (row.quantity, row.revenue_cents, row.ticket_count)
+        for row in db.query(models.DailyProductSale)
+    }
+
+
+def test_evening_sales_fall_on_their_local_day(db):
+    # 22:30 en Buenos Aires (UTC-3) es la 01:30 UTC del día siguiente
+    _add_sales(db, [datetime(2026, 10, 18, 1, 30), datetime(2026, 10, 18, 3, 0)])
+
+    assert _days(db) == {
+        ("central", date(2026, 10, 17)): (1, 300),
+        ("central", date(2026, 10, 18)): (1, 300),
+    }
+
+
+@pytest.mark.parametrize("day, hours", [
+    (date(2026, 3, 29), 23),   # Europa/Madrid adelanta la hora
+    (date(2026, 10, 25), 25),  # y la atrasa
+])
+def test_utc_bounds_follow_daylight_saving(monkeypatch, day, hours):
+    monkeypatch.setattr(today, "TIMEZONE", ZoneInfo("Europe/Madrid"))
+    start, end = today.utc_bounds(day)
+    assert end - start == timedelta(hours=hours)
+    assert today.utc_range(day, day + timedelta(days=1)) == (start, today.utc_bounds(day + timedelta(days=1))[1])
+
+
+def test_rebuild_matches_incremental_rollup_across_dst(db, monkeypatch):
+    monkeypatch.setattr(today, "TIMEZONE", ZoneInfo("Europe/Madrid"))
+    # Alrededor del 25/10/2026 (día de 25 horas): medianoche local es 22:00 UTC
+    # antes del cambio y 23:00 UTC después
+    times = [
+        datetime(2026, 10, 24, 21, 59),  # 23:59 del 24 (UTC+2)
+        datetime(2026, 10, 24, 22, 0),   # 00:00 del 25
+        datetime(2026, 10, 25, 22, 30),  # 23:30 del 25 (UTC+1)
+        datetime(2026, 10, 25, 23, 0),   # 00:00 del 26
+    ]
+    _add_sales(db, times)
+    _add_sales(db, [datetime(2026, 10, 25, 12, 0)], branch_id="norte")
+    incremental, incremental_products = _days(db), _product_days(db)
+
+    assert incremental == {
+        ("central", date(2026, 10, 24)): (1, 300),
+        ("central", date(2026, 10, 25)): (2, 600),
+        ("central", date(2026, 10, 26)): (1, 300),
+        ("norte", date(2026, 10, 25)): (1, 300),
+    }
+
+    assert rollup.rebuild(db) == (4, 4)
+    assert _days(db) == incremental
+    assert _product_days(db) == incremental_products
+
+
+def test_summary_queries_read_local_days(db):
+    _add_sales(db, [datetime(2026, 10, 18, 1, 30)])
+    totals, ranking = rollup.summary_queries(date(2026, 10, 17), date(2026, 10, 17), top=5, branch_id="central")
+
+    assert tuple(db.execute(totals).one()) == (300, 1)
+    assert [tuple(row) for row in db.execute(ranking)] == [("Café", 2)]
+    totals, _ = rollup.summary_queries(date(2026, 10, 18), date(2026, 10, 18), branch_id="central")
+    assert tuple(db.execute(totals).one()) == (0, 0)
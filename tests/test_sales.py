@@ -0,0 +1,66 @@
+# tests/test_sales.py
+"""Alta de ventas: idempotencia de los lotes y de las ventas sueltas (sales.py)."""
+from datetime import datetime, timedelta, timezone
+
+import models
+import sales
+from conftest import make_sale
+
+
+def _count(db):
+    return db.query(models.Sale).count()
+
+
+def test_batch_dedupes_repeated_keys_within_the_batch(db):
+    result = sales.create_sales(db, [make_sale("a"), make_sale("a"), make_sale("b"), make_sale()], "central")
+
+    assert result.created == 3
+    assert result.duplicates == 1
+    assert result.ids[0] == result.ids[1]
+    assert len(set(result.ids)) == 3
+    assert _count(db) == 3
+
+
+def test_resending_a_batch_returns_the_original_ids(db):
+    first = sales.create_sales(db, [make_sale("a"), make_sale("b")], "central")
+    again = sales.create_sales(db, [make_sale("b"), make_sale("a"), make_sale("c")], "central")
+
+    assert again.ids[:2] == [first.ids[1], first.ids[0]]
+    assert again.created == 1
+    assert again.duplicates == 2
+    assert _count(db) == 3
+
+
+def test_single_sale_with_a_known_key_is_not_duplicated(db):
+    batch = sales.create_sales(db, [make_sale("a")], "central")
+    sale = sales.create_sale(db, make_sale("a"), "central")
+
+    assert sale.id == batch.ids[0]
+    assert _count(db) == 1
+
+
+def test_idempotency_keys_are_scoped_by_branch(db):
+    central = sales.create_sales(db, [make_sale("a")], "central")
+    norte = sales.create_sales(db, [make_sale("a")], "norte")
+    norte_single = sales.create_sale(db, make_sale("a"), "norte")
+
+    assert norte.created == 1
+    assert norte.ids != central.ids
+    assert norte_single.id == norte.ids[0]
+    assert sales.existing_ids(db, ["a"], "central") == {"a": central.ids[0]}
+
+
+def test_batch_keeps_each_sale_time_within_the_backdate_window(db):
+    # Con zona explícita; sin zona se toma como hora local (ver today.to_utc)
+    sent = datetime.now(timezone.utc)
+    now = sent.replace(tzinfo=None)
+    result = sales.create_sales(db, [
+        make_sale("old", created_at=sent - timedelta(hours=5)),
+        make_sale("future", created_at=sent + timedelta(days=1)),
+        make_sale("ancient", created_at=sent - sales.MAX_BACKDATE - timedelta(days=30)),
+    ], "central")
+
+    stored = {sale.idempotency_key: sale.created_at for sale in db.query(models.Sale).filter(models.Sale.id.in_(result.ids))}
+    assert abs(stored["old"] - (now - timedelta(hours=5))) < timedelta(seconds=1)
+    assert stored["future"] <= datetime.utcnow()
+    assert stored["ancient"] >= now - sales.MAX_BACKDATE - timedelta(seconds=1)
@@ -0,0 +1,252 @@
+# timeseries.py
+"""
+Series de ventas por hora, día o semana (GET /reports/timeseries).
+
+Con una sola consulta por base de ventas se traen los ítems del rango (y del
+período anterior, si se pide comparar) como columnas compactas: segundos
+desde 1970, venta, total de la venta, producto, cantidad y precio unitario.
+Todo lo demás se calcula con NumPy sobre esos arreglos, sin recorrer filas en
+Python: cada agregado es un `np.bincount` por índice de bucket y la serie de
+los productos más vendidos un `np.add.at` sobre una matriz producto × bucket.
+
+En la misma respuesta van la serie pedida (hour, day o week), el perfil por
+hora del día y por día de la semana, el ranking de productos con su serie y,
+con `compare`, los mismos números del período anterior de igual duración.
+Los buckets están en hora local (CAFE_TZ, ver today.py).
+"""
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+from sqlalchemy import BigInteger, Integer, cast, func, select
+
+import branches
+import models
+import today
+
+BUCKETS = ("hour", "day", "week")
+MAX_DAYS = 400
+EPOCH = date(1970, 1, 1)
+WEEKDAYS = ["lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo"]
+
+
+# --- Lectura ---
+
+def _epoch_seconds(dialect: str):
+    """Sale.created_at (UTC sin zona) como segundos desde 1970, calculado en la base."""
+    if dialect == "sqlite":
+        return cast(func.strftime("%s", models.Sale.created_at), Integer)
+    if dialect == "postgresql":
+        return cast(func.extract("epoch", models.Sale.created_at), BigInteger)
+    return None
+
+
+def load(db, start: datetime, end: datetime, branch_id: str) -> dict:
+    """Columnas de los ítems vendidos en [start, end) de una sucursal."""
+    epoch = _epoch_seconds(db.get_bind().dialect.name)
+    rows = db.execute(
+        select(
+            epoch if epoch is not None else models.Sale.created_at,
+            models.Sale.id,
+            models.Sale.total_cents,
+            models.SaleItem.product_name,
+            func.coalesce(models.SaleItem.quantity, 0),
+            func.coalesce(models.SaleItem.unit_price_cents, 0),
+        )
+        # outer join: una venta sin ítems igual cuenta como ticket
+        .outerjoin(models.SaleItem, models.SaleItem.sale_id == models.Sale.id)
+        .where(
+            models.Sale.branch_id == branch_id,
+            models.Sale.created_at >= start,
+            models.Sale.created_at < end,
+        )
+        .order_by(models.Sale.id)
+    ).all()
+    if not rows:
+        return None
+    stamps, sale_ids, totals, names, quantities, unit_prices = zip(*rows)
+    if epoch is None:
+        stamps = [int(stamp.replace(tzinfo=timezone.utc).timestamp()) for stamp in stamps]
+    sale_ids = np.asarray(sale_ids, dtype=np.int64)
+    # Primera fila de cada venta: ahí se cuentan el ticket y su total (las filas vienen ordenadas por venta)
+    first = np.ones(len(sale_ids), dtype=bool)
+    first[1:] = sale_ids[1:] != sale_ids[:-1]
+    return {
+        "ts": np.asarray(stamps, dtype=np.int64),
+        "first": first,
+        "total": np.asarray(totals, dtype=np.int64),
+        "names": list(names),
+        "quantity": np.asarray(quantities, dtype=np.int64),
+        "unit": np.asarray(unit_prices, dtype=np.int64),
+    }
+
+
+def _concat(parts):
+    parts = [part for part in parts if part is not None]
+    if not parts:
+        return {
+            "ts": np.zeros(0, np.int64), "first": np.zeros(0, bool), "total": np.zeros(0, np.int64),
+            "names": [], "quantity": np.zeros(0, np.int64), "unit": np.zeros(0, np.int64),
+        }
+    data = {key: np.concatenate([part[key] for part in parts]) for key in ("ts", "first", "total", "quantity", "unit")}
+    data["names"] = [name for part in parts for name in part["names"]]
+    return data
+
+
+def _local_seconds(ts):
+    """Pasa segundos UTC a hora local, con el desfasaje de cada hora (respeta cambios de horario)."""
+    tz = today.TIMEZONE or today.local_now().tzinfo
+    hours, inverse = np.unique(ts // 3600, return_inverse=True)
+    offsets = np.fromiter(
+        (tz.utcoffset(datetime.fromtimestamp(int(hour) * 3600, timezone.utc)).total_seconds() for hour in hours),
+        dtype=np.int64, count=len(hours),
+    )
+    return ts + offsets[inverse]
+
+
+# --- Buckets ---
+
+def _bucket_index(bucket, local, days, origin_day, n_days):
+    """Índice de bucket de cada fila respecto de `origin_day` y cantidad de buckets."""
+    if bucket == "hour":
+        return local // 3600 - origin_day * 24, n_days * 24
+    if bucket == "day":
+        return days - origin_day, n_days
+    first_week = origin_day - (origin_day + 3) % 7  # lunes de la semana (el 1/1/1970 fue jueves)
+    return (days - first_week) // 7, (origin_day + n_days - 1 - first_week) // 7 + 1
+
+
+def _bucket_labels(bucket, first_day, n):
+    if bucket == "hour":
+        origin = datetime.combine(first_day, datetime.min.time())
+        return [(origin + timedelta(hours=i)).isoformat(timespec="minutes") for i in range(n)]
+    if bucket == "day":
+        return [(first_day + timedelta(days=i)).isoformat() for i in range(n)]
+    monday = first_day - timedelta(days=first_day.weekday())
+    return [(monday + timedelta(weeks=i)).isoformat() for i in range(n)]
+
+
+def _sums(index, mask, data, n):
+    """(centavos, tickets, unidades) por bucket para las filas de `mask`."""
+    sale_rows = mask & data["first"]
+    revenue = np.bincount(index[sale_rows], weights=data["total"][sale_rows], minlength=n)[:n]
+    tickets = np.bincount(index[sale_rows], minlength=n)[:n]
+    units = np.bincount(index[mask], weights=data["quantity"][mask], minlength=n)[:n]
+    return revenue, tickets, units
+
+
+def _money(cents):
+    return np.round(cents / 100, 2).tolist()
+
+
+def _totals(revenue_cents, tickets, units):
+    revenue = round(float(revenue_cents.sum()) / 100, 2)
+    count = int(tickets.sum())
+    return {
+        "revenue": revenue,
+        "tickets": count,
+        "units": int(units.sum()),
+        "average_ticket": round(revenue / count, 2) if count else 0,
+    }
+
+
+def _change(current, previous):
+    return {
+        field: round((current[field] - previous[field]) / previous[field] * 100, 1) if previous[field] else None
+        for field in ("revenue", "tickets", "units", "average_ticket")
+    }
+
+
+def build(data, first_day, last_day, bucket="day", compare=False, top=5) -> dict:
+    n_days = (last_day - first_day).days + 1
+    start_day = (first_day - EPOCH).days
+    local = _local_seconds(data["ts"])
+    days = local // 86400
+    current = (days >= start_day) & (days < start_day + n_days)
+
+    index, n = _bucket_index(bucket, local, days, start_day, n_days)
+    index = np.where(current, index, 0)  # fuera del rango: se filtra con la máscara, el índice no importa
+    revenue, tickets, units = _sums(index, current, data, n)
+
+    series = [
+        {"start": label, "revenue": r, "tickets": t, "units": u}
+        for label, r, t, u in zip(_bucket_labels(bucket, first_day, n), _money(revenue), tickets.tolist(), units.astype(np.int64).tolist())
+    ]
+    totals = _totals(revenue, tickets, units)
+
+    # Perfiles del período: hora del día y día de la semana
+    sale_rows = current & data["first"]
+    hours = (local // 3600) % 24
+    weekdays = (days + 3) % 7
+    hour_revenue = np.bincount(hours[sale_rows], weights=data["total"][sale_rows], minlength=24)
+    hour_tickets = np.bincount(hours[sale_rows], minlength=24)
+    weekday_revenue = np.bincount(weekdays[sale_rows], weights=data["total"][sale_rows], minlength=7)
+    weekday_tickets = np.bincount(weekdays[sale_rows], minlength=7)
+
+    # Productos: índice por nombre y una matriz producto × bucket solo para el top
+    named = current & np.fromiter((name is not None for name in data["names"]), dtype=bool, count=len(data["names"]))
+    top_products = []
+    if top and named.any():
+        names, product_index = np.unique(np.asarray(data["names"], dtype=object)[named], return_inverse=True)
+        quantity = data["quantity"][named]
+        product_units = np.bincount(product_index, weights=quantity, minlength=len(names))
+        product_revenue = np.bincount(product_index, weights=quantity * data["unit"][named], minlength=len(names))
+        ranked = np.argsort(-product_units, kind="stable")[:top]
+        rank = np.full(len(names), -1)
+        rank[ranked] = np.arange(len(ranked))
+        selected = rank[product_index] >= 0
+        matrix = np.zeros((len(ranked), n), dtype=np.int64)
+        np.add.at(matrix, (rank[product_index][selected], index[named][selected]), quantity[selected])
+        top_products = [
+            {
+                "name": names[p],
+                "units": int(product_units[p]),
+                "revenue": round(float(product_revenue[p]) / 100, 2),
+                "series": matrix[position].tolist(),
+            }
+            for position, p in enumerate(ranked)
+        ]
+
+    report = {
+        "start_date": first_day.isoformat(),
+        "end_date": last_day.isoformat(),
+        "bucket": bucket,
+        "totals": totals,
+        "series": series,
+        "hour_of_day": [
+            {"hour": hour, "revenue": r, "tickets": t}
+            for hour, r, t in zip(range(24), _money(hour_revenue), hour_tickets.tolist())
+        ],
+        "weekday": [
+            {"weekday": name, "revenue": r, "tickets": t}
+            for name, r, t in zip(WEEKDAYS, _money(weekday_revenue), weekday_tickets.tolist())
+        ],
+        "top_products": top_products,
+    }
+
+    if compare:
+        # El período anterior, de la misma duración, alineado bucket por bucket
+        previous_day = start_day - n_days
+        in_previous = (days >= previous_day) & (days < start_day)
+        previous_index, previous_n = _bucket_index(bucket, local, days, previous_day, n_days)
+        previous_index = np.where(in_previous, previous_index, 0)
+        previous_n = max(n, previous_n)
+        previous = [array[:n] for array in _sums(previous_index, in_previous, data, previous_n)]
+        for item, r, t, u in zip(series, _money(previous[0]), previous[1].tolist(), previous[2].astype(np.int64).tolist()):
+            item["previous"] = {"revenue": r, "tickets": t, "units": u}
+        previous_totals = _totals(*_sums(previous_index, in_previous, data, previous_n))
+        report["previous_period"] = {
+            "start_date": (first_day - timedelta(days=n_days)).isoformat(),
+            "end_date": (first_day - timedelta(days=1)).isoformat(),
+            "totals": previous_totals,
+        }
+        report["change_pct"] = _change(totals, previous_totals)
+    return report
+
+
+def report(first_day, last_day, bucket="day", compare=False, top=5, branch_ids=None) -> dict:
+    n_days = (last_day - first_day).days + 1
+    query_first = first_day - timedelta(days=n_days) if compare else first_day
+    start, _ = today.utc_bounds(query_first)
+    _, end = today.utc_bounds(last_day)
+    data = _concat(branches.fan_out(lambda branch, db: load(db, start, end, branch), branch_ids).values())
+    return build(data, first_day, last_day, bucket, compare, top)
@@ -0,0 +1,281 @@
+# today.py
+"""
+Contadores en memoria del día en curso (GET /reports/today).
+
+"Lo que va del día" es el reporte que más se mira, así que no se calcula con
+SQL en cada pedido: se mantienen contadores en el proceso que se actualizan
+con cada venta confirmada (listener de sales.py): recaudación, tickets,
+cantidades por producto y totales por medio de pago. El ranking de productos
+se guarda ordenado y la respuesta queda armada hasta la próxima venta, así que
+cada pedido es O(1).
+
+Al arrancar se reconstruyen desde la base con una sola consulta y al pasar la
+medianoche local se vuelven a cero. La hora local sale de CAFE_TZ (ej.
+America/Argentina/Buenos_Aires); si no está definida se usa la del servidor.
+
+Hay un juego de contadores por sucursal; el resumen de todas las sucursales
+los suma (eso ya no es O(1), pero recorre solo la memoria).
+
+Con varios workers, cada venta incrementa el sello de ventas de su sucursal
+(stamps.sales) en su misma transacción. Los contadores recuerdan hasta qué
+sello incluyen: las ventas propias lo avanzan de a uno, y si al revisar
+(`check`, como mucho una vez cada CACHE_SYNC_INTERVAL segundos) el de la base
+es otro, es que otro worker vendió y se reconstruyen. La reconstrucción lee el
+sello en la misma consulta que los totales, así una venta que se confirma
+mientras tanto nunca se cuenta dos veces ni se pierde.
+"""
+import bisect
+import heapq
+import os
+import threading
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import func, literal, select, union_all
+from sqlalchemy.orm import Session
+
+import models
+import stamps
+
+TIMEZONE = ZoneInfo(os.environ["CAFE_TZ"]) if os.getenv("CAFE_TZ") else None
+
+
+def local_now() -> datetime:
+    return datetime.now(TIMEZONE) if TIMEZONE else datetime.now().astimezone()
+
+
+def local_date(created_at: datetime):
+    """Día local de una venta (Sale.created_at se guarda en UTC sin zona)."""
+    return created_at.replace(tzinfo=timezone.utc).astimezone(TIMEZONE).date()
+
+
+def to_utc(moment: datetime) -> datetime:
+    """Fecha y hora (local si no trae zona) en UTC sin zona, como Sale.created_at."""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=TIMEZONE or local_now().tzinfo)
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def utc_bounds(day):
+    """[inicio, fin) del día local `day`, en UTC sin zona como Sale.created_at."""
+    tz = TIMEZONE or local_now().tzinfo
+    start = datetime.combine(day, time.min, tzinfo=tz)
+    end = datetime.combine(day + timedelta(days=1), time.min, tzinfo=tz)
+    return (
+        start.astimezone(timezone.utc).replace(tzinfo=None),
+        end.astimezone(timezone.utc).replace(tzinfo=None),
+    )
+
+
+def utc_range(first_day, last_day):
+    """[inicio, fin) de los días locales first_day..last_day (ambos inclusive), en UTC sin zona."""
+    return utc_bounds(first_day)[0], utc_bounds(last_day)[1]
+
+
+class TodayCounters:
+    def __init__(self, branch_id: str):
+        self.branch_id = branch_id
+        self._lock = threading.Lock()
+        # Sello de ventas que ya está incluido en los contadores
+        self.watcher = stamps.Watcher(stamps.sales(branch_id), None)
+        self._reset(local_now().date())
+
+    def _reset(self, day):
+        self.day = day
+        self.revenue_cents = 0
+        self.tickets = 0
+        self.quantities = {}   # producto -> unidades
+        self.ranking = []      # [(-unidades, producto)] ordenado: el top-N es un slice
+        self.payments = {}     # medio de pago -> [centavos, tickets]
+        self._responses = {}   # top -> respuesta armada
+
+    def _add_product(self, name, quantity):
+        previous = self.quantities.get(name)
+        if previous is not None:
+            del self.ranking[bisect.bisect_left(self.ranking, (-previous, name))]
+        total = (previous or 0) + quantity
+        self.quantities[name] = total
+        bisect.insort(self.ranking, (-total, name))
+
+    def _add_payment(self, method, cents, tickets):
+        entry = self.payments.setdefault(method, [0, 0])
+        entry[0] += cents
+        entry[1] += tickets
+
+    def _roll_over(self, day):
+        # Llamar con el lock tomado
+        if day > self.day:
+            self._reset(day)
+
+    def rebuild(self, db: Session):
+        """Recalcula el día en curso desde la base con una sola consulta."""
+        day = local_now().date()
+        start, end = utc_bounds(day)
+        in_range = (
+            models.Sale.branch_id == self.branch_id,
+            models.Sale.created_at >= start,
+            models.Sale.created_at < end,
+        )
+        by_payment = (
+            select(
+                literal("payment").label("kind"),
+                models.Sale.payment_method.label("name"),
+                func.sum(models.Sale.total_cents).label("amount"),
+                func.count(models.Sale.id).label("tickets"),
+            )
+            .where(*in_range)
+            .group_by(models.Sale.payment_method)
+        )
+        by_product = (
+            select(
+                literal("product").label("kind"),
+                models.SaleItem.product_name.label("name"),
+                func.sum(models.SaleItem.quantity).label("amount"),
+                literal(0).label("tickets"),
+            )
+            .join(models.Sale, models.Sale.id == models.SaleItem.sale_id)
+            .where(*in_range)
+            .group_by(models.SaleItem.product_name)
+        )
+        stamp = select(
+            literal("stamp").label("kind"),
+            models.CacheStamp.name.label("name"),
+            models.CacheStamp.version.label("amount"),
+            literal(0).label("tickets"),
+        ).where(models.CacheStamp.name == self.watcher.name)
+        rows = db.execute(union_all(by_payment, by_product, stamp)).all()
+
+        with self._lock:
+            self._reset(day)
+            version = 0
+            for kind, name, amount, tickets in rows:
+                if kind == "stamp":
+                    version = amount
+                elif kind == "payment":
+                    self._add_payment(name, amount, tickets)
+                    self.revenue_cents += amount
+                    self.tickets += tickets
+                else:
+                    self._add_product(name, amount)
+            self.watcher.seen(version)
+
+    def check(self, db: Session):
+        """Reconstruye si otro proceso registró ventas desde la última vez."""
+        if self.watcher.fresh():
+            return
+        version = stamps.read(db, self.watcher.name)
+        if version != self.watcher.version:
+            self.rebuild(db)
+        else:
+            self.watcher.seen(version)
+
+    def record(self, sales):
+        """Listener de sales.py: suma las ventas recién confirmadas (todas de un mismo commit)."""
+        with self._lock:
+            version = sales[0].get("sales_version") if sales else None
+            if version is not None:
+                if self.watcher.version is not None and version <= self.watcher.version:
+                    return  # ya entraron en la última reconstrucción
+                self.watcher.advance(version)
+            for sale in sales:
+                day = local_date(datetime.fromisoformat(sale["created_at"]))
+                self._roll_over(day)
+                if day != self.day:
+                    continue
+                cents = models.to_cents(sale["total_amount"])
+                self.revenue_cents += cents
+                self.tickets += 1
+                self._add_payment(sale["payment_method"], cents, 1)
+                for item in sale["items"]:
+                    self._add_product(item["product_name"], item["quantity"])
+            self._responses.clear()
+
+    def snapshot(self, top: int = 5) -> dict:
+        with self._lock:
+            self._roll_over(local_now().date())
+            response = self._responses.get(top)
+            if response is None:
+                revenue = self.revenue_cents / 100
+                response = self._responses[top] = {
+                    "date": self.day.isoformat(),
+                    "total_revenue": revenue,
+                    "total_sales": self.tickets,
+                    "average_ticket": revenue / self.tickets if self.tickets else 0,
+                    "top_products": [
+                        {"name": name, "quantity": -negative}
+                        for negative, name in self.ranking[:top]
+                    ],
+                    "payment_methods": [
+                        {"method": method, "total": cents / 100, "tickets": tickets}
+                        for method, (cents, tickets) in sorted(self.payments.items())
+                    ],
+                }
+            return response
+
+    def totals(self):
+        """Copia de los contadores crudos, para sumar varias sucursales."""
+        with self._lock:
+            self._roll_over(local_now().date())
+            return (
+                self.day, self.revenue_cents, self.tickets,
+                dict(self.quantities), {method: list(entry) for method, entry in self.payments.items()},
+            )
+
+
+_lock = threading.Lock()
+_counters = {}  # sucursal -> TodayCounters
+
+
+def counters_for(branch_id: str) -> TodayCounters:
+    with _lock:
+        counters = _counters.get(branch_id)
+        if counters is None:
+            counters = _counters[branch_id] = TodayCounters(branch_id)
+    return counters
+
+
+def record(sales):
+    """Listener de sales.py: reparte las ventas confirmadas entre los contadores de cada sucursal."""
+    by_branch = {}
+    for sale in sales:
+        by_branch.setdefault(sale["branch_id"], []).append(sale)
+    for branch_id, branch_sales in by_branch.items():
+        counters_for(branch_id).record(branch_sales)
+
+
+def stale(branch_ids) -> list:
+    """Sucursales cuyos contadores hay que comparar con la base antes de responder."""
+    return [branch_id for branch_id in branch_ids if not counters_for(branch_id).watcher.fresh()]
+
+
+def snapshot(branch_ids, top: int = 5) -> dict:
+    """Resumen del día de una o varias sucursales."""
+    if len(branch_ids) == 1:
+        return counters_for(branch_ids[0]).snapshot(top)
+
+    day, revenue_cents, tickets = local_now().date(), 0, 0
+    quantities, payments = {}, {}
+    for branch_id in branch_ids:
+        day, branch_revenue, branch_tickets, branch_quantities, branch_payments = counters_for(branch_id).totals()
+        revenue_cents += branch_revenue
+        tickets += branch_tickets
+        for name, quantity in branch_quantities.items():
+            quantities[name] = quantities.get(name, 0) + quantity
+        for method, (cents, count) in branch_payments.items():
+            entry = payments.setdefault(method, [0, 0])
+            entry[0] += cents
+            entry[1] += count
+
+    revenue = revenue_cents / 100
+    ranking = heapq.nsmallest(top, ((-quantity, name) for name, quantity in quantities.items()))
+    return {
+        "date": day.isoformat(),
+        "total_revenue": revenue,
+        "total_sales": tickets,
+        "average_ticket": revenue / tickets if tickets else 0,
+        "top_products": [{"name": name, "quantity": -negative} for negative, name in ranking],
+        "payment_methods": [
+            {"method": method, "total": cents / 100, "tickets": count}
+            for method, (cents, count) in sorted(payments.items())
+        ],
+    }